@@ -1,16 +1,48 @@
+import multiprocessing
 import os
-from flask import Flask, request, send_from_directory, Response, abort, send_file
+from flask import Flask, Response, request, send_from_directory, abort, send_file
+from werkzeug.security import safe_join
 from .extensions import db
 from .routes.api import api_bp
+from .routes.video_ranges import send_video
 from .config import Config
 from flask_migrate import Migrate
-import threading
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
 from .models.processing_queue import ProcessingQueue
-from .workers.video_worker import process_video_worker_loop
+from .workers.video_worker import forward_images, process_video_worker_loop
+from .workers.inference_server import DynamicBatcher, set_inference_client
+from .workers.scheduler import start_worker_pool
+from .workers.process_pool import InferenceProcessPool
+from .workers.progress_events import get_progress_transport, start_progress_listener
+from .workers.job_metrics import collect_queue_gauges, metrics_registry, record_error
 from flask_cors import CORS
-import io
 
-def create_app():
+# create_all only creates missing tables, so add any new model columns to an existing table
+def add_missing_columns(table):
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name, schema=table.schema)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+            db.engine.execute(f'ALTER TABLE {table.schema}.{table.name} ADD COLUMN IF NOT EXISTS {column.name} {column_type}{default}')
+
+# create_all also skips indexes on an existing table, so create any new model indexes
+def add_missing_indexes(table):
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name, schema=table.schema)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+
+# Minimal app used inside inference worker processes, gives them config and a DB session without routes or workers
+def create_worker_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+# start_background=False builds the app without progress listener or workers, for a process that never serves requests
+def create_app(start_background=True):
     app = Flask(__name__, static_folder='../static', static_url_path='')
     app.config.from_object(Config)
 
@@ -25,15 +57,34 @@ def create_app():
     with app.app_context():
         db.engine.execute('CREATE SCHEMA IF NOT EXISTS agritrack_app')  # Create agritrack schema to store app tables
         db.create_all()
+        add_missing_columns(ProcessingQueue.__table__)
+        add_missing_indexes(ProcessingQueue.__table__)
 
     app.register_blueprint(api_bp)
 
-    # Start background worker thread
-    if app.config.get("START_WORKER", True):
-        def run_worker():
-            with app.app_context():
-                process_video_worker_loop()
-        threading.Thread(target=run_worker, daemon=True).start()
+    # The process pool spawns its children, which re-import the entry module, and wsgi.py creates the app at import
+    # Only the top-level process starts listeners and workers, a child starting its own pool would recurse. A spawned
+    # child gets its own process name before that import, while parent_process() is only set after it.
+    is_pool_child = multiprocessing.current_process().name != "MainProcess"
+    start_background = start_background and not is_pool_child
+
+    # Worker processes publish progress over Postgres NOTIFY, relay it to this process's SSE subscribers
+    if get_progress_transport(app.config) == "postgres" and start_background:
+        start_progress_listener(app)
+
+    # Start background workers, either as threads in this process or as a separate inference process pool
+    if app.config.get("START_WORKER", True) and start_background:
+        if app.config.get("WORKER_MODE") == "process":
+            InferenceProcessPool(app, app.config.get("WORKER_POOL_SIZE", 1), app.config.get("WORKER_CPU_BUDGET")).start()
+        else:
+            # Worker threads already share one model, the batcher also merges their frames into shared forward passes
+            if app.config.get("INFERENCE_SERVER"):
+                set_inference_client(DynamicBatcher(
+                    forward_images,
+                    app.config.get("INFERENCE_SERVER_MAX_BATCH", 8),
+                    app.config.get("INFERENCE_SERVER_MAX_LATENCY_MS", 20) / 1000,
+                ).start())
+            start_worker_pool(app, process_video_worker_loop, app.config.get("WORKER_POOL_SIZE", 1))
 
     # Serve frontend static files
     @app.route('/')
@@ -60,34 +111,37 @@ def create_app():
         if not os.path.isfile(path):
             abort(404)
 
-        range_header = request.headers.get('Range', None)
-        file_size = os.path.getsize(path)
-
-        if range_header:
-            try:
-                byte1, byte2 = range_header.replace('bytes=', '').split('-')
-                byte1 = int(byte1)
-                byte2 = int(byte2) if byte2 else file_size - 1
-            except ValueError:
-                abort(400)
-
-            length = byte2 - byte1 + 1
-
-            with open(path, 'rb') as f:
-                f.seek(byte1)
-                data = f.read(length)
-
-            rv = Response(data,
-                        206,
-                        mimetype='video/mp4',
-                        direct_passthrough=True)
-            rv.headers.add('Content-Range', f'bytes {byte1}-{byte2}/{file_size}')
-            rv.headers.add('Accept-Ranges', 'bytes')
-            rv.headers.add('Content-Length', str(length))
-            return rv
-        else:
-            # No Range header; serve full file
-            return send_file(path, mimetype='video/mp4')
+        # Streams in bounded chunks with single, multiple, open-ended and suffix ranges, plus ETag/Last-Modified
+        return send_video(path, 'video/mp4', app.config.get("VIDEO_CACHE_MAX_AGE", 3600))
+
+    # Serve HLS playlists and segments of a processed video, available while the job is still running
+    @app.route('/assets/videos/hls/<int:task_id>/<path:filename>')
+    def hls(task_id, filename):
+        hls_dir = os.path.join(app.static_folder, 'assets/videos/hls', str(task_id))
+        path = safe_join(hls_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        if filename.endswith('.m3u8'):
+            # Event playlists grow as segments are written, so clients must always revalidate them
+            response = send_file(path, mimetype='application/vnd.apple.mpegurl', max_age=0)
+            response.cache_control.no_cache = True
+            return response
+
+        # Segments never change once listed in a playlist
+        return send_video(path, 'video/mp2t', app.config.get("VIDEO_CACHE_MAX_AGE", 3600))
+
+    # Prometheus scrape endpoint: stage latencies, job outcomes, errors and pipeline queue depths from the workers,
+    # plus queue depth by status read from the database
+    @app.route('/metrics')
+    def metrics():
+        try:
+            queue_gauges = collect_queue_gauges()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            record_error("metrics_queue_gauges", e)
+            queue_gauges = []
+        return Response(metrics_registry.render(queue_gauges), mimetype='text/plain; version=0.0.4')
 
 
     return app
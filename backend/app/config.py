@@ -2,4 +2,119 @@ import os
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Number of decoded frames grouped into a single model forward pass by the video worker
+    INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", 1))
+
+    # Max batches buffered between each stage of the worker's decode/infer/annotate/write pipeline
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 8))
+
+    # Number of worker threads started per app process, each claims jobs from the shared queue
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", 1))
+
+    # Seconds between heartbeats from a worker on its claimed job, and before a silent job is requeued
+    WORKER_HEARTBEAT_INTERVAL = int(os.getenv("WORKER_HEARTBEAT_INTERVAL", 15))
+    WORKER_STALE_TIMEOUT = int(os.getenv("WORKER_STALE_TIMEOUT", 300))
+
+    # Times a silent job is requeued before it is failed instead, so a job that crashes every worker stops retrying,
+    # 0 requeues without limit
+    WORKER_MAX_RECLAIMS = int(os.getenv("WORKER_MAX_RECLAIMS", 3))
+
+    # "thread" runs workers inside the API process, "process" runs them in a pool of inference processes
+    WORKER_MODE = os.getenv("WORKER_MODE", "thread")
+
+    # CPU cores shared between inference processes for torch intra-op threads, defaults to all cores
+    WORKER_CPU_BUDGET = int(os.getenv("WORKER_CPU_BUDGET", 0)) or None
+
+    # Send every job's frames through one shared inference server that batches them across jobs: a batching thread
+    # in "thread" mode, a process that alone holds the model in "process" mode so workers do not load a copy each.
+    # A batch runs once it holds INFERENCE_SERVER_MAX_BATCH images or its oldest request has waited
+    # INFERENCE_SERVER_MAX_LATENCY_MS, workers give up on a reply after INFERENCE_SERVER_TIMEOUT seconds.
+    INFERENCE_SERVER = os.getenv("INFERENCE_SERVER", "false").lower() in ("1", "true")
+    INFERENCE_SERVER_MAX_BATCH = int(os.getenv("INFERENCE_SERVER_MAX_BATCH", 8))
+    INFERENCE_SERVER_MAX_LATENCY_MS = float(os.getenv("INFERENCE_SERVER_MAX_LATENCY_MS", 20))
+    INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", 120))
+
+    # Run the detector every N frames and let the tracker fill in the frames in between, 1 detects on every frame
+    KEYFRAME_INTERVAL = int(os.getenv("KEYFRAME_INTERVAL", 1))
+
+    # Also detect early when mean grayscale change since the last keyframe exceeds this (0-255), 0 disables
+    KEYFRAME_MOTION_THRESHOLD = float(os.getenv("KEYFRAME_MOTION_THRESHOLD", 0))
+
+    # Downscale frames so the longest side is at most this many pixels before inference, 0 keeps native resolution
+    INFERENCE_RESOLUTION = int(os.getenv("INFERENCE_RESOLUTION", 0))
+
+    # Split frames into overlapping square tiles of this size for small-object recall on high-res footage, 0 disables
+    TILE_SIZE = int(os.getenv("TILE_SIZE", 0))
+    TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", 64))
+    TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", 0.5))
+
+    # Detections scoring at or below the threshold are dropped before tracking, optionally per class as
+    # "label:threshold" pairs, then overlapping boxes of any class above DETECTION_NMS_IOU are merged, 0 disables
+    DETECTION_SCORE_THRESHOLD = float(os.getenv("DETECTION_SCORE_THRESHOLD", 0.95))
+    DETECTION_CLASS_THRESHOLDS = os.getenv("DETECTION_CLASS_THRESHOLDS", "")
+    DETECTION_NMS_IOU = float(os.getenv("DETECTION_NMS_IOU", 0))
+
+    # Multi-object tracker run per job: "norfair" (centroid tracking) or the opt-in "bytetrack" (vectorised
+    # IoU/centroid matching, faster on large flocks; compare with tools.tracker_benchmark before switching)
+    # Tracks match detections within TRACKER_DISTANCE_THRESHOLD px (or TRACKER_MATCH_IOU overlap with bytetrack), are
+    # shown after TRACKER_INIT_HITS matched keyframes and dropped after TRACKER_MAX_AGE frames unmatched. With
+    # bytetrack, detections below TRACKER_HIGH_SCORE can only extend existing tracks, so lowering
+    # DETECTION_SCORE_THRESHOLD keeps sheep tracked through low-confidence frames without starting spurious tracks.
+    TRACKER = os.getenv("TRACKER", "norfair")
+    TRACKER_DISTANCE_THRESHOLD = float(os.getenv("TRACKER_DISTANCE_THRESHOLD", 30))
+    TRACKER_MATCH_IOU = float(os.getenv("TRACKER_MATCH_IOU", 0.2))
+    TRACKER_INIT_HITS = int(os.getenv("TRACKER_INIT_HITS", 3))
+    TRACKER_MAX_AGE = int(os.getenv("TRACKER_MAX_AGE", 60))
+    TRACKER_HIGH_SCORE = float(os.getenv("TRACKER_HIGH_SCORE", 0.95))
+
+    # libx264 settings for the processed video, faster presets trade file size for encode speed
+    VIDEO_ENCODE_PRESET = os.getenv("VIDEO_ENCODE_PRESET", "veryfast")
+    VIDEO_ENCODE_CRF = int(os.getenv("VIDEO_ENCODE_CRF", 23))
+
+    # Size budget for the content-addressed result cache, least recently used entries are evicted beyond it
+    # Files still hard linked from a job's processed output are not counted, since evicting them frees nothing
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+
+    # How worker progress reaches SSE clients: "memory" for workers in the API process, "postgres" for LISTEN/NOTIFY,
+    # "auto" picks postgres when WORKER_MODE is "process"
+    PROGRESS_TRANSPORT = os.getenv("PROGRESS_TRANSPORT", "auto")
+
+    # Seconds between progress events pushed by a worker, and the minimum between progress writes to its DB row
+    PROGRESS_EVENT_INTERVAL = float(os.getenv("PROGRESS_EVENT_INTERVAL", 0.5))
+    PROGRESS_COMMIT_INTERVAL = float(os.getenv("PROGRESS_COMMIT_INTERVAL", 10))
+
+    # HLS renditions written alongside the processed mp4 as "height:kbps" pairs, off by default since every rendition
+    # is one more encode per job. Enable adaptive playback with e.g. HLS_RENDITIONS=720:2800,360:800; the frontend
+    # plays the HLS stream where the browser supports it and falls back to the mp4 otherwise. Live streams always
+    # go out as HLS, with a single source-height rendition when this is empty.
+    HLS_RENDITIONS = os.getenv("HLS_RENDITIONS", "")
+
+    # Live stream jobs (POST /api/streams) accept sources with these URL schemes, "pipe:/path/to/fifo" reads a named
+    # pipe. A local test feed: ffmpeg -re -i clip.mp4 -c copy -f mpegts udp://127.0.0.1:5000
+    STREAM_ALLOWED_SCHEMES = os.getenv("STREAM_ALLOWED_SCHEMES", "rtsp,rtsps,rtmp,udp,tcp,srt,http,https,pipe")
+
+    # Stream frames older than this when the worker gets to them are dropped, so output stays close to real time
+    STREAM_LATENCY_BUDGET_MS = int(os.getenv("STREAM_LATENCY_BUDGET_MS", 500))
+
+    # Seconds between live count updates to a stream job's row and its progress events
+    STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", 2))
+
+    # Milliseconds to wait when opening or reading a stream, and reopen attempts before a silent feed ends the job
+    STREAM_TIMEOUT_MS = int(os.getenv("STREAM_TIMEOUT_MS", 10000))
+    STREAM_RECONNECT_ATTEMPTS = int(os.getenv("STREAM_RECONNECT_ATTEMPTS", 3))
+
+    # Segments kept in a stream job's rolling HLS playlist, older segments are deleted
+    STREAM_HLS_WINDOW = int(os.getenv("STREAM_HLS_WINDOW", 6))
+
+    # Seconds browsers may reuse a processed video before revalidating it with its ETag
+    VIDEO_CACHE_MAX_AGE = int(os.getenv("VIDEO_CACHE_MAX_AGE", 3600))
+
+    # Frames between job checkpoints, an interrupted job resumes from its last checkpoint. Off (0) by default, since
+    # checkpointing encodes the video in parts joined at the end; worth enabling for long videos, e.g. 1800
+    CHECKPOINT_INTERVAL_FRAMES = int(os.getenv("CHECKPOINT_INTERVAL_FRAMES", 0))
+
+    # Jobs uploaded with profile=torch skip this many inference batches for warm-up, then record the next few
+    TORCH_PROFILE_SKIP_BATCHES = int(os.getenv("TORCH_PROFILE_SKIP_BATCHES", 5))
+    TORCH_PROFILE_BATCHES = int(os.getenv("TORCH_PROFILE_BATCHES", 20))
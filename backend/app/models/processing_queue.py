@@ -13,8 +13,8 @@ class ProcessingQueue(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     file_name = db.Column(db.String, nullable=False)
-    upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    status = db.Column(db.String, nullable=False)  # Replaced SqlEnum with String
+    upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    status = db.Column(db.String, nullable=False, index=True)  # Replaced SqlEnum with String
     format = db.Column(db.String, nullable=False)  # e.g., ".mp4"
     duration_seconds = db.Column(db.Integer, nullable=True)  # in seconds
     size = db.Column(db.Float, nullable=True)  # in megabytes
@@ -24,3 +24,27 @@ class ProcessingQueue(db.Model):
     processed_frames = db.Column(db.Integer, nullable=True) # number of frames
     detected_objects = db.Column(db.Integer, nullable=True)
     average_confidence = db.Column(db.Float, nullable=True)
+    priority = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # higher runs first, ties run in upload order
+    worker_id = db.Column(db.String, nullable=True)  # id of the worker that claimed the task
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # last heartbeat from the claiming worker, used to reclaim stale tasks
+    reclaim_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # times the task was requeued after its worker went silent
+    inference_frames = db.Column(db.Integer, nullable=True)  # frames that went through the detector
+    skipped_frames = db.Column(db.Integer, nullable=True)  # frames filled in from tracker estimates
+    keyframe_drift_px = db.Column(db.Float, nullable=True)  # mean tracker drift from detections at keyframes, in pixels
+    processing_fps = db.Column(db.Float, nullable=True)  # frames processed per second of wall time
+    tracks_path = db.Column(db.String, nullable=True)  # directory of the per-frame columnar track store
+    thumbnail_path = db.Column(db.String, nullable=True)  # last processed frame as a JPEG, relative to the backend directory
+    video_hash = db.Column(db.String, nullable=True)  # sha256 of the uploaded video
+    stored_file_name = db.Column(db.String, nullable=True)  # content-addressed upload file, e.g. "<sha256>.mp4"
+    cache_hit = db.Column(db.Boolean, nullable=True)  # true when the result was served from the result cache
+    queue_wait_seconds = db.Column(db.Float, nullable=True)  # time from upload until a worker first started the job
+    stage_metrics = db.Column(db.JSON, nullable=True)  # per-stage call counts and timings, and pipeline queue depths
+    profile_mode = db.Column(db.String, nullable=True)  # "cprofile" or "torch" to profile this job, null for none
+    profile_path = db.Column(db.String, nullable=True)  # profiler output written by the worker
+    job_type = db.Column(db.String, nullable=False, default='file', server_default='file')  # "file" for uploaded videos, "stream" for live feeds
+    source_url = db.Column(db.String, nullable=True)  # RTSP/UDP/HTTP/pipe source of a stream job
+    live_count = db.Column(db.Integer, nullable=True)  # sheep tracked on the latest processed frame of a stream job
+    dropped_frames = db.Column(db.Integer, nullable=True)  # stream frames dropped to stay within the latency budget
+    stream_latency_ms = db.Column(db.Float, nullable=True)  # capture-to-output delay of the latest processed stream frame
+    stop_requested = db.Column(db.Boolean, nullable=True)  # set to end a stream job, the worker stops at its next row update
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # last change to the row, used by incremental polling
@@ -1,11 +1,25 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, send_file
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import desc
+from sqlalchemy import desc, func, tuple_
 from ..extensions import db
 from ..models.processing_queue import ProcessingQueue
+from ..workers.model_loader import model_status
+from ..workers.progress_events import TERMINAL_STATUSES, progress_broker, publish_progress, task_event
+from ..workers.track_store import read_time_range
+from ..workers.result_cache import lookup_result, result_cache_key, save_stream_with_hash
+from ..workers.video_worker import complete_task_from_cache, get_hls_dir, probe_video_metadata
+from ..workers.job_metrics import PROFILE_MODES
+from ..workers.video_encoder import HLS_MASTER_PLAYLIST
+from ..workers.live_stream import get_stream_scheme
+from .upload_sessions import UploadSessionError, create_session, finalize_session, get_session, write_chunk
+from flask import current_app
 import os
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import json
+import math
+import queue
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -18,6 +32,49 @@ os.makedirs(PROCESSING_FOLDER, exist_ok=True)  # Ensure the folder exists
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Create the processing_queue row for a fully uploaded video, completing it from the result cache when possible
+# profile_mode turns on a profiler for this job's processing, see PROFILE_MODES
+def queue_uploaded_video(filename, extension, video_hash, stored_file_name, priority, profile_mode=None):
+    file_path = os.path.join(UPLOAD_FOLDER, stored_file_name)
+
+    # Same video, model and settings processed before: complete straight from the result cache
+    cache_key = result_cache_key(video_hash, current_app.config)
+    cached_result = lookup_result(cache_key)
+
+    # Container metadata is read from the file header, the worker fills in the rest during processing
+    duration_seconds, resolution = probe_video_metadata(file_path)
+
+    try:
+        processing_queue = ProcessingQueue(
+            file_name=filename,
+            stored_file_name=stored_file_name,
+            video_hash=video_hash,
+            status="QUEUED",
+            priority=priority,
+            format=extension,
+            upload_timestamp=datetime.utcnow(),
+            size=os.path.getsize(file_path) / (1024 * 1024),  # in MB
+            resolution=resolution,
+            duration_seconds=duration_seconds,
+            profile_mode=profile_mode,
+        )
+        db.session.add(processing_queue)
+        db.session.flush()  # Assigns the id used in output file names
+
+        if cached_result is not None and complete_task_from_cache(processing_queue, cache_key, cached_result):
+            db.session.commit()
+            publish_progress(task_event(processing_queue))
+            return jsonify(message="File uploaded, result served from cache", task_id=processing_queue.id, cached=True), 201
+
+        db.session.commit()
+        publish_progress(task_event(processing_queue))
+
+        return jsonify(message="File uploaded and task queued", task_id=processing_queue.id), 201
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify(message=f"Database error: {str(e)}"), 500
+
 # Route to test insert a row into the processing_queue
 @api_bp.route('/upload', methods=['POST'])
 def add_processing_queue():
@@ -31,62 +88,321 @@ def add_processing_queue():
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-        print(f"File saved to {file_path}")
+        extension = filename.rsplit('.', 1)[1].lower()
 
-        # You may later extract metadata like duration, size, etc. using ffmpeg or similar
+        # Optional scheduling priority, higher priority jobs are claimed first
         try:
-            processing_queue = ProcessingQueue(
-                file_name=filename,
-                status="QUEUED",
-                format=filename.rsplit('.', 1)[1].lower(),
-                upload_timestamp=datetime.utcnow(),
-                size=os.path.getsize(file_path) / (1024 * 1024),  # in MB
-                resolution=None,  # to be filled during processing
-                duration_seconds=None,    # to be filled during processing
-            )
-            db.session.add(processing_queue)
-            db.session.commit()
+            priority = int(request.form.get('priority', 0))
+        except ValueError:
+            return jsonify(message="Priority must be an integer"), 400
+
+        # Optional per-job profiler
+        profile_mode = request.form.get('profile') or None
+        if profile_mode is not None and profile_mode not in PROFILE_MODES:
+            return jsonify(message=f"Profile must be one of {', '.join(PROFILE_MODES)}"), 400
 
-            return jsonify(message="File uploaded and task queued", task_id=processing_queue.id), 201
+        # Hash the upload while saving it under its content hash
+        video_hash, stored_file_name = save_stream_with_hash(file.stream, UPLOAD_FOLDER, extension)
+        file_path = os.path.join(UPLOAD_FOLDER, stored_file_name)
+        print(f"File saved to {file_path}")
 
-        except SQLAlchemyError as e:
-            db.session.rollback()
-            return jsonify(message=f"Database error: {str(e)}"), 500
+        return queue_uploaded_video(filename, extension, video_hash, stored_file_name, priority, profile_mode)
     else:
         return jsonify(message="Unsupported file type"), 400
 
+# Resumable uploads (tus-like): create a session, PATCH chunks at their byte offset, then finalize
+# Chunks are streamed straight into the upload folder, and an interrupted upload resumes from the offset
+# reported by HEAD instead of starting over. The job is only queued once the whole file has arrived.
+@api_bp.errorhandler(UploadSessionError)
+def handle_upload_session_error(e):
+    return jsonify(message=e.message), e.status_code
+
+def upload_session_response(session, status_code):
+    response = jsonify(upload_id=session["upload_id"], offset=session["offset"], size=session["size"])
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(session["offset"])
+    response.headers['Upload-Length'] = str(session["size"])
+    response.headers['Location'] = f"/api/uploads/{session['upload_id']}"
+    return response
+
+@api_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    body = request.get_json(silent=True) or {}
+    file_name = body.get('file_name', '')
+
+    if not file_name or not allowed_file(file_name):
+        return jsonify(message="Unsupported file type"), 400
+
+    try:
+        size = int(body['size'])
+        priority = int(body.get('priority', 0))
+    except (KeyError, TypeError, ValueError):
+        return jsonify(message="size and priority must be integers"), 400
+
+    if size <= 0:
+        return jsonify(message="size must be positive"), 400
+
+    profile_mode = body.get('profile') or None
+    if profile_mode is not None and profile_mode not in PROFILE_MODES:
+        return jsonify(message=f"profile must be one of {', '.join(PROFILE_MODES)}"), 400
+
+    filename = secure_filename(file_name)
+    session = create_session(UPLOAD_FOLDER, filename, filename.rsplit('.', 1)[1].lower(), size, priority, profile_mode)
+    session["offset"] = 0
+    return upload_session_response(session, 201)
+
+@api_bp.route('/uploads/<upload_id>', methods=['HEAD', 'GET'])
+def get_upload(upload_id):
+    return upload_session_response(get_session(UPLOAD_FOLDER, upload_id), 200)
+
+@api_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+def patch_upload(upload_id):
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify(message="Missing or invalid Upload-Offset header"), 400
+
+    new_offset = write_chunk(UPLOAD_FOLDER, upload_id, offset, request.stream)
+    response = current_app.response_class(status=204)
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+@api_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    session, video_hash, stored_file_name = finalize_session(UPLOAD_FOLDER, upload_id)
+    print(f"File saved to {os.path.join(UPLOAD_FOLDER, stored_file_name)}")
+    return queue_uploaded_video(session["file_name"], session["extension"], video_hash, stored_file_name,
+                                session["priority"], session.get("profile_mode"))
+
+# Live stream jobs: queue a feed by URL, the claiming worker runs detection and tracking on it until the feed
+# ends or it is stopped. Counts are updated on the row as it runs and the annotated feed is served as rolling HLS.
+@api_bp.route('/streams', methods=['POST'])
+def create_stream():
+    body = request.get_json(silent=True) or {}
+    source_url = (body.get('source_url') or '').strip()
+    allowed_schemes = {scheme.strip() for scheme in current_app.config.get("STREAM_ALLOWED_SCHEMES", "").split(",") if scheme.strip()}
+
+    if not source_url or get_stream_scheme(source_url) not in allowed_schemes:
+        return jsonify(message=f"source_url must be a stream URL with one of the schemes {', '.join(sorted(allowed_schemes))}"), 400
+
+    try:
+        priority = int(body.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify(message="Priority must be an integer"), 400
+
+    try:
+        stream = ProcessingQueue(
+            file_name=secure_filename(body.get('name') or '') or 'stream',
+            status="QUEUED",
+            job_type="stream",
+            source_url=source_url,
+            priority=priority,
+            format="stream",
+            upload_timestamp=datetime.utcnow(),
+        )
+        db.session.add(stream)
+        db.session.commit()
+        publish_progress(task_event(stream))
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify(message=f"Database error: {str(e)}"), 500
+
+    return jsonify(message="Stream queued", task_id=stream.id,
+                   hls_manifest_url=f"/assets/videos/hls/{stream.id}/{HLS_MASTER_PLAYLIST}"), 201
+
+# Route to retrieve the live counts of a stream job
+@api_bp.route('/streams/<int:task_id>', methods=['GET'])
+def get_stream(task_id):
+    stream = ProcessingQueue.query.filter_by(id=task_id, job_type='stream').first()
+    if stream is None:
+        return jsonify({'error': 'No stream found with that ID'}), 404
+
+    return jsonify({
+        'id': stream.id,
+        'name': stream.file_name,
+        'status': stream.status,
+        'live_count': stream.live_count,
+        'detected_objects': stream.detected_objects,
+        'processed_frames': stream.processed_frames,
+        'dropped_frames': stream.dropped_frames,
+        'stream_latency_ms': stream.stream_latency_ms,
+        'processing_fps': stream.processing_fps,
+        'average_confidence': stream.average_confidence,
+        'resolution': stream.resolution,
+        'stop_requested': bool(stream.stop_requested),
+        'updated_at': stream.updated_at.isoformat() if stream.updated_at else None,
+        'hls_manifest_url': get_hls_manifest_url(stream),
+    }), 200
+
+# Route to end a stream job, a queued stream completes straight away and a running one at its next row update
+@api_bp.route('/streams/<int:task_id>/stop', methods=['POST'])
+def stop_stream(task_id):
+    stream = ProcessingQueue.query.filter_by(id=task_id, job_type='stream').first()
+    if stream is None:
+        return jsonify({'error': 'No stream found with that ID'}), 404
+
+    # Conditional so a stream a worker claims in the meantime is left to that worker
+    completed = (
+        ProcessingQueue.query
+        .filter_by(id=task_id, status='QUEUED')
+        .update({"status": 'COMPLETED', "stop_requested": True}, synchronize_session=False)
+    )
+    if not completed:
+        stream.stop_requested = True
+    db.session.commit()
+    publish_progress(task_event(stream))
+    return jsonify(message="Stream stop requested", task_id=stream.id, status=stream.status), 202
+
+# Default and maximum rows per /processing_queue page, clients follow next_cursor for older rows
+PROCESSING_QUEUE_PAGE_SIZE = 50
+MAX_PROCESSING_QUEUE_PAGE_SIZE = 500
+
+# A row can commit a moment after its updated_at was set, so next_since steps back by this margin
+# and clients merge the few repeated rows by id
+UPDATED_SINCE_MARGIN = timedelta(seconds=5)
+
+def serialize_task(task):
+    return {
+        'id': task.id,
+        'file_name': task.file_name,
+        'upload_timestamp': task.upload_timestamp,
+        'status': task.status,
+        'format': task.format,
+        'duration_seconds': task.duration_seconds,
+        'size': task.size,
+        'resolution': task.resolution,
+        'progress_percentage': task.progress_percentage,
+        'processing_time': task.processing_time,
+        'processed_frames': task.processed_frames,
+        'detected_objects': task.detected_objects,
+        'average_confidence': task.average_confidence,
+        'priority': task.priority,
+        'job_type': task.job_type,
+        'live_count': task.live_count,
+        'thumbnail_path': task.thumbnail_path,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None
+    }
+
+# Keyset cursors are "<iso timestamp>_<id>" of the last row on the previous page
+def encode_cursor(timestamp, task_id):
+    return f"{timestamp.isoformat()}_{task_id}"
+
+def decode_cursor(cursor):
+    timestamp, task_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(timestamp), int(task_id)
+
 # Route to retrieve rows from the processing_queue
+# Without `since`: newest uploads first, one page at a time via `cursor`.
+# With `since`: only rows changed after that time, oldest change first, so a poller only fetches the delta.
+# Unchanged polls get a 304 from a count/max(updated_at) fingerprint without loading any rows.
 @api_bp.route('/processing_queue', methods=['GET'])
 def get_processing_queue():
     try:
-        # Query the processing_queue table for all rows, ordered by upload_timestamp (newest first)
-        processing_queue = ProcessingQueue.query.order_by(desc(ProcessingQueue.upload_timestamp)).all()
-
-        # Convert the rows to a list of dictionaries
-        result = []
-        for task in processing_queue:
-            result.append({
-                'id': task.id,
-                'file_name': task.file_name,
-                'upload_timestamp': task.upload_timestamp,
-                'status': task.status,
-                'format': task.format,
-                'duration_seconds': task.duration_seconds,
-                'size': task.size,
-                'resolution': task.resolution,
-                'progress_percentage': task.progress_percentage,
-                'processing_time': task.processing_time,
-                'processed_frames': task.processed_frames,
-                'detected_objects': task.detected_objects,
-                'average_confidence': task.average_confidence
-            })
-
-        return jsonify(result=result), 200
+        limit = max(1, min(int(request.args.get('limit', PROCESSING_QUEUE_PAGE_SIZE)), MAX_PROCESSING_QUEUE_PAGE_SIZE))
+        since = datetime.fromisoformat(request.args['since']) if 'since' in request.args else None
+        cursor = decode_cursor(request.args['cursor']) if 'cursor' in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit must be an integer, since an ISO timestamp and cursor a value from next_cursor"}), 400
+
+    try:
+        total, last_update = db.session.query(func.count(ProcessingQueue.id), func.max(ProcessingQueue.updated_at)).one()
+        etag = hashlib.sha1(f"{request.query_string.decode()}|{total}|{last_update}".encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        query = ProcessingQueue.query
+        if request.args.get('status'):
+            query = query.filter(ProcessingQueue.status == request.args['status'].upper())
+
+        if since is not None:
+            sort_key = (ProcessingQueue.updated_at, ProcessingQueue.id)
+            query = query.filter(ProcessingQueue.updated_at > since)
+            if cursor:
+                query = query.filter(tuple_(*sort_key) > cursor)
+            query = query.order_by(*sort_key)
+        else:
+            sort_key = (ProcessingQueue.upload_timestamp, ProcessingQueue.id)
+            if cursor:
+                query = query.filter(tuple_(*sort_key) < cursor)
+            query = query.order_by(*(desc(column) for column in sort_key))
+
+        # One extra row tells whether there is another page
+        tasks = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            last = tasks[-1]
+            next_cursor = encode_cursor(last.updated_at if since is not None else last.upload_timestamp, last.id)
+
+        # Derived from the table rather than the clock, so repeat polls of an unchanged table hit the same ETag
+        next_since = (last_update - UPDATED_SINCE_MARGIN).isoformat() if last_update else request.args.get('since')
+
+        response = jsonify(result=[serialize_task(task) for task in tasks], next_cursor=next_cursor, next_since=next_since)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Seconds between SSE comments on an idle stream, keeps proxies from closing the connection
+PROGRESS_KEEPALIVE_SECONDS = 15
+
+def format_sse(event):
+    return f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+# Server-Sent Events stream of job progress (status, progress, fps, ETA) for one task or, without task_id, the whole queue
+# Starts with the current state, then pushes every event a worker publishes. A task stream ends once the job finishes.
+@api_bp.route('/progress/stream', methods=['GET'])
+def stream_progress():
+    task_id = request.args.get('task_id', type=int)
+
+    if task_id is not None:
+        task = ProcessingQueue.query.get(task_id)
+        if not task:
+            return jsonify({'error': 'No task found with that ID'}), 404
+        initial_events = progress_broker.snapshot(task_id) or [task_event(task)]
+    else:
+        initial_events = progress_broker.snapshot()
+
+    # Subscribe before streaming so no event between the snapshot and the first read is lost
+    subscriber = progress_broker.subscribe()
+
+    def generate():
+        try:
+            for event in initial_events:
+                yield format_sse(event)
+                if task_id is not None and event["status"] in TERMINAL_STATUSES:
+                    return
+
+            while True:
+                try:
+                    event = subscriber.get(timeout=PROGRESS_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if task_id is not None and event["task_id"] != task_id:
+                    continue
+                yield format_sse(event)
+                if task_id is not None and event["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            progress_broker.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx buffering the stream
+    return response
+
+# URL of a task's HLS master playlist, None when the job wrote no HLS output
+def get_hls_manifest_url(task):
+    if not os.path.isfile(os.path.join(get_hls_dir(task), HLS_MASTER_PLAYLIST)):
+        return None
+    return f"/assets/videos/hls/{task.id}/{HLS_MASTER_PLAYLIST}"
+
 @api_bp.route('/analysis', methods=['GET'])
 def get_analysis_from_task():
     task_id = request.args.get('task_id')
@@ -113,7 +429,100 @@ def get_analysis_from_task():
                 'processing_time': processing_result.processing_time,
                 'processed_frames': processing_result.processed_frames,
                 'detected_objects': processing_result.detected_objects,
-                'average_confidence': processing_result.average_confidence
+                'average_confidence': processing_result.average_confidence,
+                'inference_frames': processing_result.inference_frames,
+                'skipped_frames': processing_result.skipped_frames,
+                'keyframe_drift_px': processing_result.keyframe_drift_px,
+                'processing_fps': processing_result.processing_fps,
+                'queue_wait_seconds': processing_result.queue_wait_seconds,
+                'hls_manifest_url': get_hls_manifest_url(processing_result)
             }
 
     return jsonify(response_data), 200
+
+# Route to retrieve a job's per-stage timings and pipeline queue depths, updated while it runs
+@api_bp.route('/processing_queue/<int:task_id>/metrics', methods=['GET'])
+def get_task_metrics(task_id):
+    task = ProcessingQueue.query.get(task_id)
+    if task is None:
+        return jsonify({'error': 'No task found with that ID'}), 404
+
+    has_profile = task.profile_path is not None and os.path.isfile(task.profile_path)
+    return jsonify({
+        'task_id': task.id,
+        'status': task.status,
+        'queue_wait_seconds': task.queue_wait_seconds,
+        'processing_time': task.processing_time,
+        'processing_fps': task.processing_fps,
+        'stage_metrics': task.stage_metrics,
+        'profile_mode': task.profile_mode,
+        'profile_url': f"/api/processing_queue/{task.id}/profile" if has_profile else None,
+    }), 200
+
+# Route to download a profiled job's cProfile stats (.prof) or torch trace (.json, open in chrome://tracing)
+@api_bp.route('/processing_queue/<int:task_id>/profile', methods=['GET'])
+def get_task_profile(task_id):
+    task = ProcessingQueue.query.get(task_id)
+    if task is None or not task.profile_path or not os.path.isfile(task.profile_path):
+        return jsonify({'error': 'No profile found for that task ID'}), 404
+    return send_file(task.profile_path, as_attachment=True, download_name=os.path.basename(task.profile_path))
+
+# Readiness probe: the API is ready once the database is reachable and, when workers run in this process, the model has loaded
+@api_bp.route('/ready', methods=['GET'])
+def get_readiness():
+    try:
+        db.session.execute('SELECT 1')
+        database_ready = True
+    except SQLAlchemyError:
+        db.session.rollback()
+        database_ready = False
+
+    status = model_status()
+    model_in_process = current_app.config.get("START_WORKER", True) and current_app.config.get("WORKER_MODE") != "process"
+    model_ready = status["state"] == "ready" or not model_in_process
+
+    ready = database_ready and model_ready
+    return jsonify(ready=ready, database=database_ready, model=status), 200 if ready else 503
+
+# Maximum track rows returned by a single /tracks request, clients page through longer ranges by time
+MAX_TRACK_ROWS = 100000
+
+# Route to retrieve per-frame boxes, scores and track ids of a processed video for a time range in seconds
+@api_bp.route('/tracks', methods=['GET'])
+def get_tracks_for_task():
+    task_id = request.args.get('task_id')
+
+    if not task_id:
+        return jsonify({'error': 'Missing task_id parameter'}), 400
+
+    try:
+        start = float(request.args.get('start', 0))
+        end = float(request.args['end']) if 'end' in request.args else None
+        limit = max(1, min(int(request.args.get('limit', MAX_TRACK_ROWS)), MAX_TRACK_ROWS))
+        if not math.isfinite(start) or (end is not None and not math.isfinite(end)):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'start and end must be finite numbers of seconds and limit an integer'}), 400
+
+    processing_result = ProcessingQueue.query.filter_by(id=task_id, status='COMPLETED').first()
+
+    if not processing_result or not processing_result.tracks_path or not os.path.isdir(processing_result.tracks_path):
+        return jsonify({'error': 'No track data found for that task ID'}), 404
+
+    meta, columns, truncated = read_time_range(processing_result.tracks_path, start, end, limit)
+
+    # NaN scores (interpolated boxes) are returned as null
+    response_data = {
+        'task_id': processing_result.id,
+        'fps': meta['fps'],
+        'frames': meta['frames'],
+        'start': start,
+        'end': end,
+        'truncated': truncated,
+        'columns': {
+            name: [None if value != value else value for value in column.tolist()]
+            for name, column in columns.items()
+        },
+    }
+
+    return jsonify(response_data), 200
@@ -0,0 +1,177 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Partial uploads live in a hidden folder inside the upload folder, so finalising is a rename on the same disk
+PARTIAL_FOLDER_NAME = ".partial"
+
+# Abandoned upload sessions older than this are removed when a new session starts
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+# Size of each read from the request body while writing a chunk
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Running sha256 per upload for chunks that arrive in order at this process; any gap and the hash is
+# recomputed from disk on finalise instead, so sessions still work across processes and restarts
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadSessionError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _partial_folder(upload_folder):
+    folder = os.path.join(upload_folder, PARTIAL_FOLDER_NAME)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _session_paths(upload_folder, upload_id):
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise UploadSessionError("Upload not found", 404)
+    folder = _partial_folder(upload_folder)
+    return os.path.join(folder, f"{upload_id}.json"), os.path.join(folder, f"{upload_id}.part")
+
+
+# Remove partial uploads that have not been written to within the TTL
+def expire_sessions(upload_folder):
+    folder = _partial_folder(upload_folder)
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            with _hashers_lock:
+                _hashers.pop(name.split(".", 1)[0], None)
+
+
+# Start an upload session, returns its metadata
+def create_session(upload_folder, file_name, extension, size, priority, profile_mode=None):
+    expire_sessions(upload_folder)
+
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _session_paths(upload_folder, upload_id)
+    session = {
+        "upload_id": upload_id,
+        "file_name": file_name,
+        "extension": extension,
+        "size": size,
+        "priority": priority,
+        "profile_mode": profile_mode,
+        "created_at": time.time(),
+    }
+    open(part_path, "wb").close()
+    with open(meta_path, "w") as f:
+        json.dump(session, f)
+
+    with _hashers_lock:
+        _hashers[upload_id] = (0, hashlib.sha256())
+    return session
+
+
+# Load a session with its current offset, the size of the partial file is the source of truth
+def get_session(upload_folder, upload_id):
+    meta_path, part_path = _session_paths(upload_folder, upload_id)
+    if not os.path.exists(meta_path) or not os.path.exists(part_path):
+        raise UploadSessionError("Upload not found", 404)
+    with open(meta_path) as f:
+        session = json.load(f)
+    session["offset"] = os.path.getsize(part_path)
+    return session
+
+
+# Open an upload's partial file holding an exclusive lock, so one request at a time appends to or finalises it
+# The lock is taken across processes with flock, a request that finds it held gets a 409 and can retry from the
+# offset HEAD reports. The file is checked again under the lock in case a finalise moved it meanwhile.
+@contextmanager
+def _locked_part(part_path):
+    try:
+        f = open(part_path, "r+b")
+    except FileNotFoundError:
+        raise UploadSessionError("Upload not found", 404) from None
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadSessionError("Another request is writing to this upload", 409) from None
+        if not os.path.exists(part_path):
+            raise UploadSessionError("Upload not found", 404)
+        yield f
+
+
+# Append a chunk read from a stream at the given offset, returns the new offset
+# The body is copied in bounded reads straight to the partial file, never buffered whole in memory.
+def write_chunk(upload_folder, upload_id, offset, stream):
+    session = get_session(upload_folder, upload_id)
+    _, part_path = _session_paths(upload_folder, upload_id)
+
+    with _locked_part(part_path) as f:
+        # The size under the lock is the offset, a concurrent chunk at the same offset may have landed first
+        current_offset = os.fstat(f.fileno()).st_size
+        if offset != current_offset:
+            raise UploadSessionError(f"Upload-Offset {offset} does not match current offset {current_offset}", 409)
+
+        with _hashers_lock:
+            hasher_offset, hasher = _hashers.pop(upload_id, (None, None))
+        if hasher_offset != offset:
+            hasher = None  # Out of order for this process, hash from disk on finalise
+
+        written = offset
+        f.seek(offset)
+        while True:
+            chunk = stream.read(WRITE_CHUNK_SIZE)
+            if not chunk:
+                break
+            if written + len(chunk) > session["size"]:
+                f.truncate(offset)
+                raise UploadSessionError("Chunk goes past the declared upload size", 413)
+            f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            written += len(chunk)
+
+        if hasher is not None:
+            with _hashers_lock:
+                _hashers[upload_id] = (written, hasher)
+    return written
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(WRITE_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+# Complete an upload: check it is whole, move it to its content-addressed name and close the session
+# Returns (session, video_hash, stored_file_name)
+def finalize_session(upload_folder, upload_id):
+    session = get_session(upload_folder, upload_id)
+    meta_path, part_path = _session_paths(upload_folder, upload_id)
+
+    with _locked_part(part_path) as f:
+        received = os.fstat(f.fileno()).st_size
+        if received != session["size"]:
+            raise UploadSessionError(f"Upload incomplete, {received} of {session['size']} bytes received", 409)
+
+        with _hashers_lock:
+            hasher_offset, hasher = _hashers.pop(upload_id, (None, None))
+        video_hash = hasher.hexdigest() if hasher_offset == session["size"] else _hash_file(part_path)
+
+        stored_file_name = f"{video_hash}.{session['extension']}"
+        os.replace(part_path, os.path.join(upload_folder, stored_file_name))
+        os.remove(meta_path)
+    return session, video_hash, stored_file_name
@@ -0,0 +1,145 @@
+import os
+import uuid
+from datetime import datetime, timezone
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+# Bytes read per chunk when streaming a range, bounds the memory each viewer costs
+RANGE_CHUNK_SIZE = 256 * 1024
+
+# Requests asking for more separate ranges than this (after merging overlaps) are rejected with 416
+MAX_RANGES = 16
+
+
+# Parse a Range header against a file size into sorted, merged (start, end) byte spans with end exclusive
+# Handles "N-M", open-ended "N-" and suffix "-N" forms in any order or combination. Returns None when the
+# header is malformed or not in bytes, which means it is ignored, and [] when no span is satisfiable.
+def parse_byte_ranges(header, file_size):
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes":
+        return None
+
+    spans = []
+    items = [item.strip() for item in spec.split(",") if item.strip()]
+    if not items:
+        return None
+
+    for item in items:
+        first, separator, last = (part.strip() for part in item.partition("-"))
+        if not separator or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # Suffix range, the last N bytes
+            if not last:
+                return None
+            length = int(last)
+            if length > 0 and file_size > 0:
+                spans.append((max(file_size - length, 0), file_size))
+            continue
+
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < file_size:
+            end = int(last) + 1 if last else file_size
+            spans.append((start, min(end, file_size)))
+
+    # Coalesce overlapping and adjacent spans so no byte is sent twice
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# Stream bytes [start, end) of a file with positioned reads of bounded size
+def iter_file_range(path, start, end):
+    with open(path, "rb") as f:
+        offset = start
+        while offset < end:
+            chunk = os.pread(f.fileno(), min(RANGE_CHUNK_SIZE, end - offset), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+
+
+def _iter_multipart(path, parts, closing):
+    for part_header, start, end in parts:
+        yield part_header
+        yield from iter_file_range(path, start, end)
+    yield closing
+
+
+# Serve a file with full HTTP range and conditional request support, never holding more than a chunk in memory
+# Full responses go through the server's wsgi.file_wrapper, which servers such as gunicorn send with sendfile.
+def send_video(path, mimetype="video/mp4", max_age=0):
+    stat = os.stat(path)
+    file_size = stat.st_size
+    etag = f"{stat.st_mtime_ns:x}-{file_size:x}"
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+
+    def with_validators(response):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers["Accept-Ranges"] = "bytes"
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response
+
+    # If-None-Match / If-Modified-Since: the client's copy is current
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified, ignore_if_range=True):
+        return with_validators(Response(status=304))
+
+    spans = None
+    range_header = request.headers.get("Range")
+    if range_header and request.method in ("GET", "HEAD"):
+        # If-Range: only honour the range when the client's validator still matches, else send the whole file
+        if_range = request.if_range
+        if if_range.etag is not None:
+            range_valid = if_range.etag == etag
+        elif if_range.date is not None:
+            range_valid = if_range.date == last_modified
+        else:
+            range_valid = True
+        if range_valid:
+            spans = parse_byte_ranges(range_header, file_size)
+
+    if spans is None:
+        response = Response(wrap_file(request.environ, open(path, "rb"), RANGE_CHUNK_SIZE),
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = file_size
+        return with_validators(response)
+
+    if not spans or len(spans) > MAX_RANGES:
+        response = Response(status=416)
+        response.headers["Content-Range"] = f"bytes */{file_size}"
+        return with_validators(response)
+
+    if len(spans) == 1:
+        start, end = spans[0]
+        response = Response(iter_file_range(path, start, end), status=206, mimetype=mimetype, direct_passthrough=True)
+        response.headers["Content-Range"] = f"bytes {start}-{end - 1}/{file_size}"
+        response.content_length = end - start
+        return with_validators(response)
+
+    # Several ranges: multipart/byteranges body, its exact length is known up front
+    boundary = uuid.uuid4().hex
+    parts = []
+    for start, end in spans:
+        part_header = (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n"
+        ).encode()
+        parts.append((part_header, start, end))
+    closing = f"\r\n--{boundary}--\r\n".encode()
+
+    response = Response(_iter_multipart(path, parts, closing), status=206,
+                        mimetype=f"multipart/byteranges; boundary={boundary}", direct_passthrough=True)
+    response.content_length = sum(len(header) + end - start for header, start, end in parts) + len(closing)
+    return with_validators(response)
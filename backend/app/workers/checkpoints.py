@@ -0,0 +1,42 @@
+import os
+import pickle
+import shutil
+
+CHECKPOINT_FILE = "checkpoint.pkl"
+
+# Encoded video parts live next to the checkpoint that lists them
+PARTS_DIR = "parts"
+
+
+# Write a job checkpoint atomically, a crash mid-write leaves the previous checkpoint in place
+def save_checkpoint(directory, state):
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f"{CHECKPOINT_FILE}.tmp")
+    with open(temp_path, "wb") as f:
+        pickle.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, os.path.join(directory, CHECKPOINT_FILE))
+
+
+# Load a job checkpoint, returns None when there is none or it cannot be resumed
+# A checkpoint taken with a different input or settings (fingerprint), or whose parts are gone, is ignored.
+def load_checkpoint(directory, fingerprint):
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+
+    if state.get("fingerprint") != fingerprint:
+        return None
+    if not all(os.path.exists(part) for part in state["parts"]):
+        return None
+    return state
+
+
+def clear_checkpoint(directory):
+    shutil.rmtree(directory, ignore_errors=True)
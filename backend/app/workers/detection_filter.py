@@ -0,0 +1,54 @@
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+
+# Score a detection must beat to be tracked, unless its class has its own threshold
+DEFAULT_SCORE_THRESHOLD = 0.95
+
+
+# Helper to parse per-class score thresholds given as "label:threshold" pairs, e.g. "1:0.9,2:0.8"
+def parse_class_thresholds(spec):
+    thresholds = {}
+    for item in (spec or "").split(","):
+        if item.strip():
+            label, threshold = item.split(":")
+            thresholds[int(label)] = float(threshold)
+    return thresholds
+
+
+# Threshold, de-duplicate and move a batch of predictions to the CPU in one go
+# All frames of the batch are filtered together on the model's device: per-class score thresholds, then an
+# optional class-agnostic NMS per frame (nms_iou 0 skips it) for duplicate boxes the model labelled differently.
+# The survivors are packed into a single tensor so the batch costs one device-to-host copy instead of one per
+# box, and come back as NumPy arrays per frame: boxes (N, 4), scores (N,) and labels (N,).
+def filter_predictions(predictions, score_threshold=DEFAULT_SCORE_THRESHOLD, class_thresholds=None, nms_iou=0):
+    if not predictions:
+        return []
+
+    boxes = torch.cat([prediction["boxes"] for prediction in predictions])
+    scores = torch.cat([prediction["scores"] for prediction in predictions])
+    labels = torch.cat([prediction["labels"] for prediction in predictions])
+    frame_ids = torch.cat([
+        torch.full((len(prediction["scores"]),), index, dtype=torch.int64, device=scores.device)
+        for index, prediction in enumerate(predictions)
+    ])
+
+    thresholds = torch.full_like(scores, score_threshold)
+    for label, threshold in (class_thresholds or {}).items():
+        thresholds[labels == label] = threshold
+    keep = scores > thresholds
+    boxes, scores, labels, frame_ids = boxes[keep], scores[keep], labels[keep], frame_ids[keep]
+
+    if nms_iou and len(scores):
+        # Sorting the kept indices restores frame order, and within a frame the model's score order
+        keep = batched_nms(boxes, scores, frame_ids, nms_iou).sort().values
+        boxes, scores, labels, frame_ids = boxes[keep], scores[keep], labels[keep], frame_ids[keep]
+
+    packed = torch.cat([boxes, scores[:, None], labels[:, None].to(boxes.dtype), frame_ids[:, None].to(boxes.dtype)], dim=1)
+    packed = packed.cpu().numpy()
+
+    counts = np.bincount(packed[:, 6].astype(np.int64), minlength=len(predictions))
+    return [
+        {"boxes": rows[:, :4], "scores": rows[:, 4], "labels": rows[:, 5].astype(np.int64)}
+        for rows in np.split(packed, np.cumsum(counts)[:-1])
+    ]
@@ -0,0 +1,136 @@
+import queue
+import threading
+
+# Sentinel passed between stages to mark the end of the frame stream
+END_OF_STREAM = object()
+
+# Seconds a blocked stage waits on a queue before re-checking for shutdown
+QUEUE_POLL_INTERVAL = 0.1
+
+
+# Staged frame pipeline: decode -> inference -> track/draw -> write
+# Each stage runs in its own thread and hands work to the next through a bounded queue, so a slow
+# stage applies backpressure upstream and memory stays capped at roughly queue_size batches per hop.
+# The write stage runs in the calling thread so per-frame callbacks (e.g. DB progress commits)
+# stay on the worker's own session/app context.
+class FramePipeline:
+    def __init__(self, read_frame, infer_batch, annotate_frame, write_frame, batch_size=1, queue_size=8):
+        self.read_frame = read_frame          # () -> (ret, frame), e.g. cv2.VideoCapture.read
+        self.infer_batch = infer_batch        # [frames] -> [predictions], one per frame
+        self.annotate_frame = annotate_frame  # (frame, predictions) -> annotated frame
+        self.write_frame = write_frame        # (frame) -> None, e.g. cv2.VideoWriter.write
+        self.batch_size = max(1, batch_size)
+
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._inferred = queue.Queue(maxsize=queue_size)
+        self._annotated = queue.Queue(maxsize=queue_size * self.batch_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    # Items waiting between stages, a full queue points at the stage after it as the bottleneck
+    def queue_depths(self):
+        return {"decoded": self._decoded.qsize(), "inferred": self._inferred.qsize(), "annotated": self._annotated.qsize()}
+
+    # Put an item on a queue, giving up if the pipeline is shutting down
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # Get an item from a queue, returning END_OF_STREAM if the pipeline is shutting down
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return END_OF_STREAM
+
+    # Record the first stage failure and signal every other stage to stop
+    def _fail(self, error):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _run_stage(self, stage, *args):
+        try:
+            stage(*args)
+        except Exception as e:
+            self._fail(e)
+
+    def _decode_stage(self):
+        batch = []
+        while not self._stop.is_set():
+            ret, frame = self.read_frame()
+            if not ret:
+                break
+            batch.append(frame)
+            if len(batch) >= self.batch_size:
+                if not self._put(self._decoded, batch):
+                    return
+                batch = []
+
+        # Flush the partial batch left at the end of the video
+        if batch and not self._put(self._decoded, batch):
+            return
+        self._put(self._decoded, END_OF_STREAM)
+
+    def _inference_stage(self):
+        while True:
+            batch = self._get(self._decoded)
+            if batch is END_OF_STREAM:
+                break
+            predictions = self.infer_batch(batch)
+            if not self._put(self._inferred, (batch, predictions)):
+                return
+        self._put(self._inferred, END_OF_STREAM)
+
+    def _annotate_stage(self):
+        while True:
+            item = self._get(self._inferred)
+            if item is END_OF_STREAM:
+                break
+            # Frames are annotated strictly in decode order so the tracker sees the same sequence as batch size 1
+            for frame, predictions in zip(*item):
+                if not self._put(self._annotated, self.annotate_frame(frame, predictions)):
+                    return
+        self._put(self._annotated, END_OF_STREAM)
+
+    def _write_stage(self, on_frame_written):
+        while True:
+            frame = self._get(self._annotated)
+            if frame is END_OF_STREAM:
+                break
+            self.write_frame(frame)
+            if on_frame_written is not None:
+                on_frame_written(frame)
+
+    # Run the pipeline to completion, re-raising the first stage error after all stages have shut down
+    def run(self, on_frame_written=None):
+        threads = [
+            threading.Thread(target=self._run_stage, args=(stage,), name=name, daemon=True)
+            for name, stage in (
+                ("pipeline-decode", self._decode_stage),
+                ("pipeline-inference", self._inference_stage),
+                ("pipeline-annotate", self._annotate_stage),
+            )
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._run_stage(self._write_stage, on_frame_written)
+        finally:
+            if self._error is not None:
+                self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,107 @@
+import inspect
+import os
+import torch
+import torch.nn as nn
+
+INFERENCE_BACKENDS = ("eager", "torchscript", "compile", "quantized", "onnx")
+
+
+# Scripted detection models always return a (losses, detections) tuple, unwrap it to match eager mode
+class TorchScriptDetector:
+    def __init__(self, scripted_model):
+        self.scripted_model = scripted_model
+
+    def __call__(self, images):
+        return self.scripted_model(images)[1]
+
+    def eval(self):
+        self.scripted_model.eval()
+        return self
+
+
+# ONNX Runtime session wrapped to take and return the same types as the eager model
+# The exported graph takes a single image, so a batch is run image by image.
+class OnnxDetector:
+    def __init__(self, onnx_path, intra_op_threads=None):
+        import onnxruntime  # Optional dependency, only needed for the onnx backend
+
+        options = onnxruntime.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        outputs = []
+        for image in images:
+            boxes, labels, scores = self.session.run(None, {self.input_name: image.cpu().numpy()})
+            outputs.append({
+                "boxes": torch.from_numpy(boxes),
+                "labels": torch.from_numpy(labels),
+                "scores": torch.from_numpy(scores),
+            })
+        return outputs
+
+    def eval(self):
+        return self
+
+
+# Helper to export an eager model to ONNX with dynamic image size
+def export_onnx(model, onnx_path, sample_size=(1080, 1920)):
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False  # torchvision detection models export through the TorchScript-based exporter
+
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    sample = [torch.rand(3, *sample_size)]
+    torch.onnx.export(
+        model, (sample,), onnx_path,
+        opset_version=11,
+        input_names=["image"],
+        output_names=["boxes", "labels", "scores"],
+        dynamic_axes={
+            "image": {1: "height", 2: "width"},
+            "boxes": {0: "detections"},
+            "labels": {0: "detections"},
+            "scores": {0: "detections"},
+        },
+        **export_kwargs,
+    )
+
+
+# Convert an eager fp32 model in eval mode into the selected inference backend
+# eager       fp32 eager mode, the reference
+# torchscript torch.jit.script, loaded from / saved to artifact_path when given
+# compile     torch.compile of the eager model
+# quantized   dynamic int8 quantization of the Linear layers (box head MLP, classifier head, bbox regressor), CPU only
+# onnx        ONNX Runtime session, exported to artifact_path on first use
+def apply_backend(model, backend, device, artifact_path=None):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {INFERENCE_BACKENDS}")
+
+    if backend == "eager":
+        return model
+
+    if backend == "torchscript":
+        if artifact_path and os.path.exists(artifact_path):
+            return TorchScriptDetector(torch.jit.load(artifact_path, map_location=device)).eval()
+        scripted = torch.jit.script(model)
+        if artifact_path:
+            os.makedirs(os.path.dirname(os.path.abspath(artifact_path)), exist_ok=True)
+            torch.jit.save(scripted, artifact_path)
+        return TorchScriptDetector(scripted).eval()
+
+    if backend == "compile":
+        return torch.compile(model)
+
+    if device.type != "cpu":
+        raise ValueError(f"The {backend} backend only runs on CPU")
+
+    if backend == "quantized":
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    if not artifact_path:
+        raise ValueError("The onnx backend needs an artifact path to export the model to")
+    if not os.path.exists(artifact_path):
+        export_onnx(model, artifact_path)
+    return OnnxDetector(artifact_path, torch.get_num_threads())
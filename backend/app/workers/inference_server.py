@@ -0,0 +1,178 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import torch
+from app.workers.job_metrics import metrics_registry, record_error
+
+# Upper bounds of the images-per-forward-pass buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Seconds between shipping the server process's metrics to the API process
+SERVER_METRICS_INTERVAL = 10
+
+# Client of the shared inference server used by this process's jobs, None runs the model directly
+_inference_client = None
+
+
+def set_inference_client(client):
+    global _inference_client
+    _inference_client = client
+
+
+def get_inference_client():
+    return _inference_client
+
+
+# Dynamic batcher that owns the only calls into the model for every job in a process
+# Jobs submit lists of BGR images from any thread. A single batching thread takes the oldest request, keeps
+# adding queued requests until the batch holds max_batch images or max_latency seconds have passed since that
+# request arrived, runs run_batch once on all of them and hands each request its slice of the outputs.
+# Requests are never split: one that would overflow the batch starts the next one, and a request larger than
+# max_batch runs on its own. While a forward pass is running new requests queue up, so under load batches fill
+# without waiting and a lone request waits at most max_latency.
+class DynamicBatcher:
+    def __init__(self, run_batch, max_batch=8, max_latency=0.01, registry=metrics_registry):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_latency = max(0, max_latency)
+        self.registry = registry
+        self.requests = queue.Queue()
+        self._carry = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name="inference-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    # Queue images for inference, returns a Future of their outputs in image order
+    def submit(self, images):
+        future = Future()
+        if not images:
+            future.set_result([])
+        else:
+            self.requests.put((list(images), future, time.monotonic()))
+        return future
+
+    # Same call shape as the model, so a job can use the batcher in its place
+    def __call__(self, images):
+        return self.submit(images).result()
+
+    def _next_batch(self):
+        first, self._carry = self._carry or self.requests.get(), None
+        batch, size = [first], len(first[0])
+        deadline = first[2] + self.max_latency
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            images = [image for request in batch for image in request[0]]
+            try:
+                outputs = self.run_batch(images)
+            except Exception as e:
+                record_error("inference_server", e)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.registry.observe("agritrack_inference_batch_images", len(images), buckets=BATCH_SIZE_BUCKETS)
+            start = 0
+            for request_images, future, submitted_at in batch:
+                self.registry.observe("agritrack_inference_queue_seconds", started - submitted_at)
+                future.set_result(outputs[start:start + len(request_images)])
+                start += len(request_images)
+
+
+# Helper to make model outputs picklable by value, so they cross process queues without shared-memory handles
+def outputs_to_numpy(outputs):
+    return [{key: value.cpu().numpy() for key, value in output.items()} for output in outputs]
+
+
+def outputs_from_numpy(outputs):
+    return [{key: torch.from_numpy(value) for key, value in output.items()} for output in outputs]
+
+
+# Entry point of the inference server process started by the process pool
+# It is the only process that loads the model. Requests arrive on request_queue as (slot, request id, images)
+# and outputs, or the error raised, go back on that worker slot's response queue with the request id.
+def inference_server_main(request_queue, response_queues, done_queue, max_batch, max_latency, torch_threads):
+    torch.set_num_threads(torch_threads)
+
+    from app.workers.model_loader import get_loaded_model
+    from app.workers.video_worker import forward_images
+
+    try:
+        get_loaded_model()
+    except Exception as e:
+        record_error("model_load", e)  # Retried lazily by the first batch
+
+    batcher = DynamicBatcher(forward_images, max_batch, max_latency).start()
+
+    def reply(slot, request_id, future):
+        error = future.exception()
+        if error is not None:
+            response_queues[slot].put((request_id, RuntimeError(f"Inference server failed: {error}")))
+        else:
+            response_queues[slot].put((request_id, outputs_to_numpy(future.result())))
+
+    last_metrics = time.monotonic()
+    while True:
+        try:
+            message = request_queue.get(timeout=SERVER_METRICS_INTERVAL)
+        except queue.Empty:
+            message = False
+        if message is None:
+            break
+        if message:
+            slot, request_id, images = message
+            batcher.submit(images).add_done_callback(lambda future, slot=slot, request_id=request_id: reply(slot, request_id, future))
+
+        # Metrics go out without a slot, so the pool merges them without marking a worker idle
+        if time.monotonic() - last_metrics >= SERVER_METRICS_INTERVAL:
+            done_queue.put((None, metrics_registry.drain()))
+            last_metrics = time.monotonic()
+
+
+# Model stand-in used by worker processes when the inference server owns the model
+# Calls block until the server replies. Each worker process runs one job at a time, so it has one response queue;
+# request ids let it discard a reply left over from a call that timed out.
+class InferenceServerClient:
+    def __init__(self, slot, request_queue, response_queue, timeout=120):
+        self.slot = slot
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.request_ids = itertools.count()
+
+    def __call__(self, images):
+        with self.lock:
+            request_id = next(self.request_ids)
+            self.request_queue.put((self.slot, request_id, list(images)))
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    reply_id, result = self.response_queue.get(timeout=max(remaining, 0.001))
+                except queue.Empty:
+                    raise TimeoutError(f"No reply from the inference server within {self.timeout}s") from None
+                if reply_id != request_id:
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+                return outputs_from_numpy(result)
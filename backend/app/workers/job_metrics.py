@@ -0,0 +1,291 @@
+import bisect
+import cProfile
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import torch
+from sqlalchemy import func
+from app.extensions import db
+from app.models.processing_queue import ProcessingQueue
+
+logger = logging.getLogger(__name__)
+
+# Hot-path stages timed by the worker, in pipeline order
+PIPELINE_STAGES = ("decode", "preprocess", "inference", "postprocess", "track", "draw", "write")
+
+# Upper bounds in seconds of the stage latency buckets, from a single draw call up to a slow tiled forward pass
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Upper bounds in seconds for job-level durations such as queue wait and processing time
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+# Per-job profilers: "cprofile" profiles every pipeline stage deterministically, "torch" records a window of
+# inference batches with the torch profiler as a Chrome trace
+PROFILE_MODES = ("cprofile", "torch")
+
+METRICS = {
+    "agritrack_stage_seconds": ("histogram", "Seconds per call spent in each worker pipeline stage"),
+    "agritrack_job_wait_seconds": ("histogram", "Seconds jobs waited in the queue before a worker started them"),
+    "agritrack_job_processing_seconds": ("histogram", "Wall time of jobs processed by a worker"),
+    "agritrack_jobs_total": ("counter", "Jobs finished, by outcome"),
+    "agritrack_frames_total": ("counter", "Frames written by workers"),
+    "agritrack_stream_latency_seconds": ("histogram", "Seconds from reading a live stream frame to writing it out"),
+    "agritrack_stream_dropped_frames_total": ("counter", "Live stream frames dropped to stay within the latency budget"),
+    "agritrack_inference_batch_images": ("histogram", "Images per forward pass run by the shared inference server"),
+    "agritrack_inference_queue_seconds": ("histogram", "Seconds requests waited for the shared inference server to start their batch"),
+    "agritrack_errors_total": ("counter", "Errors caught by workers, by where they were caught"),
+    "agritrack_pipeline_queue_depth": ("gauge", "Items waiting in each worker pipeline queue at the last sample"),
+    "agritrack_queue_jobs": ("gauge", "Jobs in the processing queue, by status"),
+    "agritrack_queue_oldest_wait_seconds": ("gauge", "Age of the oldest queued job"),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+# Process-wide counters, gauges and histograms rendered in the Prometheus text format
+# Worker processes drain theirs after each job and the API process merges them in, so /metrics covers every worker.
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        with self.lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    # Bucket counts are stored per bucket and only made cumulative when rendered
+    def observe(self, name, value, labels=None, buckets=STAGE_BUCKETS):
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0}
+            histogram["counts"][bisect.bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+
+    # Take and reset everything recorded so far, used to ship a worker process's metrics to the API process
+    def drain(self):
+        with self.lock:
+            snapshot = {"counters": self.counters, "gauges": self.gauges, "histograms": self.histograms}
+            self.counters, self.gauges, self.histograms = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self.lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(snapshot["gauges"])
+            for key, histogram in snapshot["histograms"].items():
+                existing = self.histograms.get(key)
+                if existing is None or existing["buckets"] != histogram["buckets"]:
+                    self.histograms[key] = histogram
+                    continue
+                existing["counts"] = [a + b for a, b in zip(existing["counts"], histogram["counts"])]
+                existing["sum"] += histogram["sum"]
+
+    def render(self, extra_gauges=()):
+        with self.lock:
+            samples = {}
+            for (name, label_key), value in list(self.counters.items()) + list(self.gauges.items()):
+                samples.setdefault(name, []).append(f"{name}{_format_labels(label_key)} {value}")
+            for name, label_key, value in extra_gauges:
+                samples.setdefault(name, []).append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in self.histograms.items():
+                lines = samples.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(histogram["buckets"] + ("+Inf",), histogram["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(label_key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {cumulative}")
+
+        output = []
+        for name in sorted(samples):
+            metric_type, help_text = METRICS.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(samples[name])
+        return "\n".join(output) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+# Count and log an exception a worker recovers from, so failures that used to be swallowed show up in /metrics
+def record_error(site, error):
+    metrics_registry.inc("agritrack_errors_total", {"site": site})
+    logger.error("Error in %s: %s", site, error, exc_info=error)
+
+
+# Per-job stage timings, fed from every pipeline thread and summarised onto the job's row
+# Each measurement also goes into the process-wide stage histograms.
+class JobMetrics:
+    def __init__(self, registry=metrics_registry):
+        self.registry = registry
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.queue_depths = {}
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            totals = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+        self.registry.observe("agritrack_stage_seconds", seconds, {"stage": stage})
+
+    # Wrap a callable so every call is measured as the given stage
+    def timed(self, stage, function):
+        def wrapper(*args, **kwargs):
+            with self.measure(stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def sample_queue_depths(self, depths):
+        with self.lock:
+            for name, depth in depths.items():
+                totals = self.queue_depths.setdefault(name, [0, 0, 0])
+                totals[0] += 1
+                totals[1] += depth
+                totals[2] = max(totals[2], depth)
+        for name, depth in depths.items():
+            self.registry.set_gauge("agritrack_pipeline_queue_depth", depth, {"queue": name})
+
+    # JSON-friendly totals for the job's stage_metrics column
+    def summary(self):
+        with self.lock:
+            return {
+                "stages": {
+                    stage: {
+                        "count": count,
+                        "total_s": round(total, 4),
+                        "mean_ms": round(1000 * total / count, 3) if count else None,
+                        "max_ms": round(1000 * longest, 3),
+                    }
+                    for stage, (count, total, longest) in self.stages.items()
+                },
+                "queue_depths": {
+                    name: {"mean": round(total / samples, 2) if samples else None, "max": deepest}
+                    for name, (samples, total, deepest) in self.queue_depths.items()
+                },
+            }
+
+
+# Helper to time a block as a stage when the caller passed job metrics, a no-op otherwise
+def measure_stage(job_metrics, stage):
+    return job_metrics.measure(stage) if job_metrics is not None else nullcontext()
+
+
+# Deterministic profile of each pipeline stage, one cProfile per stage thread merged into a single .prof file
+class CProfileStageProfiler:
+    def __init__(self, path):
+        self.path = path
+        self.profilers = {}
+
+    def wrap(self, stage, function):
+        profiler = self.profilers.setdefault(stage, cProfile.Profile())
+
+        def wrapper(*args, **kwargs):
+            profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.disable()
+        return wrapper
+
+    # Called once every stage thread has stopped
+    def save(self):
+        stats = None
+        for profiler in self.profilers.values():
+            profiler.create_stats()
+            if not profiler.stats:
+                continue
+            stats = pstats.Stats(profiler) if stats is None else stats.add(profiler)
+        if stats is None:
+            return None
+        stats.dump_stats(self.path)
+        return self.path
+
+
+# Samples a window of inference batches with the torch profiler, skipping the first few so warm-up is excluded
+class TorchStageProfiler:
+    def __init__(self, path, skip_batches, batches):
+        self.path = path
+        self.started = False
+        self.profiler = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU]
+            + ([torch.profiler.ProfilerActivity.CUDA] if torch.cuda.is_available() else []),
+            schedule=torch.profiler.schedule(wait=skip_batches, warmup=1, active=batches, repeat=1),
+            on_trace_ready=lambda profiler: profiler.export_chrome_trace(self.path),
+            record_shapes=True,
+        )
+
+    def wrap(self, stage, function):
+        if stage != "inference":
+            return function
+
+        def wrapper(*args, **kwargs):
+            if not self.started:
+                self.profiler.start()
+                self.started = True
+            result = function(*args, **kwargs)
+            self.profiler.step()
+            return result
+        return wrapper
+
+    # Stopping exports the trace if the video ended inside the recorded window
+    def save(self):
+        if not self.started:
+            return None
+        self.profiler.stop()
+        return self.path
+
+
+# Helper to build the profiler a job asked for, None when profiling is off
+def create_profiler(mode, path, config):
+    if mode == "cprofile":
+        return CProfileStageProfiler(path)
+    if mode == "torch":
+        return TorchStageProfiler(path, config.get("TORCH_PROFILE_SKIP_BATCHES", 5), config.get("TORCH_PROFILE_BATCHES", 20))
+    return None
+
+
+# Queue depth by status and the oldest queued job's age, read from the database at scrape time
+def collect_queue_gauges():
+    gauges = [
+        ("agritrack_queue_jobs", (("status", status),), count)
+        for status, count in db.session.query(ProcessingQueue.status, func.count(ProcessingQueue.id))
+        .group_by(ProcessingQueue.status)
+    ]
+    oldest = db.session.query(func.min(ProcessingQueue.upload_timestamp)).filter(ProcessingQueue.status == 'QUEUED').scalar()
+    gauges.append(("agritrack_queue_oldest_wait_seconds", (),
+                   (datetime.utcnow() - oldest).total_seconds() if oldest is not None else 0))
+    db.session.commit()
+    return gauges
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+# Size frames are shrunk to before measuring motion between keyframes, cheap and robust to sensor noise
+MOTION_PROBE_SIZE = (64, 36)
+
+
+# Decides which frames go through the detector
+# A frame is a keyframe every `interval` frames, or earlier when `motion_threshold` is set and the mean
+# absolute grayscale difference from the last keyframe exceeds it (0-255 scale). Frames in between are
+# filled in from the tracker's motion estimates. interval=1 runs detection on every frame.
+class KeyframeSelector:
+    def __init__(self, interval=1, motion_threshold=0):
+        self.interval = max(1, interval)
+        self.motion_threshold = motion_threshold
+        self.frames_since_keyframe = None
+        self.last_keyframe_probe = None
+
+    def _probe(self, frame):
+        small = cv2.resize(frame, MOTION_PROBE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def is_keyframe(self, frame):
+        if self.interval == 1:
+            return True
+
+        is_keyframe = self.frames_since_keyframe is None or self.frames_since_keyframe + 1 >= self.interval
+        probe = None
+
+        if not is_keyframe and self.motion_threshold > 0:
+            probe = self._probe(frame)
+            motion = np.abs(probe - self.last_keyframe_probe).mean()
+            is_keyframe = motion > self.motion_threshold
+
+        if is_keyframe:
+            self.frames_since_keyframe = 0
+            if self.motion_threshold > 0:
+                self.last_keyframe_probe = probe if probe is not None else self._probe(frame)
+        else:
+            self.frames_since_keyframe += 1
+        return is_keyframe
+
+
+# Running throughput/accuracy stats for keyframe inference
+# Drift is the distance between where the tracker placed an object on the frame before a keyframe
+# and where the detector found it on the keyframe, a proxy for the error of the interpolated frames.
+class KeyframeStats:
+    def __init__(self):
+        self.inference_frames = 0
+        self.skipped_frames = 0
+        self.drift_total = 0.0
+        self.drift_count = 0
+
+    # previous_estimates is (ids, centroids) from the frame before, tracked is this keyframe's TrackedFrame
+    def add_drift(self, previous_estimates, tracked):
+        previous_ids, previous_centroids = previous_estimates
+        matched_ids = tracked.ids[tracked.matched]
+        matched_boxes = tracked.boxes[tracked.matched]
+        _, current, previous = np.intersect1d(matched_ids, previous_ids, return_indices=True)
+        detected_centroids = (matched_boxes[current, :2] + matched_boxes[current, 2:]) / 2
+        self.drift_total += float(np.linalg.norm(detected_centroids - previous_centroids[previous], axis=1).sum())
+        self.drift_count += len(current)
+
+    @property
+    def mean_drift(self):
+        return self.drift_total / self.drift_count if self.drift_count else None
@@ -0,0 +1,130 @@
+import os
+import stat
+import threading
+import time
+from collections import deque, namedtuple
+from urllib.parse import urlparse
+import cv2
+
+# Frames held between the reader and the worker, the oldest is dropped once the worker falls this far behind
+LIVE_BUFFER_FRAMES = 32
+
+# Frame rate assumed when a stream reports none or an implausible one (RTSP often reports the 90 kHz clock)
+DEFAULT_STREAM_FPS = 25
+MAX_STREAM_FPS = 120
+
+# Seconds between attempts to reopen a stream that stopped delivering frames
+RECONNECT_DELAY = 1.0
+
+# A decoded frame of a live stream: its position in the feed and when it was read (time.monotonic())
+LiveFrame = namedtuple("LiveFrame", "frame frame_index captured_at")
+
+
+# Helper to get the scheme of a stream source, "pipe" for a named pipe given as "pipe:/path/to/fifo"
+def get_stream_scheme(source_url):
+    return urlparse(source_url).scheme.lower()
+
+
+# Helper to turn a stream source into what OpenCV opens, a pipe source must name an existing FIFO
+def resolve_stream_source(source_url):
+    if get_stream_scheme(source_url) != "pipe":
+        return source_url
+    path = source_url.split(":", 1)[1]
+    if not stat.S_ISFIFO(os.stat(path).st_mode):
+        raise ValueError(f"{path} is not a named pipe")
+    return path
+
+
+def open_stream_capture(source_url, timeout_ms):
+    return cv2.VideoCapture(
+        resolve_stream_source(source_url), cv2.CAP_FFMPEG,
+        [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms],
+    )
+
+
+# Latest-frames buffer over a live RTSP/UDP/HTTP/pipe feed
+# A reader thread pulls frames as fast as the source delivers them, so the network and decoder buffers never
+# back up behind a slow worker. get() hands out the oldest frame still within the latency budget and drops
+# anything older, always keeping the newest frame so a worker slower than the budget still makes progress.
+# A feed that stops delivering is reopened up to reconnect_attempts times before the stream counts as ended.
+class LiveFrameSource:
+    def __init__(self, source_url, latency_budget, timeout_ms=10000, reconnect_attempts=3):
+        self.source_url = source_url
+        self.latency_budget = latency_budget  # seconds
+        self.timeout_ms = timeout_ms
+        self.reconnect_attempts = reconnect_attempts
+        self.fps = DEFAULT_STREAM_FPS
+        self.frames_read = 0
+        self.dropped_frames = 0
+        self.ended = False
+
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._capture = None
+        self._thread = None
+
+    # Open the feed and start reading, returns False if it could not be opened
+    def start(self):
+        self._capture = open_stream_capture(self.source_url, self.timeout_ms)
+        if not self._capture.isOpened():
+            self._capture.release()
+            return False
+
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        if 1 <= fps <= MAX_STREAM_FPS:
+            self.fps = fps
+        self._thread = threading.Thread(target=self._read_loop, name="stream-reader", daemon=True)
+        self._thread.start()
+        return True
+
+    def _read_loop(self):
+        attempts = 0
+        try:
+            while not self._stop.is_set():
+                ret, frame = self._capture.read()
+                if not ret:
+                    self._capture.release()
+                    if attempts >= self.reconnect_attempts or self._stop.wait(RECONNECT_DELAY):
+                        break
+                    attempts += 1
+                    self._capture = open_stream_capture(self.source_url, self.timeout_ms)
+                    continue
+
+                attempts = 0
+                with self._condition:
+                    self._frames.append(LiveFrame(frame, self.frames_read, time.monotonic()))
+                    self.frames_read += 1
+                    if len(self._frames) > LIVE_BUFFER_FRAMES:
+                        self._frames.popleft()
+                        self.dropped_frames += 1
+                    self._condition.notify()
+        finally:
+            self._capture.release()
+            with self._condition:
+                self.ended = True
+                self._condition.notify_all()
+
+    # True once the feed has ended and every buffered frame has been handed out
+    @property
+    def finished(self):
+        with self._condition:
+            return self.ended and not self._frames
+
+    # Next LiveFrame to process, or None if nothing arrived within timeout seconds or the feed has finished
+    def get(self, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self._frames or self.ended, timeout)
+            if not self._frames:
+                return None
+            now = time.monotonic()
+            while len(self._frames) > 1 and now - self._frames[0].captured_at > self.latency_budget:
+                self._frames.popleft()
+                self.dropped_frames += 1
+            return self._frames.popleft()
+
+    # Stop reading, a read blocked on a silent feed returns within timeout_ms
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout_ms / 1000 + 1)
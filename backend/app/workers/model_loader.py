@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+import time
+import torch
+import torch.nn as nn
+from torchvision.models.detection import FasterRCNN
+from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
+from app.workers.inference_backends import apply_backend
+
+# Init directory and model vars
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(BASE_DIR, "ml_models/model_01_20251702_final_epoch_20.pth")
+GDRIVE_FILE_ID = "1_I7ijKT_EgoU-GAHR5-0dfakSe_e07My"
+GDRIVE_URL = f"https://drive.google.com/uc?id={GDRIVE_FILE_ID}"
+
+# Optional local cache holding only the model weights, much smaller and faster to load than the training checkpoint
+# Written on the first successful load from the checkpoint when set, e.g. ml_models/model_state_dict.pt
+MODEL_CACHE_PATH = os.getenv("MODEL_CACHE_PATH")
+
+# Inference backend the loaded model is converted to, see inference_backends.apply_backend
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+# Seconds to wait before retrying a failed model load, avoids hammering gdrive from every worker
+MODEL_LOAD_RETRY_SECONDS = 60
+
+# Initialise classes and device vars
+NUM_CLASSES = 2
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Define custom classifier head for FRCNN model
+class CustomFastRCNNPredictor(nn.Module):
+    def __init__(self, in_channels, num_classes):
+        super().__init__()
+        self.classifier = nn.Sequential(
+            nn.Linear(in_channels, 512),
+            nn.ReLU(),
+            nn.BatchNorm1d(512),
+            nn.Dropout(0.3),
+            nn.Linear(512, 256),
+            nn.ReLU(),
+            nn.BatchNorm1d(256),
+            nn.Dropout(0.3),
+            nn.Linear(256, num_classes)
+        )
+        self.bbox_regressor = nn.Linear(in_channels, num_classes * 4)
+
+    def forward(self, x):
+        scores = self.classifier(x)
+        bbox_deltas = self.bbox_regressor(x)
+        return scores, bbox_deltas
+
+# Helper to get model
+# pretrained_backbone=False skips fetching ImageNet weights, use it whenever a checkpoint overwrites them anyway
+def get_model(num_classes, pretrained_backbone=True):
+    backbone = resnet_fpn_backbone(backbone_name='resnet50', weights='DEFAULT' if pretrained_backbone else None)
+    model = FasterRCNN(backbone, num_classes=num_classes)
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = CustomFastRCNNPredictor(in_features, num_classes)
+    return model
+
+# If model does not exist, download it from gdrive
+def ensure_checkpoint():
+    if not os.path.exists(MODEL_PATH):
+        import gdown  # Only needed when the checkpoint has to be fetched
+        os.makedirs(os.path.join(BASE_DIR, "ml_models"), exist_ok=True)
+        gdown.download(GDRIVE_URL, MODEL_PATH, quiet=False)
+
+# sha256 of the file the weights come from (the checkpoint, or the state dict cache when only that is deployed)
+# Hashed once per file version, re-hashed only when its size or mtime changes
+_fingerprints = {}
+
+def checkpoint_fingerprint():
+    path = MODEL_PATH if os.path.exists(MODEL_PATH) else MODEL_CACHE_PATH
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _fingerprints:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+# Helpers to tie a file derived from the checkpoint to it with a "<path>.fingerprint" sidecar,
+# so a replaced checkpoint is never served by a state dict cache or backend artifact built from the old one
+def is_current(path, fingerprint):
+    try:
+        with open(f"{path}.fingerprint") as f:
+            return f.read().strip() == fingerprint
+    except OSError:
+        return False
+
+def mark_current(path, fingerprint):
+    with open(f"{path}.fingerprint", "w") as f:
+        f.write(fingerprint)
+
+# Helper to read the model weights, preferring the local state dict cache over the full training checkpoint
+# The cache is used alone when no checkpoint is deployed, otherwise only if it was written from that checkpoint
+def load_state_dict():
+    if MODEL_CACHE_PATH and os.path.exists(MODEL_CACHE_PATH):
+        if not os.path.exists(MODEL_PATH) or is_current(MODEL_CACHE_PATH, checkpoint_fingerprint()):
+            return torch.load(MODEL_CACHE_PATH, map_location=device)
+
+    ensure_checkpoint()
+    state_dict = torch.load(MODEL_PATH, map_location=device)["model_state_dict"]
+
+    if MODEL_CACHE_PATH:
+        os.makedirs(os.path.dirname(os.path.abspath(MODEL_CACHE_PATH)), exist_ok=True)
+        torch.save(state_dict, MODEL_CACHE_PATH)
+        mark_current(MODEL_CACHE_PATH, checkpoint_fingerprint())
+    return state_dict
+
+# Helper to get where a backend's serialized model lives, next to the checkpoint it was built from
+def backend_artifact_path(backend):
+    base = os.path.splitext(MODEL_PATH)[0]
+    return {"torchscript": f"{base}.torchscript.pt", "onnx": f"{base}.onnx"}.get(backend)
+
+# Build the model from the checkpoint, move it to device, set eval mode and convert it to the inference backend
+def build_model(backend=None):
+    backend = backend or INFERENCE_BACKEND
+    artifact_path = backend_artifact_path(backend)
+    if not (MODEL_CACHE_PATH and os.path.exists(MODEL_CACHE_PATH)):
+        ensure_checkpoint()
+    fingerprint = checkpoint_fingerprint()
+
+    # An artifact converted from another checkpoint (or of unknown origin) is removed so apply_backend rebuilds it
+    if artifact_path and os.path.exists(artifact_path) and not is_current(artifact_path, fingerprint):
+        os.remove(artifact_path)
+
+    # A pre-serialized TorchScript model already holds the weights, skip building the eager model
+    if backend == "torchscript" and os.path.exists(artifact_path):
+        return apply_backend(None, backend, device, artifact_path)
+
+    model = get_model(NUM_CLASSES, pretrained_backbone=False)
+    model.load_state_dict(load_state_dict())
+    model.to(device)
+    model.eval()
+    model = apply_backend(model, backend, device, artifact_path)
+    if artifact_path and os.path.exists(artifact_path):
+        mark_current(artifact_path, fingerprint)
+    return model
+
+_model = None
+_model_lock = threading.Lock()
+_model_status = {"state": "not_loaded", "error": None, "load_seconds": None, "failed_at": None}
+
+# Return the shared model, loading it on first use
+# Loading happens on worker threads/processes, never at import or during create_app, so the API serves
+# requests immediately while the model warms up.
+def get_loaded_model():
+    global _model
+    if _model is not None:
+        return _model
+
+    with _model_lock:
+        if _model is not None:
+            return _model
+
+        failed_at = _model_status["failed_at"]
+        if failed_at is not None and time.time() - failed_at < MODEL_LOAD_RETRY_SECONDS:
+            raise RuntimeError(f"Model load failed recently: {_model_status['error']}")
+
+        _model_status.update(state="loading", error=None)
+        start = time.time()
+        try:
+            _model = build_model()
+        except Exception as e:
+            _model_status.update(state="failed", error=str(e), failed_at=time.time())
+            raise
+
+        _model_status.update(state="ready", backend=INFERENCE_BACKEND, load_seconds=round(time.time() - start, 2), failed_at=None)
+        return _model
+
+# Snapshot of model load state for the readiness endpoint
+def model_status():
+    return dict(_model_status)
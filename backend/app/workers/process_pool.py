@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import torch
+from app.extensions import db
+from app.models.processing_queue import ProcessingQueue
+from app.workers.inference_server import InferenceServerClient, inference_server_main, set_inference_client
+from app.workers.job_metrics import metrics_registry, record_error
+from app.workers.scheduler import claim_next_task, default_worker_id, reclaim_stale_tasks
+
+
+# Helper to split a CPU core budget between worker processes for torch intra-op threads
+def threads_per_process(cpu_budget, pool_size):
+    return max(1, (cpu_budget or os.cpu_count() or 1) // max(1, pool_size))
+
+
+# Entry point of each worker process
+# The model is loaded once when the process starts, then every job sent over the inbox reuses it.
+# With an inference server (request queue, this slot's response queue, reply timeout) the process never loads
+# the model and sends its frames to the server instead.
+def worker_process_main(slot, inbox, done_queue, torch_threads, inference_server=None):
+    torch.set_num_threads(torch_threads)
+
+    from app import create_worker_app
+    from app.workers.model_loader import get_loaded_model
+    from app.workers.video_worker import process_task
+
+    if inference_server is not None:
+        request_queue, response_queue, timeout = inference_server
+        set_inference_client(InferenceServerClient(slot, request_queue, response_queue, timeout))
+    else:
+        # Load the model up front so the first job does not pay for it
+        try:
+            get_loaded_model()
+        except Exception as e:
+            record_error("model_load", e)  # Retried lazily by the first job
+
+    app = create_worker_app()
+    with app.app_context():
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+
+            task_id, worker_id = message
+            try:
+                task = ProcessingQueue.query.get(task_id)
+                if task:
+                    process_task(task, worker_id)
+            except Exception as e:
+                record_error("worker_process", e)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+                # Hand this process's metrics to the API process along with the idle signal
+                done_queue.put((slot, metrics_registry.drain()))
+
+
+# Pool of inference worker processes fed by a dispatcher thread in the API process
+# The dispatcher only claims a job from the queue when a process is idle, then hands it the
+# task id over IPC. Jobs run outside the Flask process so request handling never competes
+# with inference for the GIL, and several videos can be processed in parallel.
+# With INFERENCE_SERVER set, one more process owns the only copy of the model and batches frames from every
+# worker, so memory stays flat as the pool grows and the CPU budget goes to batched forward passes.
+class InferenceProcessPool:
+    def __init__(self, app, pool_size, cpu_budget=None):
+        self.app = app
+        self.pool_size = max(1, pool_size)
+        self.context = multiprocessing.get_context("spawn")  # fork is unsafe with live threads and DB connections
+        self.done_queue = self.context.Queue()
+        self.server = None
+        if app.config.get("INFERENCE_SERVER"):
+            # Workers only decode, track and encode, the server gets the torch threads
+            self.torch_threads = 1
+            self.server_threads = threads_per_process(cpu_budget, 1)
+            self.request_queue = self.context.Queue()
+            self.response_queues = [self.context.Queue() for _ in range(self.pool_size)]
+            self.server = self._spawn_server()
+        else:
+            self.torch_threads = threads_per_process(cpu_budget, self.pool_size)
+        self.slots = [self._spawn(index) for index in range(self.pool_size)]
+        self.claim_count = 0
+
+    def _spawn_server(self):
+        process = self.context.Process(
+            target=inference_server_main,
+            args=(
+                self.request_queue, self.response_queues, self.done_queue,
+                self.app.config.get("INFERENCE_SERVER_MAX_BATCH", 8),
+                self.app.config.get("INFERENCE_SERVER_MAX_LATENCY_MS", 20) / 1000,
+                self.server_threads,
+            ),
+            name="inference-server",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _spawn(self, index):
+        inbox = self.context.Queue()
+        inference_server = None
+        if self.server is not None:
+            inference_server = (self.request_queue, self.response_queues[index], self.app.config.get("INFERENCE_SERVER_TIMEOUT", 120))
+        process = self.context.Process(
+            target=worker_process_main,
+            args=(index, inbox, self.done_queue, self.torch_threads, inference_server),
+            name=f"video-worker-process-{index}",
+            daemon=True,
+        )
+        process.start()
+        return {"process": process, "inbox": inbox, "task_id": None}
+
+    # Mark slots idle as their jobs complete, merge their metrics, and replace processes that died mid-job
+    # A job lost with a dead process is requeued by the stale heartbeat check. Jobs waiting on a dead inference
+    # server fail once their reply times out.
+    def _collect_finished(self):
+        while True:
+            try:
+                index, metrics = self.done_queue.get_nowait()
+            except queue.Empty:
+                break
+            if index is not None:
+                self.slots[index]["task_id"] = None
+            metrics_registry.merge(metrics)
+
+        if self.server is not None and not self.server.is_alive():
+            self.server = self._spawn_server()
+
+        for index, slot in enumerate(self.slots):
+            if not slot["process"].is_alive():
+                self.slots[index] = self._spawn(index)
+
+    def _dispatch_loop(self):
+        stale_timeout = self.app.config.get("WORKER_STALE_TIMEOUT", 300)
+        last_reclaim = 0
+
+        while True:
+            try:
+                self._collect_finished()
+
+                if time.time() - last_reclaim >= stale_timeout / 2:
+                    reclaim_stale_tasks(stale_timeout, self.app.config.get("WORKER_MAX_RECLAIMS", 3))
+                    last_reclaim = time.time()
+
+                idle = [slot for slot in self.slots if slot["task_id"] is None]
+                task = None
+                if idle:
+                    self.claim_count += 1
+                    worker_id = f"{default_worker_id()}:process-{self.claim_count}"
+                    task = claim_next_task(worker_id)
+
+                if task:
+                    idle[0]["task_id"] = task.id
+                    idle[0]["inbox"].put((task.id, worker_id))
+                else:
+                    time.sleep(2)
+            except Exception as e:
+                record_error("dispatcher", e)
+                db.session.rollback()
+                time.sleep(2)
+
+    def start(self):
+        def run_dispatcher():
+            with self.app.app_context():
+                self._dispatch_loop()
+
+        threading.Thread(target=run_dispatcher, name="video-worker-dispatcher", daemon=True).start()
+        return self
@@ -0,0 +1,154 @@
+import json
+import queue
+import select
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from app.extensions import db
+from app.workers.job_metrics import record_error
+
+# Postgres NOTIFY channel used when workers run in other processes than the API
+PROGRESS_CHANNEL = "agritrack_progress"
+
+# Events buffered per subscriber, a slow client drops events rather than holding up the worker
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Smoothing for the fps estimate behind the ETA, higher follows speed changes faster
+FPS_SMOOTHING = 0.3
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+# Helper to pick how progress events travel: in-process when workers share the API process, else Postgres NOTIFY
+def get_progress_transport(config):
+    transport = config.get("PROGRESS_TRANSPORT", "auto")
+    if transport == "auto":
+        return "postgres" if config.get("WORKER_MODE") == "process" else "memory"
+    return transport
+
+
+# Fan-out of progress events to SSE subscribers in this process, also keeps the latest event per task
+class ProgressBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.latest = {}
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def snapshot(self, task_id=None):
+        with self.lock:
+            if task_id is not None:
+                return [self.latest[task_id]] if task_id in self.latest else []
+            return list(self.latest.values())
+
+    def publish(self, event):
+        with self.lock:
+            if event["status"] in TERMINAL_STATUSES:
+                self.latest.pop(event["task_id"], None)
+            else:
+                self.latest[event["task_id"]] = event
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+progress_broker = ProgressBroker()
+
+
+# Build a progress event from a task row, fps and ETA are only known while a worker is processing it
+def task_event(task, progress=None, fps=None, eta_seconds=None, frame_index=None, total_frames=None):
+    return {
+        "task_id": task.id,
+        "status": task.status,
+        "progress": progress if progress is not None else task.progress_percentage or 0,
+        "frame_index": frame_index,
+        "total_frames": total_frames,
+        "fps": fps,
+        "eta_seconds": eta_seconds,
+        "time": time.time(),
+    }
+
+
+# Send an event to every progress subscriber, must be called inside an app context
+# With the postgres transport the NOTIFY is delivered when this commits, so call it after the row's own commit.
+def publish_progress(event):
+    if get_progress_transport(current_app.config) == "postgres":
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {"channel": PROGRESS_CHANNEL, "payload": json.dumps(event)})
+        db.session.commit()
+    else:
+        progress_broker.publish(event)
+
+
+# Frame-level progress for a running job: rate-limits events and estimates fps and time remaining
+class ProgressMeter:
+    def __init__(self, total_frames, interval):
+        self.total_frames = total_frames
+        self.interval = interval
+        self.fps = None
+        self.last_time = time.monotonic()
+        self.last_frame = 0
+
+    # Returns (progress %, fps, eta seconds) once per interval, otherwise None
+    def update(self, frame_index):
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed < self.interval:
+            return None
+
+        current_fps = (frame_index - self.last_frame) / elapsed
+        self.fps = current_fps if self.fps is None else FPS_SMOOTHING * current_fps + (1 - FPS_SMOOTHING) * self.fps
+        self.last_time = now
+        self.last_frame = frame_index
+
+        progress = round(100 * frame_index / self.total_frames, 1) if self.total_frames else 0
+        remaining = max(self.total_frames - frame_index, 0)
+        eta_seconds = round(remaining / self.fps, 1) if self.fps else None
+        return progress, round(self.fps, 2), eta_seconds
+
+
+# Relay NOTIFY events from worker processes into this process's broker
+def _listen_for_progress(app):
+    while True:
+        try:
+            with app.app_context():
+                connection = db.engine.raw_connection()
+            connection.detach()  # LISTEN needs a dedicated autocommit connection, keep it out of the pool
+            try:
+                driver_connection = connection.connection
+                driver_connection.autocommit = True
+                with driver_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {PROGRESS_CHANNEL}")
+
+                while True:
+                    if select.select([driver_connection], [], [], 5) == ([], [], []):
+                        continue
+                    driver_connection.poll()
+                    while driver_connection.notifies:
+                        notification = driver_connection.notifies.pop(0)
+                        progress_broker.publish(json.loads(notification.payload))
+            finally:
+                connection.close()
+        except Exception as e:
+            record_error("progress_listener", e)  # Reconnects after the pause
+            time.sleep(5)
+
+
+def start_progress_listener(app):
+    thread = threading.Thread(target=_listen_for_progress, args=(app,), daemon=True, name="progress-listener")
+    thread.start()
+    return thread
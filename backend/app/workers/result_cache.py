@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from app.workers.model_loader import BASE_DIR, INFERENCE_BACKEND, checkpoint_fingerprint
+from app.workers.tiling import get_inference_settings
+from app.workers.trackers import get_tracker_settings
+
+# Content-addressed store of processed results, one directory per cache key
+RESULT_CACHE_DIR = os.path.join(BASE_DIR, "videos/cache")
+
+# Bump when a worker change alters the processed output so old cache entries stop matching
+RESULT_CACHE_VERSION = 1
+
+# Files kept for every cache entry, result.json is written last and marks the entry complete
+CACHE_VIDEO_FILE = "video.mp4"
+CACHE_THUMBNAIL_FILE = "thumbnail.jpg"
+CACHE_TRACKS_DIR = "tracks"
+CACHE_HLS_DIR = "hls"
+CACHE_RESULT_FILE = "result.json"
+
+# ProcessingQueue columns copied to and from a cache entry
+CACHED_RESULT_FIELDS = (
+    "duration_seconds", "resolution", "processed_frames", "detected_objects", "average_confidence",
+    "inference_frames", "skipped_frames", "keyframe_drift_px",
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Helper to copy a stream into upload_folder while hashing it, returns (sha256 hex digest, stored file name)
+# Uploads are stored under their content hash, so identical videos share one file and different videos
+# with the same name never overwrite each other.
+def save_stream_with_hash(stream, upload_folder, extension):
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=upload_folder, suffix=".part", delete=False) as tmp:
+        while True:
+            chunk = stream.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            tmp.write(chunk)
+
+    video_hash = hasher.hexdigest()
+    stored_file_name = f"{video_hash}.{extension}"
+    os.replace(tmp.name, os.path.join(upload_folder, stored_file_name))
+    return video_hash, stored_file_name
+
+
+# Cache key for a video processed with the current model and every setting that changes the output
+# The model is identified by the checkpoint's content hash, so a retrained checkpoint under the same name misses
+def result_cache_key(video_hash, config):
+    settings = {
+        "version": RESULT_CACHE_VERSION,
+        "video": video_hash,
+        "model": checkpoint_fingerprint(),
+        "backend": INFERENCE_BACKEND,
+        "inference": get_inference_settings(config),
+        "tracker": get_tracker_settings(config),
+        "keyframe_interval": config.get("KEYFRAME_INTERVAL", 1),
+        "keyframe_motion_threshold": config.get("KEYFRAME_MOTION_THRESHOLD", 0),
+        "hls_renditions": config.get("HLS_RENDITIONS", ""),
+        "encode_preset": config.get("VIDEO_ENCODE_PRESET", "veryfast"),
+        "encode_crf": config.get("VIDEO_ENCODE_CRF", 23),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def _entry_dir(cache_key):
+    return os.path.join(RESULT_CACHE_DIR, cache_key)
+
+
+# Hard link where possible so a cached result costs no extra disk while the job output also exists
+def _link_or_copy(source, destination):
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+# Bytes that deleting path would free: files still hard linked from a job's output are not counted
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            if stat.st_nlink == 1:
+                total += stat.st_size
+    return total
+
+
+# Helper to load a complete cache entry, returns the cached result fields or None on a miss
+def lookup_result(cache_key):
+    result_path = os.path.join(_entry_dir(cache_key), CACHE_RESULT_FILE)
+    if not os.path.exists(result_path):
+        return None
+    with open(result_path) as f:
+        return json.load(f)
+
+
+# Link a cached entry's artifacts to a new job's output paths and mark the entry recently used
+def materialize_result(cache_key, video_path, thumbnail_path, tracks_path, hls_dir=None):
+    entry = _entry_dir(cache_key)
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    _link_or_copy(os.path.join(entry, CACHE_VIDEO_FILE), video_path)
+
+    if os.path.exists(os.path.join(entry, CACHE_THUMBNAIL_FILE)):
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        _link_or_copy(os.path.join(entry, CACHE_THUMBNAIL_FILE), thumbnail_path)
+
+    if os.path.isdir(os.path.join(entry, CACHE_TRACKS_DIR)):
+        shutil.rmtree(tracks_path, ignore_errors=True)
+        shutil.copytree(os.path.join(entry, CACHE_TRACKS_DIR), tracks_path, copy_function=_link_or_copy)
+
+    if hls_dir and os.path.isdir(os.path.join(entry, CACHE_HLS_DIR)):
+        shutil.rmtree(hls_dir, ignore_errors=True)
+        shutil.copytree(os.path.join(entry, CACHE_HLS_DIR), hls_dir, copy_function=_link_or_copy)
+
+    os.utime(os.path.join(entry, CACHE_RESULT_FILE))  # LRU timestamp
+
+
+# Add a finished job's artifacts to the cache, then evict least recently used entries over the size budget
+def store_result(cache_key, task, video_path, thumbnail_path, tracks_path, max_bytes, hls_dir=None):
+    entry = _entry_dir(cache_key)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.makedirs(entry)
+
+    _link_or_copy(video_path, os.path.join(entry, CACHE_VIDEO_FILE))
+    if thumbnail_path and os.path.exists(thumbnail_path):
+        _link_or_copy(thumbnail_path, os.path.join(entry, CACHE_THUMBNAIL_FILE))
+    if tracks_path and os.path.isdir(tracks_path):
+        shutil.copytree(tracks_path, os.path.join(entry, CACHE_TRACKS_DIR), copy_function=_link_or_copy)
+    if hls_dir and os.path.isdir(hls_dir):
+        shutil.copytree(hls_dir, os.path.join(entry, CACHE_HLS_DIR), copy_function=_link_or_copy)
+
+    with open(os.path.join(entry, CACHE_RESULT_FILE), "w") as f:
+        json.dump({field: getattr(task, field) for field in CACHED_RESULT_FIELDS}, f)
+
+    evict_results(max_bytes)
+
+
+# Delete least recently used cache entries until the disk only the store holds fits in max_bytes
+def evict_results(max_bytes):
+    if not max_bytes or not os.path.isdir(RESULT_CACHE_DIR):
+        return
+
+    entries = []
+    for cache_key in os.listdir(RESULT_CACHE_DIR):
+        entry = _entry_dir(cache_key)
+        result_path = os.path.join(entry, CACHE_RESULT_FILE)
+        last_used = os.path.getmtime(result_path) if os.path.exists(result_path) else 0
+        entries.append((last_used, _directory_size(entry), entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
@@ -0,0 +1,116 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import desc, or_
+from app.models.processing_queue import ProcessingQueue
+from app.extensions import db
+from app.workers.job_metrics import metrics_registry
+from app.workers.progress_events import publish_progress, task_event
+
+
+# Raised when a worker finds that its job was reclaimed by another worker
+class ClaimLostError(Exception):
+    pass
+
+
+# Helper to build a worker id that is unique across threads, processes and containers
+def default_worker_id(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+# Atomically claim the next queued task, highest priority first then FIFO by upload time
+# FOR UPDATE SKIP LOCKED lets any number of workers poll the same Postgres queue without
+# double-claiming a row or blocking on rows another worker is in the middle of claiming.
+def claim_next_task(worker_id):
+    task = (
+        ProcessingQueue.query
+        .filter(ProcessingQueue.status == 'QUEUED')
+        .order_by(desc(ProcessingQueue.priority), ProcessingQueue.upload_timestamp, ProcessingQueue.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+    if task is None:
+        db.session.commit()  # Release the transaction opened by the select
+        return None
+
+    task.status = 'PROCESSING'
+    task.worker_id = worker_id
+    task.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+    return task
+
+
+# Requeue PROCESSING tasks whose worker has not sent a heartbeat within the timeout, returns how many were requeued
+# A task that has already been reclaimed max_reclaims times is failed instead, so a job that crashes or hangs
+# every worker that takes it is not retried forever. 0 retries without limit.
+def reclaim_stale_tasks(stale_timeout, max_reclaims=0):
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_timeout)
+    stale = (
+        ProcessingQueue.query
+        .filter(ProcessingQueue.status == 'PROCESSING')
+        .filter(or_(ProcessingQueue.heartbeat_at == None, ProcessingQueue.heartbeat_at < cutoff))  # noqa: E711
+    )
+
+    if max_reclaims:
+        exhausted = stale.filter(ProcessingQueue.reclaim_count >= max_reclaims).with_for_update(skip_locked=True).all()
+        for task in exhausted:
+            task.status = 'FAILED'
+            task.worker_id = None
+            task.heartbeat_at = None
+        db.session.commit()
+        for task in exhausted:
+            metrics_registry.inc("agritrack_jobs_total", {"outcome": "failed"})
+            publish_progress(task_event(task))
+        stale = stale.filter(ProcessingQueue.reclaim_count < max_reclaims)
+
+    reclaimed = stale.update(
+        {"status": 'QUEUED', "worker_id": None, "heartbeat_at": None, "reclaim_count": ProcessingQueue.reclaim_count + 1},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return reclaimed
+
+
+# Rate limited heartbeat for a claimed task
+# Each beat is a conditional update on (id, worker_id), so a worker whose job has been reclaimed
+# finds out on its next beat and stops instead of racing the new owner.
+class Heartbeat:
+    def __init__(self, task, worker_id, interval):
+        self.task = task
+        self.worker_id = worker_id
+        self.interval = interval
+        self.last_beat = time.monotonic()
+
+    def beat(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_beat < self.interval:
+            return
+
+        updated = (
+            ProcessingQueue.query
+            .filter_by(id=self.task.id, worker_id=self.worker_id, status='PROCESSING')
+            # Keep updated_at as is, a heartbeat alone is not a change pollers need to see
+            .update({"heartbeat_at": datetime.utcnow(), "updated_at": ProcessingQueue.updated_at}, synchronize_session=False)
+        )
+        db.session.commit()
+        self.last_beat = now
+
+        if updated == 0:
+            raise ClaimLostError(f"Task {self.task.id} is no longer claimed by {self.worker_id}")
+
+
+# Start a pool of worker threads, each running the worker loop inside its own app context
+def start_worker_pool(app, worker_loop, pool_size):
+    threads = []
+    for index in range(max(1, pool_size)):
+        def run_worker(worker_id=default_worker_id(index)):
+            with app.app_context():
+                worker_loop(worker_id)
+
+        thread = threading.Thread(target=run_worker, name=f"video-worker-{index}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
@@ -0,0 +1,178 @@
+import cv2
+import torch
+from torchvision.ops import batched_nms
+from app.workers.detection_filter import DEFAULT_SCORE_THRESHOLD, parse_class_thresholds
+
+# Boxes closer than this to an interior tile edge are treated as cut off by the tile
+TILE_EDGE_MARGIN = 2
+
+# A cut-off box is dropped when a box from another tile covers at least this fraction of it, that tile saw it whole
+TILE_CONTAIN_IOS = 0.8
+
+# Cut-off boxes from different tiles are parts of one object when they overlap and line up along the seam by this 1-D IoU
+TILE_SEAM_IOU = 0.5
+
+
+# Helper to read the per-job inference settings from app config
+def get_inference_settings(config):
+    return {
+        "resolution": config.get("INFERENCE_RESOLUTION", 0),
+        "tile_size": config.get("TILE_SIZE", 0),
+        "tile_overlap": config.get("TILE_OVERLAP", 64),
+        "tile_nms_iou": config.get("TILE_NMS_IOU", 0.5),
+        "score_threshold": config.get("DETECTION_SCORE_THRESHOLD", DEFAULT_SCORE_THRESHOLD),
+        "class_thresholds": parse_class_thresholds(config.get("DETECTION_CLASS_THRESHOLDS")),
+        "detection_nms_iou": config.get("DETECTION_NMS_IOU", 0),
+    }
+
+
+# Helper to downscale a frame so its longest side is at most max_side, returns the image and the scale applied
+def resize_for_inference(frame, max_side):
+    height, width = frame.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return frame, 1.0
+    scale = max_side / max(height, width)
+    resized = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+
+# Helper to get tile start offsets covering a length with tiles of tile_size overlapping by overlap
+def tile_origins(length, tile_size, overlap):
+    if length <= tile_size:
+        return [0]
+    stride = max(1, tile_size - overlap)
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)
+    return origins
+
+
+# Helper to split an image into overlapping square tiles, returns (x0, y0, tile) tuples
+def split_tiles(image, tile_size, overlap):
+    height, width = image.shape[:2]
+    return [
+        (x0, y0, image[y0:y0 + tile_size, x0:x0 + tile_size])
+        for y0 in tile_origins(height, tile_size, overlap)
+        for x0 in tile_origins(width, tile_size, overlap)
+    ]
+
+
+# Build the list of images sent to the model for a batch of frames
+# Each frame is optionally downscaled to `resolution` and split into tiles; the returned layout records
+# how to map every image's detections back to its frame.
+def prepare_inference_images(frames, resolution=0, tile_size=0, tile_overlap=0):
+    images = []
+    layout = []
+    for frame in frames:
+        image, scale = resize_for_inference(frame, resolution)
+        tiles = split_tiles(image, tile_size, tile_overlap) if tile_size else [(0, 0, image)]
+        layout.append({
+            "scale": scale,
+            "size": image.shape[:2],
+            "tiles": [(x0, y0, tile.shape[1], tile.shape[0]) for x0, y0, tile in tiles],
+        })
+        images.extend(tile for _, _, tile in tiles)
+    return images, layout
+
+
+# Mask of the boxes that touch an edge of the tile which is not also an edge of the frame
+def _interior_edge_mask(boxes, x0, y0, tile_width, tile_height, image_height, image_width):
+    cut = torch.zeros(len(boxes), dtype=torch.bool, device=boxes.device)
+    if x0 > 0:
+        cut |= boxes[:, 0] <= TILE_EDGE_MARGIN
+    if y0 > 0:
+        cut |= boxes[:, 1] <= TILE_EDGE_MARGIN
+    if x0 + tile_width < image_width:
+        cut |= boxes[:, 2] >= tile_width - TILE_EDGE_MARGIN
+    if y0 + tile_height < image_height:
+        cut |= boxes[:, 3] >= tile_height - TILE_EDGE_MARGIN
+    return cut
+
+
+# Pairwise 1-D IoU of intervals (N,) x (N,) -> (N, N)
+def _interval_iou(starts, ends):
+    intersection = (torch.min(ends[:, None], ends[None, :]) - torch.max(starts[:, None], starts[None, :])).clamp(min=0)
+    lengths = ends - starts
+    return intersection / (lengths[:, None] + lengths[None, :] - intersection).clamp(min=1e-9)
+
+
+# Resolve the detections of one tiled frame, boxes already in frame coordinates
+# A box cut off by its tile is dropped when another tile has a box covering it, i.e. saw the object whole. Cut-off
+# boxes left over are parts of an object larger than the tile overlap: parts from different tiles that overlap and
+# line up along the seam are merged into their union with the best score. Class-wise NMS then removes objects that
+# several tiles saw whole.
+def _merge_tile_detections(boxes, scores, labels, tile_ids, cut, nms_iou):
+    if len(boxes) == 0:
+        return boxes, scores, labels
+
+    candidates = (labels[:, None] == labels[None, :]) & (tile_ids[:, None] != tile_ids[None, :])
+    top_left = torch.max(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = torch.min(boxes[:, None, 2:], boxes[None, :, 2:])
+    intersection = (bottom_right - top_left).clamp(min=0).prod(2)
+    area = (boxes[:, 2:] - boxes[:, :2]).prod(1)
+
+    # covers[i, j]: box j covers box i and is whole or larger, so box i adds nothing
+    covers = candidates & (intersection >= TILE_CONTAIN_IOS * area[:, None]) & (~cut[None, :] | (area[None, :] > area[:, None]))
+    keep = ~(cut & covers.any(1))
+    boxes, scores, labels, cut, candidates, intersection = (
+        boxes[keep], scores[keep], labels[keep], cut[keep], candidates[keep][:, keep], intersection[keep][:, keep]
+    )
+
+    # Group the parts of each object with a union-find over matching pairs of cut-off boxes
+    aligned = torch.max(_interval_iou(boxes[:, 0], boxes[:, 2]), _interval_iou(boxes[:, 1], boxes[:, 3]))
+    pairs = candidates & cut[:, None] & cut[None, :] & (intersection > 0) & (aligned >= TILE_SEAM_IOU)
+    parents = list(range(len(boxes)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for i, j in torch.nonzero(pairs).tolist():
+        parents[find(i)] = find(j)
+    roots = [find(index) for index in range(len(boxes))]
+    if len(set(roots)) < len(boxes):
+        members = [torch.tensor([root == group for root in roots], device=boxes.device) for group in sorted(set(roots))]
+        boxes = torch.stack([torch.cat([boxes[m, :2].min(0).values, boxes[m, 2:].max(0).values]) for m in members])
+        scores = torch.stack([scores[m].max() for m in members])
+        labels = torch.stack([labels[m][0] for m in members])
+
+    keep = batched_nms(boxes, scores, labels, nms_iou)
+    return boxes[keep], scores[keep], labels[keep]
+
+
+# Map model outputs back to one prediction dict per frame in original frame coordinates
+# Tile detections are shifted by their tile offset, merged across tiles and unscaled.
+def merge_inference_outputs(outputs, layout, nms_iou=0.5):
+    merged = []
+    index = 0
+    for frame_layout in layout:
+        tiles = frame_layout["tiles"]
+        frame_outputs = outputs[index:index + len(tiles)]
+        index += len(tiles)
+
+        # Untiled, unscaled frames pass straight through
+        if len(tiles) == 1 and frame_layout["scale"] == 1.0:
+            merged.append(frame_outputs[0])
+            continue
+
+        image_height, image_width = frame_layout["size"]
+        boxes, scores, labels, tile_ids, cut = [], [], [], [], []
+        for tile_index, ((x0, y0, tile_width, tile_height), output) in enumerate(zip(tiles, frame_outputs)):
+            tile_boxes = output["boxes"]
+            offset = torch.tensor([x0, y0, x0, y0], dtype=tile_boxes.dtype, device=tile_boxes.device)
+            boxes.append(tile_boxes + offset)
+            scores.append(output["scores"])
+            labels.append(output["labels"])
+            tile_ids.append(torch.full((len(tile_boxes),), tile_index, dtype=torch.int64, device=tile_boxes.device))
+            cut.append(_interior_edge_mask(tile_boxes, x0, y0, tile_width, tile_height, image_height, image_width))
+
+        boxes = torch.cat(boxes)
+        scores = torch.cat(scores)
+        labels = torch.cat(labels)
+
+        if len(tiles) > 1:
+            boxes, scores, labels = _merge_tile_detections(boxes, scores, labels, torch.cat(tile_ids), torch.cat(cut), nms_iou)
+
+        merged.append({"boxes": boxes / frame_layout["scale"], "scores": scores, "labels": labels})
+    return merged
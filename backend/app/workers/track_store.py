@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import numpy as np
+
+# One row per tracked object per frame, each column stored in its own flat binary file
+TRACK_COLUMNS = {
+    "frame_index": np.int32,
+    "track_id": np.int32,
+    "x1": np.float32,
+    "y1": np.float32,
+    "x2": np.float32,
+    "y2": np.float32,
+    "score": np.float32,
+    "interpolated": np.uint8,  # 1 when the box comes from the tracker estimate rather than a detection on this frame
+}
+
+# Row offset of the first row of every frame (plus a final end offset), lets a time range be sliced without scanning
+FRAME_OFFSETS_FILE = "frame_offsets.bin"
+META_FILE = "meta.json"
+
+# Frames buffered in memory before they are appended to the column files
+FLUSH_EVERY_FRAMES = 256
+
+
+# Incremental writer for a job's per-frame tracks
+# Rows are buffered for a few hundred frames and then appended to the column files, so memory stays
+# flat for any video length and the store can be memory mapped and sliced by time once closed.
+# resume_from takes the state returned by checkpoint() and drops anything written after it.
+class TrackStoreWriter:
+    def __init__(self, directory, fps, resume_from=None):
+        self.directory = directory
+        self.fps = fps or 30
+        self.row_count = 0
+        self.frame_count = 0
+        self._rows = {name: [] for name in TRACK_COLUMNS}
+        self._frame_offsets = []
+        self._frame_detections = []
+
+        os.makedirs(directory, exist_ok=True)
+        if resume_from is None:
+            for name in list(TRACK_COLUMNS) + ["frame_offsets", "frame_detections"]:
+                open(self._path(name), "wb").close()
+        else:
+            self.row_count = resume_from["row_count"]
+            self.frame_count = resume_from["frame_count"]
+            for name, dtype in TRACK_COLUMNS.items():
+                os.truncate(self._path(name), self.row_count * np.dtype(dtype).itemsize)
+            os.truncate(self._path("frame_offsets"), self.frame_count * np.dtype(np.int64).itemsize)
+            os.truncate(self._path("frame_detections"), self.frame_count * np.dtype(np.int32).itemsize)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    # One frame's tracks as arrays: track_ids (N,), boxes (N, 4) x1 y1 x2 y2, scores (N,), interpolated (N,)
+    # Arrays are buffered per frame and concatenated per column on flush.
+    def add_frame(self, frame_index, track_ids, boxes, scores, interpolated, detection_count):
+        self._frame_offsets.append(self.row_count)
+        self._frame_detections.append(detection_count)
+        self._rows["frame_index"].append(np.full(len(track_ids), frame_index, dtype=np.int32))
+        self._rows["track_id"].append(track_ids)
+        self._rows["x1"].append(boxes[:, 0])
+        self._rows["y1"].append(boxes[:, 1])
+        self._rows["x2"].append(boxes[:, 2])
+        self._rows["y2"].append(boxes[:, 3])
+        self._rows["score"].append(scores)
+        self._rows["interpolated"].append(interpolated)
+        self.row_count += len(track_ids)
+        self.frame_count += 1
+
+        if len(self._frame_offsets) >= FLUSH_EVERY_FRAMES:
+            self.flush()
+
+    def flush(self):
+        for name, dtype in TRACK_COLUMNS.items():
+            with open(self._path(name), "ab") as f:
+                if self._rows[name]:
+                    f.write(np.concatenate(self._rows[name]).astype(dtype).tobytes())
+            self._rows[name] = []
+        with open(self._path("frame_offsets"), "ab") as f:
+            f.write(np.asarray(self._frame_offsets, dtype=np.int64).tobytes())
+        with open(self._path("frame_detections"), "ab") as f:
+            f.write(np.asarray(self._frame_detections, dtype=np.int32).tobytes())
+        self._frame_offsets = []
+        self._frame_detections = []
+
+    # Flush buffered rows and return what is needed to resume writing from this frame
+    def checkpoint(self):
+        self.flush()
+        return {"row_count": self.row_count, "frame_count": self.frame_count}
+
+    def close(self):
+        self._frame_offsets.append(self.row_count)  # End offset of the last frame
+        self.flush()
+        meta = {
+            "fps": self.fps,
+            "frames": self.frame_count,
+            "rows": self.row_count,
+            "columns": {name: np.dtype(dtype).name for name, dtype in TRACK_COLUMNS.items()},
+        }
+        with open(os.path.join(self.directory, META_FILE), "w") as f:
+            json.dump(meta, f)
+
+
+# Helper to read the metadata of a closed track store
+def read_track_meta(directory):
+    with open(os.path.join(directory, META_FILE)) as f:
+        return json.load(f)
+
+
+# Read the rows for frames whose timestamps fall in [start_seconds, end_seconds)
+# Columns are memory mapped, so only the requested slice is read from disk. Returns (meta, columns, truncated).
+def read_time_range(directory, start_seconds=0.0, end_seconds=None, limit=None):
+    meta = read_track_meta(directory)
+    fps = meta["fps"]
+    frames = meta["frames"]
+    if meta["rows"] == 0 or frames == 0:
+        columns = {name: np.zeros(0, dtype=dtype) for name, dtype in TRACK_COLUMNS.items()}
+        columns["timestamp"] = np.zeros(0, dtype=np.float64)
+        return meta, columns, False
+
+    first_frame = min(frames, max(0, math.ceil(start_seconds * fps)))
+    last_frame = frames if end_seconds is None else min(frames, max(first_frame, math.ceil(end_seconds * fps)))
+
+    offsets = np.memmap(os.path.join(directory, FRAME_OFFSETS_FILE), dtype=np.int64, mode="r")
+    row_start, row_end = int(offsets[first_frame]), int(offsets[last_frame])
+
+    truncated = False
+    if limit is not None and row_end - row_start > limit:
+        row_end = row_start + limit
+        truncated = True
+
+    columns = {}
+    for name, dtype in TRACK_COLUMNS.items():
+        column = np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(meta["rows"],))
+        columns[name] = np.array(column[row_start:row_end])
+    columns["timestamp"] = columns["frame_index"].astype(np.float64) / fps
+    return meta, columns, truncated
@@ -0,0 +1,240 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import numpy as np
+from norfair import Detection, Tracker
+from scipy.optimize import linear_sum_assignment
+
+# One frame of tracker output, one entry per active track:
+#   ids (N,) display ids, boxes (N, 4) x1 y1 x2 y2, scores (N,) detection score or NaN when the track was not
+#   matched to a detection on this frame, matched (N,) bool, centroids (N, 2) the tracker's position estimate
+TrackedFrame = namedtuple("TrackedFrame", "ids boxes scores matched centroids")
+
+# Cost given to track/detection pairs that must never be matched
+NO_MATCH_COST = 1e6
+
+# Blend factors of the constant-velocity filter: how far a match pulls the estimate and its velocity
+FILTER_POSITION_GAIN = 0.8
+FILTER_VELOCITY_GAIN = 0.3
+
+# Keyframes a track keeps moving and is shown without a match, after that it is only kept to be re-matched
+COAST_KEYFRAMES = 2
+
+# Minimum IoU for the second pass that matches low-score detections, which has no centroid fallback
+LOW_SCORE_MATCH_IOU = 0.5
+
+
+# Helper to read the tracker settings from app config, also part of the result cache key and checkpoint fingerprint
+def get_tracker_settings(config):
+    return {
+        "tracker": config.get("TRACKER", "norfair"),
+        "distance_threshold": config.get("TRACKER_DISTANCE_THRESHOLD", 30),
+        "max_age": config.get("TRACKER_MAX_AGE", 60),
+        "init_hits": config.get("TRACKER_INIT_HITS", 3),
+        "match_iou": config.get("TRACKER_MATCH_IOU", 0.2),
+        "high_score": config.get("TRACKER_HIGH_SCORE", 0.95),
+    }
+
+
+def box_centroids(boxes):
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+# Pairwise IoU of two sets of x1 y1 x2 y2 boxes, (N, 4) x (M, 4) -> (N, M)
+def iou_matrix(boxes_a, boxes_b):
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+# Optimal one-to-one matching on a cost matrix, returns (row indices, column indices) of the feasible pairs
+def assign(cost):
+    if cost.size == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    rows, cols = linear_sum_assignment(cost)
+    feasible = cost[rows, cols] < NO_MATCH_COST
+    return rows[feasible], cols[feasible]
+
+
+# Interface every tracker implements, one instance per job so ids and state never leak between videos
+# update() is called once per frame, in order: with that frame's detections (boxes (N, 4) x1 y1 x2 y2 and
+# scores (N,) as NumPy arrays) on keyframes, or with none on frames the detector skipped. period is how many
+# frames the detections stand for, i.e. frames since the previous keyframe. Returns a TrackedFrame.
+# Trackers must be picklable so a job checkpoint can resume them.
+class ObjectTracker(ABC):
+    @abstractmethod
+    def update(self, boxes=None, scores=None, period=1):
+        pass
+
+
+# ByteTrack-style tracker with every step vectorised over all tracks and detections
+# Tracks carry a constant-velocity estimate of centre and size. On each keyframe the predicted boxes are
+# matched to detections by linear assignment on an IoU cost, falling back to centroid distance for small or
+# fast objects that no longer overlap their prediction. Detections below high_score only get a second pass
+# against the confirmed tracks left over and never start a track. A track is shown once it has matched
+# init_hits keyframes, hidden once it has coasted COAST_KEYFRAMES keyframes without a match, and dropped
+# after max_age frames without one.
+class ByteTracker(ObjectTracker):
+    def __init__(self, distance_threshold=30, max_age=60, init_hits=3, match_iou=0.2, high_score=0.95):
+        self.distance_threshold = distance_threshold
+        self.max_age = max_age
+        self.init_hits = max(1, init_hits)
+        self.match_iou = match_iou
+        self.high_score = high_score
+        self.next_id = 1
+        self.keyframe_period = 1
+
+        self.ids = np.empty(0, np.int64)       # 0 while the track is tentative
+        self.state = np.empty((0, 4))          # cx, cy, w, h
+        self.velocity = np.empty((0, 4))
+        self.last_boxes = np.empty((0, 4))     # last matched detection box
+        self.hits = np.empty(0, np.int64)
+        self.misses = np.empty(0, np.int64)    # frames since the last match
+
+    # Advance every track one frame, a track that has coasted past COAST_KEYFRAMES keyframes stops moving
+    def _predict(self):
+        coasting = (self.misses < COAST_KEYFRAMES * self.keyframe_period)[:, None]
+        self.state = self.state + np.where(coasting, self.velocity, 0)
+        self.state[:, 2:] = np.maximum(self.state[:, 2:], 1)
+        self.misses = self.misses + 1
+
+    def _state_boxes(self):
+        half_size = self.state[:, 2:] / 2
+        return np.concatenate([self.state[:, :2] - half_size, self.state[:, :2] + half_size], axis=1)
+
+    # Cost of matching tracks to detections: 1 - IoU for overlapping pairs, above 1 for pairs only close by centroid
+    def _cost(self, track_boxes, boxes, min_iou, use_distance):
+        iou = iou_matrix(track_boxes, boxes)
+        cost = np.where(iou >= min_iou, 1 - iou, NO_MATCH_COST)
+        if use_distance and self.distance_threshold > 0:
+            distance = np.linalg.norm(box_centroids(track_boxes)[:, None] - box_centroids(boxes)[None], axis=2)
+            cost = np.where((cost >= NO_MATCH_COST) & (distance <= self.distance_threshold),
+                            1 + distance / self.distance_threshold, cost)
+        return cost
+
+    def _apply_matches(self, track_rows, boxes):
+        measured = np.concatenate([box_centroids(boxes), boxes[:, 2:] - boxes[:, :2]], axis=1)
+        residual = measured - self.state[track_rows]
+        elapsed = np.maximum(self.misses[track_rows], 1)[:, None]
+        self.state[track_rows] += FILTER_POSITION_GAIN * residual
+        self.velocity[track_rows] += FILTER_VELOCITY_GAIN * residual / elapsed
+        self.last_boxes[track_rows] = boxes
+        self.hits[track_rows] += 1
+        self.misses[track_rows] = 0
+
+    def _select(self, keep):
+        for name in ("ids", "state", "velocity", "last_boxes", "hits", "misses"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def _add_tracks(self, boxes):
+        count = len(boxes)
+        self.ids = np.concatenate([self.ids, np.zeros(count, np.int64)])
+        self.state = np.concatenate([self.state, np.concatenate([box_centroids(boxes), boxes[:, 2:] - boxes[:, :2]], axis=1)])
+        self.velocity = np.concatenate([self.velocity, np.zeros((count, 4))])
+        self.last_boxes = np.concatenate([self.last_boxes, boxes])
+        self.hits = np.concatenate([self.hits, np.ones(count, np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(count, np.int64)])
+
+    def update(self, boxes=None, scores=None, period=1):
+        self._predict()
+        matched = np.zeros(len(self.ids), bool)
+        match_scores = np.full(len(self.ids), np.nan)
+
+        if boxes is not None:
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+            scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+            self.keyframe_period = max(1, period)
+            track_boxes = self._state_boxes()
+            high = np.flatnonzero(scores >= self.high_score)
+            low = np.flatnonzero(scores < self.high_score)
+
+            # First pass: every track against the confident detections
+            rows, cols = assign(self._cost(track_boxes, boxes[high], self.match_iou, True))
+            self._apply_matches(rows, boxes[high[cols]])
+            matched[rows] = True
+            match_scores[rows] = scores[high[cols]]
+            new_detections = np.delete(high, cols)
+
+            # Second pass: confirmed tracks still unmatched against the low-score detections, by overlap only
+            leftover = np.flatnonzero(~matched & (self.ids > 0))
+            if len(leftover) and len(low):
+                rows, cols = assign(self._cost(track_boxes[leftover], boxes[low], LOW_SCORE_MATCH_IOU, False))
+                self._apply_matches(leftover[rows], boxes[low[cols]])
+                matched[leftover[rows]] = True
+                match_scores[leftover[rows]] = scores[low[cols]]
+
+            # Tentative tracks that missed this keyframe are dropped, confident leftovers start new ones
+            keep = (matched | (self.ids > 0)) & (self.misses <= self.max_age)
+            self._select(keep)
+            self._add_tracks(boxes[new_detections])
+            matched = np.concatenate([matched[keep], np.ones(len(new_detections), bool)])
+            match_scores = np.concatenate([match_scores[keep], scores[new_detections]])
+        else:
+            keep = self.misses <= self.max_age
+            self._select(keep)
+            matched, match_scores = matched[keep], match_scores[keep]
+
+        # Confirmed tracks get the next display ids in the order they were first seen
+        confirmed = np.flatnonzero((self.ids == 0) & (self.hits >= self.init_hits))
+        self.ids[confirmed] = np.arange(self.next_id, self.next_id + len(confirmed))
+        self.next_id += len(confirmed)
+
+        # Lost tracks stay hidden while they wait for a re-match, so they do not linger on screen as stale boxes
+        active = (self.ids > 0) & (self.misses <= COAST_KEYFRAMES * self.keyframe_period)
+        matched = matched[active]
+        boxes = np.where(matched[:, None], self.last_boxes[active], self._state_boxes()[active])
+        return TrackedFrame(self.ids[active], boxes, match_scores[active], matched, self.state[active, :2].copy())
+
+
+# Norfair's centroid tracker behind the same interface, kept for comparison and existing deployments
+# On frames without detections the last detected box is moved to Norfair's position estimate.
+class NorfairTracker(ObjectTracker):
+    def __init__(self, distance_threshold=30, max_age=60, init_hits=3, **_):
+        self.tracker = Tracker(
+            distance_function="euclidean",
+            distance_threshold=distance_threshold,
+            hit_counter_max=max_age,
+            initialization_delay=init_hits,
+        )
+
+    def update(self, boxes=None, scores=None, period=1):
+        if boxes is None:
+            detections = []
+            objects = self.tracker.update()
+        else:
+            detections = [
+                Detection(points=centroid[None], scores=score[None], data=box)
+                for centroid, score, box in zip(box_centroids(boxes), scores, boxes)
+            ]
+            objects = self.tracker.update(detections=detections, period=period)
+
+        detection_ids = {id(detection) for detection in detections}
+        ids = np.array([obj.id for obj in objects], dtype=np.int64)
+        centroids = np.array([obj.estimate[0] for obj in objects], dtype=np.float64).reshape(-1, 2)
+        matched = np.array([id(obj.last_detection) in detection_ids for obj in objects], dtype=bool)
+        last_boxes = np.array([
+            obj.last_detection.data if hasattr(obj.last_detection, "data") else (*(c - 20), *(c + 20))
+            for obj, c in zip(objects, centroids)
+        ], dtype=np.float64).reshape(-1, 4)
+        scores_out = np.array([
+            float(obj.last_detection.scores[0]) if is_matched else np.nan for obj, is_matched in zip(objects, matched)
+        ], dtype=np.float64)
+
+        if boxes is None:
+            half_size = (last_boxes[:, 2:] - last_boxes[:, :2]) / 2
+            last_boxes = np.concatenate([centroids - half_size, centroids + half_size], axis=1)
+        return TrackedFrame(ids, last_boxes, scores_out, matched, centroids)
+
+
+TRACKERS = {"norfair": NorfairTracker, "bytetrack": ByteTracker}
+
+
+# Helper to create a tracker for a single job from get_tracker_settings()
+def create_tracker(settings=None):
+    settings = dict(settings or get_tracker_settings({}))
+    name = settings.pop("tracker")
+    if name not in TRACKERS:
+        raise ValueError(f"Unknown tracker '{name}', expected one of {tuple(TRACKERS)}")
+    return TRACKERS[name](**settings)
@@ -0,0 +1,287 @@
+import os
+import subprocess
+import tempfile
+
+
+# Segment length for HLS output in seconds, renditions share keyframe positions so players can switch at any segment
+HLS_SEGMENT_SECONDS = 4
+
+# Segment length for live stream output, short segments keep the playlist close behind the feed
+LIVE_HLS_SEGMENT_SECONDS = 2
+
+# Bitrate of the single rendition a live stream gets when HLS_RENDITIONS is empty, live output always goes out as HLS
+LIVE_DEFAULT_KBPS = 2800
+
+HLS_MASTER_PLAYLIST = "master.m3u8"
+HLS_VARIANT_PLAYLIST = "index.m3u8"
+
+
+# Helper to parse an HLS rendition spec like "720:2800,360:800" into (height, kbps) pairs
+# Renditions taller than the source are dropped; if none remain the source height is used with the first bitrate.
+def parse_hls_renditions(spec, source_height):
+    renditions = []
+    for item in (spec or "").split(","):
+        if item.strip():
+            height, kbps = item.split(":")
+            renditions.append((int(height), int(kbps)))
+    if not renditions:
+        return []
+
+    fitting = [(height, kbps) for height, kbps in renditions if height <= source_height]
+    return fitting or [(source_height - source_height % 2, renditions[0][1])]
+
+
+# Single-pass H.264 writer: annotated frames are piped as raw BGR into one ffmpeg process
+# Replaces writing an mp4v file with cv2.VideoWriter and then re-encoding the whole file to libx264,
+# so each job decodes and encodes once and leaves one output file on disk. The audio track of the
+# source video is copied across when present, and faststart puts the moov atom first for streaming.
+# With hls_dir and renditions set, the same process also scales the frames to each (height, kbps) rendition
+# and writes them as an HLS event playlist: segments appear as the job runs, so playback can start early.
+class FfmpegVideoWriter:
+    def __init__(self, output_path, fps, width, height, audio_source=None, preset="veryfast", crf=23,
+                 hls_dir=None, renditions=(), hls_append=False, start_time=0.0):
+        fps = fps or 30
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_source:
+            command += ["-i", audio_source]
+
+        # yuv420p needs even dimensions
+        pad_filter = "pad=ceil(iw/2)*2:ceil(ih/2)*2"
+        if hls_dir and renditions:
+            # Raw frames are split after padding, one branch for the mp4 and one scaled branch per rendition
+            labels = "".join(f"[hls{index}]" for index in range(len(renditions)))
+            graph = [f"[0:v]{pad_filter},split={len(renditions) + 1}[main]{labels}"]
+            graph += [f"[hls{index}]scale=-2:{height}[rendition{index}]" for index, (height, _) in enumerate(renditions)]
+            command += ["-filter_complex", ";".join(graph), "-map", "[main]"]
+        else:
+            command += ["-vf", pad_filter, "-map", "0:v:0"]
+
+        if audio_source:
+            command += ["-map", "1:a?", "-c:a", "aac", "-shortest"]
+        command += [
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            output_path,
+        ]
+
+        if hls_dir and renditions:
+            command += self._hls_output_args(hls_dir, renditions, fps, preset, hls_append, start_time)
+
+        self.output_path = output_path
+        self.stderr = tempfile.TemporaryFile()  # A file rather than a pipe so a chatty ffmpeg can never block
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.stderr)
+
+    # Second output of the same ffmpeg process: every rendition as a variant stream of one HLS master playlist
+    # Video only, the source audio stays in the mp4. Fixed GOPs without scene-cut keyframes keep segment
+    # boundaries aligned across renditions. hls_append continues existing playlists from start_time seconds,
+    # for video written in parts, and leaves them open for the next part. live_window writes a live playlist
+    # of the last live_window short segments instead, deleting older ones.
+    @staticmethod
+    def _hls_output_args(hls_dir, renditions, fps, preset, hls_append=False, start_time=0.0, live_window=0):
+        segment_seconds = LIVE_HLS_SEGMENT_SECONDS if live_window else HLS_SEGMENT_SECONDS
+        gop = max(1, round(fps * segment_seconds))
+        args = []
+        for index in range(len(renditions)):
+            args += ["-map", f"[rendition{index}]"]
+        args += ["-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p",
+                 "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+        if live_window:
+            args += ["-tune", "zerolatency"]
+        for index, (_, kbps) in enumerate(renditions):
+            args += [f"-b:v:{index}", f"{kbps}k", f"-maxrate:v:{index}", f"{kbps}k", f"-bufsize:v:{index}", f"{2 * kbps}k"]
+        hls_flags = "independent_segments+temp_file"
+        if hls_append:
+            hls_flags += "+append_list+omit_endlist"
+            args += ["-output_ts_offset", f"{start_time:.6f}"]
+        if live_window:
+            hls_flags += "+delete_segments"
+            playlist_args = ["-hls_list_size", str(live_window)]
+        else:
+            playlist_args = ["-hls_playlist_type", "event"]
+        args += [
+            "-f", "hls",
+            "-hls_time", str(segment_seconds),
+            *playlist_args,
+            "-hls_flags", hls_flags,
+            "-hls_segment_filename", f"{hls_dir}/%v/segment_%05d.ts",
+            "-master_pl_name", HLS_MASTER_PLAYLIST,
+            "-var_stream_map", " ".join(f"v:{index},name:{height}p" for index, (height, _) in enumerate(renditions)),
+            f"{hls_dir}/%v/{HLS_VARIANT_PLAYLIST}",
+        ]
+        return args
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def _error_output(self):
+        self.stderr.seek(0)
+        return self.stderr.read().decode(errors="replace").strip()
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, ValueError):
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg exited while encoding {self.output_path}: {self._error_output()}")
+
+    # Flush the remaining frames and wait for ffmpeg to finalise the file, raises if encoding failed
+    def release(self):
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self.process.wait()
+        error_output = self._error_output()
+        self.stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed encoding {self.output_path}: {error_output}")
+
+    # Stop ffmpeg without finalising the output, used when the job fails part way through
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+
+
+# Rolling HLS writer for live stream jobs, annotated frames are piped as raw BGR into one ffmpeg process
+# Frames are timestamped as they arrive and resampled to a constant fps, so frames the worker dropped to stay
+# within its latency budget are filled by repeating the previous one and the output keeps pace with the feed.
+# The playlists only list the last `window` segments, the segments that fall out of them are deleted.
+class LiveHlsWriter(FfmpegVideoWriter):
+    def __init__(self, hls_dir, fps, width, height, renditions, preset="veryfast", window=6):
+        fps = fps or 30
+        labels = "".join(f"[hls{index}]" for index in range(len(renditions)))
+        graph = [f"[0:v]fps={fps},pad=ceil(iw/2)*2:ceil(ih/2)*2,split={len(renditions)}{labels}"]
+        graph += [f"[hls{index}]scale=-2:{height}[rendition{index}]" for index, (height, _) in enumerate(renditions)]
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-use_wallclock_as_timestamps", "1",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+            "-i", "-",
+            "-filter_complex", ";".join(graph),
+        ]
+        command += self._hls_output_args(hls_dir, renditions, fps, preset, live_window=max(1, window))
+
+        self.output_path = hls_dir
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.stderr)
+
+
+# Helper to read every HLS playlist under hls_dir, keyed by path relative to it
+def read_hls_playlists(hls_dir):
+    playlists = {}
+    if not hls_dir or not os.path.isdir(hls_dir):
+        return playlists
+    for root, _, files in os.walk(hls_dir):
+        for name in files:
+            if name.endswith(".m3u8"):
+                path = os.path.join(root, name)
+                with open(path) as f:
+                    playlists[os.path.relpath(path, hls_dir)] = f.read()
+    return playlists
+
+
+# Helper to put HLS playlists back as read by read_hls_playlists, later segments are overwritten as they are re-encoded
+def restore_hls_playlists(hls_dir, playlists):
+    for relative_path, content in playlists.items():
+        path = os.path.join(hls_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+# Helper to mark HLS variant playlists complete once the last part has been written
+def end_hls_playlists(hls_dir):
+    for relative_path, content in read_hls_playlists(hls_dir).items():
+        if relative_path != HLS_MASTER_PLAYLIST and "#EXT-X-ENDLIST" not in content:
+            with open(os.path.join(hls_dir, relative_path), "a") as f:
+                f.write("#EXT-X-ENDLIST\n")
+
+
+# Join video-only parts into one mp4 without re-encoding, muxing in the source audio when it has any
+def concat_video_parts(part_paths, output_path, audio_source=None):
+    list_path = f"{output_path}.parts.txt"
+    with open(list_path, "w") as f:
+        for path in part_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_source:
+        command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a?", "-c:a", "aac", "-shortest"]
+    command += ["-c:v", "copy", "-movflags", "+faststart", output_path]
+
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(list_path)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed joining parts of {output_path}: {result.stderr.decode(errors='replace').strip()}")
+
+
+# Writer that encodes the processed video as a series of part files which can be closed at any frame
+# A closed part is complete on disk, so a checkpoint only has to list the parts and a resumed job re-encodes
+# from there. release() joins the parts with the source audio in a stream copy and closes the HLS playlists.
+class SegmentedVideoWriter:
+    def __init__(self, output_path, parts_dir, fps, width, height, audio_source=None, preset="veryfast", crf=23,
+                 hls_dir=None, renditions=(), parts=(), start_frame=0):
+        self.output_path = output_path
+        self.parts_dir = parts_dir
+        self.fps = fps or 30
+        self.width = width
+        self.height = height
+        self.audio_source = audio_source
+        self.preset = preset
+        self.crf = crf
+        self.hls_dir = hls_dir
+        self.renditions = renditions
+        self.parts = list(parts)
+        self.frames_written = start_frame
+
+        os.makedirs(parts_dir, exist_ok=True)
+        self.writer = None
+        self._open_part()
+
+    def _open_part(self):
+        part_path = os.path.join(self.parts_dir, f"part_{len(self.parts):05d}.mp4")
+        self.writer = FfmpegVideoWriter(
+            part_path, self.fps, self.width, self.height,
+            preset=self.preset, crf=self.crf,
+            hls_dir=self.hls_dir, renditions=self.renditions,
+            hls_append=True, start_time=self.frames_written / self.fps,
+        )
+
+    def isOpened(self):
+        return self.writer is None or self.writer.isOpened()
+
+    def write(self, frame):
+        if self.writer is None:
+            self._open_part()
+        self.writer.write(frame)
+        self.frames_written += 1
+
+    # Finish the current part so everything written so far is on disk, returns all closed part paths
+    def close_part(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.parts.append(self.writer.output_path)
+            self.writer = None
+        return list(self.parts)
+
+    def release(self):
+        self.close_part()
+        concat_video_parts(self.parts, self.output_path, self.audio_source)
+        if self.hls_dir:
+            end_hls_playlists(self.hls_dir)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
@@ -1,78 +1,31 @@
 import time
 from datetime import datetime
-from app.models.processing_queue import ProcessingQueue
 from app.extensions import db
+from app.workers.frame_pipeline import FramePipeline
+from app.workers.keyframes import KeyframeSelector, KeyframeStats
+from app.workers.tiling import get_inference_settings, merge_inference_outputs, prepare_inference_images
+from app.workers.detection_filter import DEFAULT_SCORE_THRESHOLD, filter_predictions
+from app.workers.video_encoder import LIVE_DEFAULT_KBPS, FfmpegVideoWriter, LiveHlsWriter, SegmentedVideoWriter, parse_hls_renditions, read_hls_playlists, restore_hls_playlists
+from app.workers.checkpoints import PARTS_DIR, clear_checkpoint, load_checkpoint, save_checkpoint
+from app.workers.track_store import TrackStoreWriter
+from app.workers.live_stream import LiveFrameSource
+from app.workers.trackers import create_tracker, get_tracker_settings
+from app.workers.progress_events import ProgressMeter, publish_progress, task_event
+from app.workers.job_metrics import JOB_BUCKETS, JobMetrics, create_profiler, measure_stage, metrics_registry, record_error
+from app.workers.result_cache import materialize_result, result_cache_key, store_result
+from app.workers.inference_server import get_inference_client
+from app.workers.scheduler import ClaimLostError, Heartbeat, claim_next_task, default_worker_id, reclaim_stale_tasks
+from flask import current_app
+from app.workers.model_loader import BASE_DIR, device, get_loaded_model
 import torch
-import torchvision
-import torch.nn as nn
-from torchvision.models.detection import FasterRCNN
-from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
 import cv2
 from torchvision import transforms
 import os
+import pickle
+import shutil
 import numpy as np
-from norfair import Detection, Tracker
-import gdown
-import subprocess
 import random
 
-# Init directory and model vars
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_PATH = os.path.join(BASE_DIR, "ml_models/model_01_20251702_final_epoch_20.pth")
-GDRIVE_FILE_ID = "1_I7ijKT_EgoU-GAHR5-0dfakSe_e07My"
-GDRIVE_URL = f"https://drive.google.com/uc?id={GDRIVE_FILE_ID}"
-
-# If model does not exist, download it from gdrive
-if not os.path.exists(MODEL_PATH):
-    os.makedirs(os.path.join(BASE_DIR, "ml_models"), exist_ok=True)
-    gdown.download(GDRIVE_URL, MODEL_PATH, quiet=False)
-
-# Define custom classifier head for FRCNN model
-class CustomFastRCNNPredictor(nn.Module):
-    def __init__(self, in_channels, num_classes):
-        super().__init__()
-        self.classifier = nn.Sequential(
-            nn.Linear(in_channels, 512),
-            nn.ReLU(),
-            nn.BatchNorm1d(512),
-            nn.Dropout(0.3),
-            nn.Linear(512, 256),
-            nn.ReLU(),
-            nn.BatchNorm1d(256),
-            nn.Dropout(0.3),
-            nn.Linear(256, num_classes)
-        )
-        self.bbox_regressor = nn.Linear(in_channels, num_classes * 4)
-
-    def forward(self, x):
-        scores = self.classifier(x)
-        bbox_deltas = self.bbox_regressor(x)
-        return scores, bbox_deltas
-
-# Helper to get model
-def get_model(num_classes):
-    backbone = resnet_fpn_backbone(backbone_name='resnet50', weights='DEFAULT')
-    model = FasterRCNN(backbone, num_classes=num_classes)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = CustomFastRCNNPredictor(in_features, num_classes)
-    return model
-
-# Helper to encode video after processing
-# This is a workaround for macOS devices as MacOS hardware encoding is not possible in docker container
-def run_ffmpeg_encoding(input_video_path, output_video_path):
-    command = [
-        "ffmpeg", 
-        "-i", input_video_path,
-        "-vcodec", "libx264",
-        "-acodec", "aac",
-        "-strict", "-2",
-        output_video_path
-    ]
-    try:
-        subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        pass
-
 # Helper function to assign random colours to detected objects
 def get_colour(track_id, id_color_map):
     if track_id not in id_color_map:
@@ -84,182 +37,702 @@ def get_colour(track_id, id_color_map):
         )
     return id_color_map[track_id]
 
-# Initialise the Norfair tracker
-tracker = Tracker(
-    distance_function="euclidean",
-    distance_threshold=30,
-    hit_counter_max=60,
-    initialization_delay=3
-)
-
-# Initialise classes and device vars
-NUM_CLASSES = 2
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-# Get model and move to device
-try:
-    model = get_model(NUM_CLASSES)
-    checkpoint = torch.load(MODEL_PATH, map_location=device)
-    model.load_state_dict(checkpoint["model_state_dict"])
-    model.to(device)
-    model.eval()
-except Exception as e:
-    pass
-
 transform = transforms.Compose([
     transforms.ToTensor()
 ])
 
-# Main processor worker loop
-def process_video_worker_loop():
+# Helper to draw bounding boxes and labels for a frame's tracks (a TrackedFrame) onto the frame in place
+def draw_tracked_objects(frame, tracked, id_color_map, unique_ids):
+    unique_ids.update(tracked.ids.tolist())
+
+    # Boxes are drawn at integer pixel coordinates
+    for track_id, (x1, y1, x2, y2) in zip(tracked.ids.tolist(), tracked.boxes.astype(int).tolist()):
+        # Assign color
+        color = get_colour(track_id, id_color_map)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        # Prepare label
+        label = f"Sheep #{track_id}"
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+
+        # Draw filled label background
+        label_bg_topleft = (x1, y1 - th - 8)
+        label_bg_bottomright = (x1 + tw + 4, y1)
+        cv2.rectangle(frame, label_bg_topleft, label_bg_bottomright, color, -1)
+
+        # Draw label text
+        cv2.putText(frame, label, (x1 + 2, y1 - 4),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+# Helper to convert BGR images to model input tensors on the model's device
+def images_to_tensors(images):
+    return [transform(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).to(device) for image in images]
+
+# Helper to run the model on a list of BGR images, returns its raw outputs in image order
+# The inference server runs its batches through this
+def forward_images(images, model=None):
+    input_tensors = images_to_tensors(images)
+    with torch.no_grad():
+        return (model or get_loaded_model())(input_tensors)
+
+# Helper to run one forward pass over a batch of BGR frames, returns predictions in frame order
+# Frames are optionally downscaled and split into tiles first, every image of the batch goes through the model together
+# model defaults to the worker's shared model, the benchmark passes its own
+# When the inference server is running and no model is given, the images go to the server instead and are batched
+# with other jobs' images, so the inference stage also covers the wait for the batch
+# Predictions come back thresholded and on the CPU as NumPy arrays
+# job_metrics, when given, times the preprocess, inference and tile-merge/filter (postprocess) steps
+def run_batch_inference(frames, inference_settings=None, model=None, job_metrics=None):
+    settings = inference_settings or {}
+    inference_client = get_inference_client() if model is None else None
+    with measure_stage(job_metrics, "preprocess"):
+        images, layout = prepare_inference_images(
+            frames, settings.get("resolution", 0), settings.get("tile_size", 0), settings.get("tile_overlap", 0)
+        )
+        if inference_client is None:
+            input_tensors = images_to_tensors(images)
+    with measure_stage(job_metrics, "inference"), torch.no_grad():
+        if inference_client is not None:
+            outputs = inference_client(images)
+        else:
+            outputs = (model or get_loaded_model())(input_tensors)
+            if job_metrics is not None and device.type == "cuda":
+                torch.cuda.synchronize()  # CUDA runs asynchronously, wait so the time lands in this stage
+    with measure_stage(job_metrics, "postprocess"):
+        return filter_predictions(
+            merge_inference_outputs(outputs, layout, settings.get("tile_nms_iou", 0.5)),
+            settings.get("score_threshold", DEFAULT_SCORE_THRESHOLD),
+            settings.get("class_thresholds"),
+            settings.get("detection_nms_iou", 0),
+        )
+
+# Helpers to get a task's input and output paths
+def get_input_video_path(task):
+    return os.path.join(BASE_DIR, f"videos/uploads/{task.stored_file_name or task.file_name}")
+
+def get_output_video_path(task):
+    return os.path.join(os.path.dirname(BASE_DIR), f"static/assets/videos/processed/encoded_{task.id}_{task.file_name}")
+
+# Keyed by task id like the other outputs: uploads can share a file name, and a cache hit hard links its thumbnail
+def get_thumbnail_rel_path(task):
+    return f"static/assets/thumbnails/processed/{task.id}.jpg"
+
+def get_hls_dir(task):
+    return os.path.join(os.path.dirname(BASE_DIR), f"static/assets/videos/hls/{task.id}")
+
+def get_tracks_path(task):
+    return os.path.join(BASE_DIR, f"videos/processed/{task.id}_tracks")
+
+def get_checkpoint_dir(task):
+    return os.path.join(BASE_DIR, f"videos/processed/{task.id}_checkpoint")
+
+def get_profile_path(task):
+    extension = "json" if task.profile_mode == "torch" else "prof"
+    return os.path.join(BASE_DIR, f"videos/processed/{task.id}_profile.{extension}")
+
+# Helper to position a capture so the next read returns frame_index, returns False if the video is shorter
+# Seeking is tried first; containers where it lands on the wrong frame are decoded forward from the start.
+def seek_to_frame(cap, frame_index):
+    if frame_index == 0:
+        return True
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return True
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_index):
+        if not cap.grab():
+            return False
+    return True
+
+# Helper to read duration and resolution from a video's container header without decoding frames
+def probe_video_metadata(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None, None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (total_frames / fps if fps > 0 else None), f"{width}x{height}"
+    finally:
+        cap.release()
+
+# Complete a new task from a cached result of the same video and settings, returns False if the entry is unusable
+def complete_task_from_cache(task, cache_key, cached_result):
+    thumbnail_rel_path = get_thumbnail_rel_path(task)
+    thumbnail_abs_path = os.path.join(os.path.dirname(BASE_DIR), thumbnail_rel_path)
+    try:
+        materialize_result(
+            cache_key,
+            get_output_video_path(task),
+            thumbnail_abs_path,
+            get_tracks_path(task),
+            hls_dir=get_hls_dir(task),
+        )
+    except OSError as e:
+        record_error("result_cache_load", e)
+        return False  # Evicted or damaged between lookup and use, process the upload normally
+
+    for field, value in cached_result.items():
+        setattr(task, field, value)
+    task.tracks_path = get_tracks_path(task)
+    # Entries cached without a thumbnail leave none to link
+    task.thumbnail_path = thumbnail_rel_path if os.path.exists(thumbnail_abs_path) else None
+    task.final_output_video_path = get_output_video_path(task)
+    task.progress_percentage = 100
+    task.processing_time = 0
+    task.cache_hit = True
+    task.status = 'COMPLETED'
+    return True
+
+# Helper to run the detector only on keyframes of a batch, skipped frames get None predictions
+def run_keyframe_inference(frames, selector, inference_settings=None, model=None, job_metrics=None):
+    keyframe_flags = [selector.is_keyframe(frame) for frame in frames]
+    keyframes = [frame for frame, is_keyframe in zip(frames, keyframe_flags) if is_keyframe]
+    keyframe_predictions = iter(run_batch_inference(keyframes, inference_settings, model, job_metrics) if keyframes else [])
+    return [next(keyframe_predictions) if is_keyframe else None for is_keyframe in keyframe_flags]
+
+# Helper to add a TrackedFrame to the job's track store, boxes not matched to a detection count as interpolated
+def add_tracks_to_store(track_store, frame_index, tracked, detection_count):
+    track_store.add_frame(frame_index, tracked.ids, tracked.boxes, tracked.scores, ~tracked.matched, detection_count)
+
+# Helper to mark a task failed and tell progress subscribers, keeping whatever stage timings were collected
+def fail_task(task, job_metrics=None):
+    task.status = 'FAILED'
+    if job_metrics is not None:
+        task.stage_metrics = job_metrics.summary()
+    db.session.commit()
+    metrics_registry.inc("agritrack_jobs_total", {"outcome": "failed"})
+    publish_progress(task_event(task))
+
+# Helper to write a job's profiler output and record where it went
+def save_profile(task, profiler):
+    if profiler is None:
+        return
+    try:
+        task.profile_path = profiler.save()
+    except Exception as e:
+        record_error("profiler", e)
+
+# Process a single claimed task end to end
+def process_task(task, worker_id):
+    # Live feeds have no file to decode up front and run until they end or are stopped
+    if task.job_type == 'stream':
+        return process_stream_task(task, worker_id)
+
+    # Set input/output paths
+    INPUT_VIDEO_PATH = get_input_video_path(task)
+    OUTPUT_VIDEO_PATH = get_output_video_path(task)
+
+    # Running totals of accepted prediction scores to calculate confidence
+    score_stats = {"sum": 0.0, "count": 0}
+
+    # Open video and get core metrics
+    cap = cv2.VideoCapture(INPUT_VIDEO_PATH)
+
+    if not cap.isOpened():
+        fail_task(task)
+        return
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration_seconds = total_frames / fps if fps > 0 else 0
+
+    # Task was already set to processing when it was claimed
+    # Queue wait is measured on the first start only, a reclaimed or resumed job keeps its original wait
+    task.start_time = datetime.utcnow()
+    if task.queue_wait_seconds is None and task.upload_timestamp is not None:
+        task.queue_wait_seconds = (task.start_time - task.upload_timestamp).total_seconds()
+        metrics_registry.observe("agritrack_job_wait_seconds", task.queue_wait_seconds, buckets=JOB_BUCKETS)
+    db.session.commit()
+    publish_progress(task_event(task, frame_index=0, total_frames=total_frames))
+
+    # Setup is guarded as well as the frame loop: the row is already PROCESSING, so an error here left to the worker
+    # loop would only have the job reclaimed later and fail the same way again
+    try:
+        # Downscale/tiling/threshold and tracker settings, read here because pipeline stages run outside the app context
+        inference_settings = get_inference_settings(current_app.config)
+        tracker_settings = get_tracker_settings(current_app.config)
+
+        # Keyframe inference: detect every KEYFRAME_INTERVAL frames or on large scene motion, track in between
+        # A resumed job starts with a fresh selector, so its first frame is a keyframe
+        selector = KeyframeSelector(
+            interval=current_app.config.get("KEYFRAME_INTERVAL", 1),
+            motion_threshold=current_app.config.get("KEYFRAME_MOTION_THRESHOLD", 0),
+        )
+        skipping_enabled = selector.interval > 1
+
+        hls_dir = get_hls_dir(task)
+        renditions = parse_hls_renditions(current_app.config.get("HLS_RENDITIONS"), height)
+        tracks_path = get_tracks_path(task)
+
+        # Checkpoints every CHECKPOINT_INTERVAL_FRAMES let a job interrupted by a crash, restart or lost claim resume
+        # from its last checkpoint; one taken with a different input or settings is discarded
+        checkpoint_dir = get_checkpoint_dir(task)
+        checkpoint_interval = current_app.config.get("CHECKPOINT_INTERVAL_FRAMES", 0)
+        checkpoint_fingerprint = {
+            "input": INPUT_VIDEO_PATH,
+            "frames": total_frames,
+            "size": (width, height),
+            "inference": inference_settings,
+            "tracker": tracker_settings,
+            "keyframes": (selector.interval, selector.motion_threshold),
+            "renditions": renditions,
+        }
+        checkpoint = load_checkpoint(checkpoint_dir, checkpoint_fingerprint) if checkpoint_interval else None
+        if checkpoint is not None and not seek_to_frame(cap, checkpoint["frame_index"]):
+            checkpoint = None
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+        # Initialise vars for core frame loop, each job gets its own tracker so ids don't leak between videos
+        # A checkpoint that cannot be restored is dropped and the job starts over instead of failing
+        if checkpoint is not None:
+            try:
+                tracker, unique_ids, id_color_map, score_stats, keyframe_stats, keyframe_state = pickle.loads(checkpoint["annotate_state"])
+                start_frame = checkpoint["frame_index"]
+                restore_hls_playlists(hls_dir, checkpoint["hls_playlists"])
+                track_store = TrackStoreWriter(tracks_path, fps, resume_from=checkpoint["track_store"])
+            except Exception as e:
+                record_error("checkpoint_restore", e)
+                checkpoint = None
+                score_stats = {"sum": 0.0, "count": 0}
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        if checkpoint is None:
+            tracker = create_tracker(tracker_settings)
+            unique_ids = set()
+            id_color_map = {}
+            keyframe_stats = KeyframeStats()
+            keyframe_state = {"frames_since_keyframe": 0, "frame_index": -1, "previous_estimates": (np.empty(0, np.int64), np.empty((0, 2)))}
+            start_frame = 0
+            # Ensure output directories exist, a job that is not resuming starts its HLS output from scratch
+            clear_checkpoint(checkpoint_dir)
+            shutil.rmtree(hls_dir, ignore_errors=True)
+            if renditions:
+                os.makedirs(hls_dir)
+            # Per-frame boxes, scores and track ids, written incrementally to a columnar store for later analytics
+            track_store = TrackStoreWriter(tracks_path, fps)
+        os.makedirs(os.path.dirname(OUTPUT_VIDEO_PATH), exist_ok=True)
+
+        # Start the single-pass H.264 encoder, keeping the source audio and writing HLS renditions alongside
+        # With checkpoints on, the video is encoded in parts that are closed at each checkpoint and joined at the end
+        encoder_options = {
+            "preset": current_app.config.get("VIDEO_ENCODE_PRESET", "veryfast"),
+            "crf": current_app.config.get("VIDEO_ENCODE_CRF", 23),
+            "hls_dir": hls_dir if renditions else None,
+            "renditions": renditions,
+        }
+        try:
+            if checkpoint_interval:
+                out = SegmentedVideoWriter(
+                    OUTPUT_VIDEO_PATH, os.path.join(checkpoint_dir, PARTS_DIR), fps, width, height,
+                    audio_source=INPUT_VIDEO_PATH,
+                    parts=checkpoint["parts"] if checkpoint is not None else (),
+                    start_frame=start_frame,
+                    **encoder_options,
+                )
+            else:
+                out = FfmpegVideoWriter(OUTPUT_VIDEO_PATH, fps, width, height, audio_source=INPUT_VIDEO_PATH, **encoder_options)
+        except OSError as e:
+            record_error("encoder_start", e)
+            out = None
+    except Exception as e:
+        record_error("job_setup", e)
+        db.session.rollback()
+        cap.release()
+        fail_task(task)
+        return
+
+    if out is None or not out.isOpened():
+        cap.release()
+        fail_task(task)
+        return
+
+    # Per-stage timings for this job, plus an optional profiler the job was uploaded with
+    job_metrics = JobMetrics()
+    profiler = create_profiler(task.profile_mode, get_profile_path(task), current_app.config)
+    profile_stage = profiler.wrap if profiler is not None else (lambda stage, function: function)
+
+    heartbeat = Heartbeat(task, worker_id, current_app.config.get("WORKER_HEARTBEAT_INTERVAL", 15))
+    progress_update_threshold = 5
+    progress_commit_interval = current_app.config.get("PROGRESS_COMMIT_INTERVAL", 10)
+    progress_state = {"frame_index": start_frame, "last_logged_progress": 0, "last_commit": time.monotonic(), "last_frame": None}
+
+    # Fine-grained progress goes to subscribers as events, the row itself is only updated every few seconds
+    progress_meter = ProgressMeter(total_frames, current_app.config.get("PROGRESS_EVENT_INTERVAL", 0.5))
+    progress_meter.last_frame = start_frame
+
+    # Annotate-stage state captured at checkpoint frames, handed to the write stage once that frame is written
+    # The annotate stage runs ahead of the writer, so its state has to be snapshotted there, not at write time.
+    pending_checkpoints = {}
+
+    # Track/draw stage: runs in its own pipeline thread, frames arrive strictly in decode order
+    def annotate_frame(frame, predictions):
+        keyframe_state["frames_since_keyframe"] += 1
+        keyframe_state["frame_index"] += 1
+
+        if predictions is None:
+            # Skipped frame, advance the tracker on its motion model alone
+            keyframe_stats.skipped_frames += 1
+            with job_metrics.measure("track"):
+                tracked = tracker.update()
+                add_tracks_to_store(track_store, keyframe_state["frame_index"], tracked, 0)
+        else:
+            # Period tells the tracker how many frames this detection covers so hit counters don't decay
+            keyframe_stats.inference_frames += 1
+            scores = predictions["scores"]
+            score_stats["sum"] += float(scores.sum())
+            score_stats["count"] += len(scores)
+            with job_metrics.measure("track"):
+                tracked = tracker.update(predictions["boxes"], scores, period=keyframe_state["frames_since_keyframe"])
+                keyframe_state["frames_since_keyframe"] = 0
+                if skipping_enabled:
+                    keyframe_stats.add_drift(keyframe_state["previous_estimates"], tracked)
+                add_tracks_to_store(track_store, keyframe_state["frame_index"], tracked, len(scores))
+
+        with job_metrics.measure("draw"):
+            draw_tracked_objects(frame, tracked, id_color_map, unique_ids)
+
+        if skipping_enabled:
+            keyframe_state["previous_estimates"] = (tracked.ids, tracked.centroids)
+
+        frames_done = keyframe_state["frame_index"] + 1
+        if checkpoint_interval and frames_done % checkpoint_interval == 0 and frames_done < total_frames:
+            pending_checkpoints[frames_done] = {
+                "annotate_state": pickle.dumps((tracker, unique_ids, id_color_map, score_stats, keyframe_stats, keyframe_state)),
+                "track_store": track_store.checkpoint(),
+            }
+        return frame
+
+    # Called on the worker thread after each frame is written
+    def on_frame_written(frame):
+        progress_state["last_frame"] = frame
+        progress_state["frame_index"] += 1
+        heartbeat.beat()
+        metrics_registry.inc("agritrack_frames_total")
+        job_metrics.sample_queue_depths(pipeline.queue_depths())
+
+        # Close the current video part and persist everything needed to resume after this frame
+        snapshot = pending_checkpoints.pop(progress_state["frame_index"], None)
+        if snapshot is not None:
+            save_checkpoint(checkpoint_dir, {
+                "fingerprint": checkpoint_fingerprint,
+                "frame_index": progress_state["frame_index"],
+                "parts": out.close_part(),
+                "hls_playlists": read_hls_playlists(hls_dir),
+                **snapshot,
+            })
+
+        # Push progress, fps and ETA to subscribers
+        meter_reading = progress_meter.update(progress_state["frame_index"])
+        if meter_reading is not None:
+            progress, fps_estimate, eta_seconds = meter_reading
+            publish_progress(task_event(task, progress=progress, fps=fps_estimate, eta_seconds=eta_seconds,
+                                        frame_index=progress_state["frame_index"], total_frames=total_frames))
+
+        # Update progress percentage for UI
+        progress_percentage = int((progress_state["frame_index"] / total_frames) * 100)
+        if (progress_percentage >= progress_state["last_logged_progress"] + progress_update_threshold
+                and time.monotonic() - progress_state["last_commit"] >= progress_commit_interval):
+            progress_state["last_logged_progress"] = progress_percentage
+            progress_state["last_commit"] = time.monotonic()
+            task.progress_percentage = progress_percentage
+            task.processing_time = (datetime.utcnow() - task.start_time).total_seconds()
+            task.stage_metrics = job_metrics.summary()
+            db.session.commit()
+
+    pipeline = FramePipeline(
+        read_frame=profile_stage("decode", job_metrics.timed("decode", cap.read)),
+        infer_batch=profile_stage("inference", lambda frames: run_keyframe_inference(
+            frames, selector, inference_settings, job_metrics=job_metrics)),
+        annotate_frame=profile_stage("annotate", annotate_frame),
+        write_frame=profile_stage("write", job_metrics.timed("write", out.write)),
+        batch_size=current_app.config.get("INFERENCE_BATCH_SIZE", 1),
+        queue_size=current_app.config.get("PIPELINE_QUEUE_SIZE", 8),
+    )
+
+    try:
+        pipeline.run(on_frame_written=on_frame_written)
+        out.release()
+        track_store.close()
+    except ClaimLostError:
+        # Another worker reclaimed this job after our heartbeat went stale, leave the row and checkpoint to it
+        out.abort()
+        db.session.rollback()
+        metrics_registry.inc("agritrack_jobs_total", {"outcome": "claim_lost"})
+        return
+    except Exception as e:
+        record_error("pipeline", e)
+        out.abort()
+        db.session.rollback()
+        clear_checkpoint(checkpoint_dir)
+        save_profile(task, profiler)
+        fail_task(task, job_metrics)
+        return
+    finally:
+        cap.release()
+
+    save_profile(task, profiler)
+
+    last_frame = progress_state["last_frame"]
+
+    # If it is the last frame, save ax thumbnail for UI use
+    thumbnail_rel_path = get_thumbnail_rel_path(task)
+    thumbnail_abs_path = os.path.join(os.path.dirname(BASE_DIR), thumbnail_rel_path)
+    if last_frame is not None:
+        os.makedirs(os.path.dirname(thumbnail_abs_path), exist_ok=True)
+        cv2.imwrite(thumbnail_abs_path, last_frame)
+        task.thumbnail_path = thumbnail_rel_path
+        db.session.commit()
+
+    # Calculate metrics and save to DB
+    avg_conf = score_stats["sum"] / score_stats["count"] if score_stats["count"] else 0.0
+    task.tracks_path = tracks_path
+    task.final_output_video_path = OUTPUT_VIDEO_PATH
+    task.duration_seconds = duration_seconds
+    task.detected_objects = len(unique_ids)
+    task.average_confidence = avg_conf
+    task.resolution = f"{width}x{height}"
+    task.processed_frames = total_frames
+    task.inference_frames = keyframe_stats.inference_frames
+    task.skipped_frames = keyframe_stats.skipped_frames
+    task.keyframe_drift_px = keyframe_stats.mean_drift
+    processing_seconds = (datetime.utcnow() - task.start_time).total_seconds()
+    task.processing_fps = (progress_state["frame_index"] - start_frame) / processing_seconds if processing_seconds > 0 else None
+    task.stage_metrics = job_metrics.summary()
+    task.status = 'COMPLETED'
+    task.end_time = datetime.utcnow()
+    db.session.commit()
+    metrics_registry.inc("agritrack_jobs_total", {"outcome": "completed"})
+    metrics_registry.observe("agritrack_job_processing_seconds", processing_seconds, buckets=JOB_BUCKETS)
+    clear_checkpoint(checkpoint_dir)
+    publish_progress(task_event(task, fps=task.processing_fps, eta_seconds=0,
+                                frame_index=progress_state["frame_index"], total_frames=total_frames))
+
+    # Keep the result so a re-upload of the same video with the same settings completes instantly
+    if task.video_hash:
+        try:
+            cache_key = result_cache_key(task.video_hash, current_app.config)
+            store_result(cache_key, task, OUTPUT_VIDEO_PATH, thumbnail_abs_path, tracks_path,
+                         current_app.config.get("RESULT_CACHE_MAX_BYTES"), hls_dir=hls_dir)
+        except OSError as e:
+            record_error("result_cache_store", e)  # A failed cache write only costs a future reprocess
+
+# Seconds the stream loop waits for a frame before checking in with its heartbeat and row updates again
+STREAM_POLL_SECONDS = 0.5
+
+# Process a live stream job until the feed ends or a stop is requested
+# A reader thread keeps pulling frames off the feed while this loop detects, tracks and draws the oldest frame
+# still within STREAM_LATENCY_BUDGET_MS; older frames are dropped so output stays close to real time when
+# inference falls behind. The tracker still steps over dropped frames, so ids and the track store stay in step
+# with the feed. Annotated frames go out as a rolling HLS playlist and live counts are written to the row every
+# STREAM_UPDATE_INTERVAL seconds.
+def process_stream_task(task, worker_id):
+    config = current_app.config
+    source = LiveFrameSource(
+        task.source_url,
+        config.get("STREAM_LATENCY_BUDGET_MS", 500) / 1000,
+        config.get("STREAM_TIMEOUT_MS", 10000),
+        config.get("STREAM_RECONNECT_ATTEMPTS", 3),
+    )
+    try:
+        opened = source.start()
+    except (OSError, ValueError) as e:
+        record_error("stream_open", e)
+        opened = False
+    if not opened:
+        fail_task(task)
+        return
+
+    # The first frame gives the output size, streams often report none before decoding starts
+    first_frame = source.get(timeout=config.get("STREAM_TIMEOUT_MS", 10000) / 1000)
+    if first_frame is None:
+        source.stop()
+        fail_task(task)
+        return
+    height, width = first_frame.frame.shape[:2]
+    fps = source.fps
+
+    task.start_time = datetime.utcnow()
+    if task.queue_wait_seconds is None and task.upload_timestamp is not None:
+        task.queue_wait_seconds = (task.start_time - task.upload_timestamp).total_seconds()
+        metrics_registry.observe("agritrack_job_wait_seconds", task.queue_wait_seconds, buckets=JOB_BUCKETS)
+    task.resolution = f"{width}x{height}"
+    task.live_count = 0
+    task.dropped_frames = 0
+    db.session.commit()
+    publish_progress(task_event(task, frame_index=0))
+
+    inference_settings = get_inference_settings(config)
+    selector = KeyframeSelector(
+        interval=config.get("KEYFRAME_INTERVAL", 1),
+        motion_threshold=config.get("KEYFRAME_MOTION_THRESHOLD", 0),
+    )
+    tracker = create_tracker(get_tracker_settings(config))
+    unique_ids = set()
+    id_color_map = {}
+    score_stats = {"sum": 0.0, "count": 0}
+
+    # A restarted stream job starts its playlist and track store over
+    hls_dir = get_hls_dir(task)
+    shutil.rmtree(hls_dir, ignore_errors=True)
+    os.makedirs(hls_dir)
+    tracks_path = get_tracks_path(task)
+    track_store = TrackStoreWriter(tracks_path, fps)
+    renditions = parse_hls_renditions(config.get("HLS_RENDITIONS"), height) or [(height - height % 2, LIVE_DEFAULT_KBPS)]
+    try:
+        out = LiveHlsWriter(hls_dir, fps, width, height, renditions,
+                            preset=config.get("VIDEO_ENCODE_PRESET", "veryfast"), window=config.get("STREAM_HLS_WINDOW", 6))
+    except OSError as e:
+        record_error("encoder_start", e)
+        out = None
+
+    if out is None or not out.isOpened():
+        source.stop()
+        fail_task(task)
+        return
+
+    job_metrics = JobMetrics()
+    heartbeat = Heartbeat(task, worker_id, config.get("WORKER_HEARTBEAT_INTERVAL", 15))
+    update_interval = config.get("STREAM_UPDATE_INTERVAL", 2)
+    stream_state = {
+        "frame_index": -1, "frames_since_keyframe": 0, "processed_frames": 0, "dropped_frames": 0,
+        "live_count": 0, "latency": None, "last_frame": None, "last_update": time.monotonic(),
+    }
+
+    # Write the live counts to the row and tell progress subscribers
+    def update_row():
+        stream_state["last_update"] = time.monotonic()
+        processing_seconds = (datetime.utcnow() - task.start_time).total_seconds()
+        metrics_registry.inc("agritrack_stream_dropped_frames_total", value=source.dropped_frames - stream_state["dropped_frames"])
+        stream_state["dropped_frames"] = source.dropped_frames
+
+        task.live_count = stream_state["live_count"]
+        task.detected_objects = len(unique_ids)
+        task.processed_frames = stream_state["processed_frames"]
+        task.dropped_frames = source.dropped_frames
+        task.stream_latency_ms = round(stream_state["latency"] * 1000, 1) if stream_state["latency"] is not None else None
+        task.average_confidence = score_stats["sum"] / score_stats["count"] if score_stats["count"] else 0.0
+        task.processing_time = processing_seconds
+        task.processing_fps = stream_state["processed_frames"] / processing_seconds if processing_seconds > 0 else None
+        task.duration_seconds = int((stream_state["frame_index"] + 1) / fps)
+        task.stage_metrics = job_metrics.summary()
+        db.session.commit()
+        publish_progress({
+            **task_event(task, fps=task.processing_fps, frame_index=stream_state["frame_index"]),
+            "live_count": task.live_count,
+            "dropped_frames": task.dropped_frames,
+        })
+
+    item = first_frame
+    try:
+        while True:
+            if item is not None:
+                # Frames dropped since the last one processed are tracked like skipped frames, but not drawn
+                while stream_state["frame_index"] + 1 < item.frame_index:
+                    stream_state["frame_index"] += 1
+                    stream_state["frames_since_keyframe"] += 1
+                    with job_metrics.measure("track"):
+                        add_tracks_to_store(track_store, stream_state["frame_index"], tracker.update(), 0)
+
+                stream_state["frame_index"] = item.frame_index
+                stream_state["frames_since_keyframe"] += 1
+                frame = item.frame
+                if selector.is_keyframe(frame):
+                    predictions = run_batch_inference([frame], inference_settings, job_metrics=job_metrics)[0]
+                    scores = predictions["scores"]
+                    score_stats["sum"] += float(scores.sum())
+                    score_stats["count"] += len(scores)
+                    with job_metrics.measure("track"):
+                        tracked = tracker.update(predictions["boxes"], scores, period=stream_state["frames_since_keyframe"])
+                        stream_state["frames_since_keyframe"] = 0
+                        add_tracks_to_store(track_store, stream_state["frame_index"], tracked, len(scores))
+                else:
+                    with job_metrics.measure("track"):
+                        tracked = tracker.update()
+                        add_tracks_to_store(track_store, stream_state["frame_index"], tracked, 0)
+
+                with job_metrics.measure("draw"):
+                    draw_tracked_objects(frame, tracked, id_color_map, unique_ids)
+                with job_metrics.measure("write"):
+                    out.write(frame)
+
+                stream_state["latency"] = time.monotonic() - item.captured_at
+                stream_state["live_count"] = len(tracked.ids)
+                stream_state["processed_frames"] += 1
+                stream_state["last_frame"] = frame
+                metrics_registry.observe("agritrack_stream_latency_seconds", stream_state["latency"])
+                metrics_registry.inc("agritrack_frames_total")
+            elif source.finished:
+                break
+
+            heartbeat.beat()
+            if time.monotonic() - stream_state["last_update"] >= update_interval:
+                update_row()
+                # Reading the flag after the commit picks up a stop requested through the API
+                if task.stop_requested:
+                    break
+            item = source.get(timeout=STREAM_POLL_SECONDS)
+
+        source.stop()
+        out.release()
+        track_store.close()
+    except ClaimLostError:
+        # Another worker reclaimed this stream after our heartbeat went stale, it restarts the feed
+        source.stop()
+        out.abort()
+        db.session.rollback()
+        metrics_registry.inc("agritrack_jobs_total", {"outcome": "claim_lost"})
+        return
+    except Exception as e:
+        record_error("stream", e)
+        source.stop()
+        out.abort()
+        db.session.rollback()
+        fail_task(task, job_metrics)
+        return
+
+    # Keep the last annotated frame as the thumbnail
+    if stream_state["last_frame"] is not None:
+        thumbnail_rel_path = get_thumbnail_rel_path(task)
+        thumbnail_abs_path = os.path.join(os.path.dirname(BASE_DIR), thumbnail_rel_path)
+        os.makedirs(os.path.dirname(thumbnail_abs_path), exist_ok=True)
+        cv2.imwrite(thumbnail_abs_path, stream_state["last_frame"])
+        task.thumbnail_path = thumbnail_rel_path
+
+    task.tracks_path = tracks_path
+    task.status = 'COMPLETED'
+    task.end_time = datetime.utcnow()
+    update_row()
+    metrics_registry.inc("agritrack_jobs_total", {"outcome": "completed"})
+    metrics_registry.observe("agritrack_job_processing_seconds", task.processing_time, buckets=JOB_BUCKETS)
+
+# Main processor worker loop, safe to run from several threads or processes against the same queue
+def process_video_worker_loop(worker_id=None):
+    worker_id = worker_id or default_worker_id()
+    stale_timeout = current_app.config.get("WORKER_STALE_TIMEOUT", 300)
+    last_reclaim = 0
+
     while True:
         try:
-            # If there is a queued task, fetch the first one
-            task = ProcessingQueue.query.filter_by(status='QUEUED').first()
+            # Load the model on this worker thread before taking jobs, retried until it succeeds
+            # With the inference server the batching thread calls the same model, so it is loaded here all the same
+            get_loaded_model()
+
+            # Periodically requeue jobs whose worker stopped sending heartbeats
+            if time.time() - last_reclaim >= stale_timeout / 2:
+                reclaim_stale_tasks(stale_timeout, current_app.config.get("WORKER_MAX_RECLAIMS", 3))
+                last_reclaim = time.time()
+
+            # Atomically claim the next queued task by priority, then upload order
+            task = claim_next_task(worker_id)
 
             if task:
-                # Set input/output paths
-                INPUT_VIDEO_PATH = os.path.join(BASE_DIR, f"videos/uploads/{task.file_name}")
-                OUTPUT_VIDEO_PATH = os.path.join(os.path.dirname(BASE_DIR), f"static/assets/videos/processed/{task.file_name}")
-
-                # Array to store prediction scores to calculate confidence
-                pred_scores_all = []
-
-                # Open video and get core metrics
-                cap = cv2.VideoCapture(INPUT_VIDEO_PATH)
-
-                if not cap.isOpened():
-                    task.status = 'FAILED'
-                    db.session.commit()
-                    continue
-
-                fps = cap.get(cv2.CAP_PROP_FPS)
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                duration_seconds = total_frames / fps if fps > 0 else 0
-
-                # Set task value to processing
-                task.status = 'PROCESSING'
-                task.start_time = datetime.utcnow()
-                db.session.commit()
-
-                # Ensure output directory exists, init encoders and writer
-                os.makedirs("../videos/processed", exist_ok=True)
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(OUTPUT_VIDEO_PATH, fourcc, fps, (width, height))
-
-                if not out.isOpened():
-                    raise RuntimeError(f"VideoWriter failed: {OUTPUT_VIDEO_PATH}")
-
-                # Initialise vars for core frame loop
-                unique_ids = set()
-                id_color_map = {}
-                frame_index = 0
-                progress_update_threshold = 5
-                last_logged_progress = 0
-                last_frame = None
-
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    last_frame = frame
-                    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    input_tensor = transform(image).to(device)
-
-                    # Get predictions
-                    try:
-                        with torch.no_grad():
-                            predictions = model([input_tensor])[0]
-                    except Exception as e:
-                        break
-
-                    # Feed filtered predictions to tracker
-                    detections = []
-                    for box, score, label in zip(predictions["boxes"], predictions["scores"], predictions["labels"]):
-                        if score > 0.95:
-                            score_val = score.cpu().item()
-                            pred_scores_all.append(score_val)
-                            box = box.cpu().numpy()
-                            x1, y1, x2, y2 = box
-                            cx = (x1 + x2) / 2
-                            cy = (y1 + y2) / 2
-                            detections.append(Detection(points=np.array([[cx, cy]]), scores=np.array([score_val]), data=box))
-
-                    tracked_objects = tracker.update(detections=detections)
-
-                    # Drawer bounding boxes on tracked objects
-                    for obj in tracked_objects:
-                        unique_ids.add(obj.id)
-                        if hasattr(obj.last_detection, "data"):
-                            x1, y1, x2, y2 = obj.last_detection.data
-                        else:
-                            cx, cy = obj.estimate[0]
-                            x1, y1, x2, y2 = cx - 20, cy - 20, cx + 20, cy + 20
-
-                        # Normalize box coordinates to integers
-                        x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
-
-                        # Assign color
-                        color = get_colour(obj.id, id_color_map)
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-
-                        # Prepare label
-                        label = f"Sheep #{obj.id}"
-                        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-
-                        # Draw filled label background
-                        label_bg_topleft = (x1, y1 - th - 8)
-                        label_bg_bottomright = (x1 + tw + 4, y1)
-                        cv2.rectangle(frame, label_bg_topleft, label_bg_bottomright, color, -1)
-
-                        # Draw label text
-                        cv2.putText(frame, label, (x1 + 2, y1 - 4),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-
-                    # Write out frame
-                    out.write(frame)
-                    frame_index += 1
-
-                    # Update progress percentage for UI
-                    progress_percentage = int((frame_index / total_frames) * 100)
-                    if progress_percentage >= last_logged_progress + progress_update_threshold:
-                        last_logged_progress = progress_percentage
-                        task.progress_percentage = progress_percentage
-                        task.processing_time = (datetime.utcnow() - task.start_time).total_seconds()
-                        db.session.commit()
-
-                cap.release()
-                out.release()
-
-                # If it is the last frame, save ax thumbnail for UI use
-                if last_frame is not None:
-                    thumbnail_rel_path = f"static/assets/thumbnails/processed/{task.file_name}.jpg"
-                    thumbnail_abs_path = os.path.join(os.path.dirname(BASE_DIR), thumbnail_rel_path)
-                    os.makedirs(os.path.dirname(thumbnail_abs_path), exist_ok=True)
-                    cv2.imwrite(thumbnail_abs_path, last_frame)
-                    task.thumbnail_path = thumbnail_rel_path
-                    db.session.commit()
-
-                # Define output path and encode video for correct format for UI rendering
-                final_output_video_path = os.path.join(os.path.dirname(BASE_DIR), f"static/assets/videos/processed/encoded_{task.id}_{task.file_name}")
-                run_ffmpeg_encoding(OUTPUT_VIDEO_PATH, final_output_video_path)
-
-                # Calculate metrics and save to DB
-                avg_conf = sum(pred_scores_all) / len(pred_scores_all) if pred_scores_all else 0.0
-                task.final_output_video_path = final_output_video_path
-                task.duration_seconds = duration_seconds
-                task.detected_objects = len(unique_ids)
-                task.average_confidence = avg_conf
-                task.resolution = f"{width}x{height}"
-                task.processed_frames = total_frames
-                task.status = 'COMPLETED'
-                task.end_time = datetime.utcnow()
-                db.session.commit()
+                process_task(task, worker_id)
             else:
                 time.sleep(2)
         except Exception as e:
+            record_error("worker_loop", e)
             db.session.rollback()
             time.sleep(2)
@@ -0,0 +1,59 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "model_training", "dataset_utilities"))
+from dataset_augmentation import TRANSFORMS, update_annotation  # noqa: E402
+
+WIDTH, HEIGHT = 100, 60
+BOX = (10, 5, 30, 25)  # x_min, y_min, x_max, y_max with the max edges exclusive
+
+
+# Helper to find the box of the white pixels in an image, in the same x_min, y_min, x_max, y_max form
+def white_box(image):
+    ys, xs = np.nonzero(np.asarray(image))
+    return (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+
+
+@pytest.mark.parametrize("transform", sorted(TRANSFORMS))
+def test_box_mapping_matches_the_image_transform(transform):
+    image = Image.new("L", (WIDTH, HEIGHT))
+    image.paste(255, BOX)
+    transpose, map_box = TRANSFORMS[transform]
+    transformed = image if transpose is None else image.transpose(transpose)
+    assert tuple(map_box(BOX, WIDTH, HEIGHT)) == white_box(transformed)
+
+
+def annotation():
+    root = ET.fromstring(
+        "<annotation><filename>sheep.jpg</filename><size><width>100</width><height>60</height></size>"
+        "<object><name>sheep</name><bndbox><xmin>10</xmin><ymin>5</ymin><xmax>30</xmax><ymax>25</ymax></bndbox></object>"
+        "</annotation>"
+    )
+    tree = ET.ElementTree(root)
+    obj = root.find("object")
+    return tree, [(obj, BOX)]
+
+
+@pytest.mark.parametrize("transform, size", [("rot90", ("60", "100")), ("rot270", ("60", "100")), ("hflip", ("100", "60"))])
+def test_update_annotation_rewrites_boxes_size_and_filename(transform, size):
+    tree, boxes = annotation()
+    xml_bytes, new_boxes = update_annotation(tree, boxes, transform, WIDTH, HEIGHT, f"sheep_{transform}.jpg")
+    root = ET.fromstring(xml_bytes)
+    expected = TRANSFORMS[transform][1](BOX, WIDTH, HEIGHT)
+    assert new_boxes == [expected]
+    assert tuple(int(root.findtext(f"object/bndbox/{edge}")) for edge in ("xmin", "ymin", "xmax", "ymax")) == expected
+    assert (root.findtext("size/width"), root.findtext("size/height")) == size
+    assert root.findtext("filename") == f"sheep_{transform}.jpg"
+
+
+def test_same_parsed_tree_serves_every_transform():
+    tree, boxes = annotation()
+    for transform in ("rot90", "hflip"):
+        update_annotation(tree, boxes, transform, WIDTH, HEIGHT, "sheep.jpg")
+    _, [box] = update_annotation(tree, boxes, "rot0", WIDTH, HEIGHT, "sheep.jpg")
+    assert box == BOX
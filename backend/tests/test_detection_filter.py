@@ -0,0 +1,55 @@
+import numpy as np
+import torch
+from app.workers.detection_filter import filter_predictions, parse_class_thresholds
+
+
+# Helper to build one frame's model output from (x1, y1, x2, y2, score, label) rows
+def prediction(*rows):
+    rows = torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+    return {"boxes": rows[:, :4], "scores": rows[:, 4], "labels": rows[:, 5].to(torch.int64)}
+
+
+def test_parse_class_thresholds():
+    assert parse_class_thresholds("1:0.9, 2:0.5") == {1: 0.9, 2: 0.5}
+    assert parse_class_thresholds("") == {}
+    assert parse_class_thresholds(None) == {}
+
+
+def test_scores_at_or_below_the_threshold_are_dropped():
+    [frame] = filter_predictions([prediction((0, 0, 10, 10, 0.96, 1), (20, 20, 30, 30, 0.95, 1), (40, 40, 50, 50, 0.5, 1))], 0.95)
+    assert isinstance(frame["boxes"], np.ndarray)
+    np.testing.assert_allclose(frame["boxes"], [[0, 0, 10, 10]])
+    np.testing.assert_allclose(frame["scores"], [0.96])
+    assert frame["labels"].tolist() == [1]
+
+
+def test_class_thresholds_override_the_default():
+    [frame] = filter_predictions([prediction((0, 0, 10, 10, 0.6, 1), (20, 20, 30, 30, 0.6, 2))], 0.95, {2: 0.5})
+    assert frame["labels"].tolist() == [2]
+
+
+def test_batch_keeps_frame_order_and_empty_frames():
+    frames = filter_predictions([
+        prediction((0, 0, 10, 10, 0.99, 1)),
+        prediction(),
+        prediction((0, 0, 10, 10, 0.1, 1)),
+        prediction((5, 5, 15, 15, 0.98, 1), (40, 40, 50, 50, 0.97, 1)),
+    ], 0.95)
+    assert [len(frame["scores"]) for frame in frames] == [1, 0, 0, 2]
+    assert frames[1]["boxes"].shape == (0, 4)
+    np.testing.assert_allclose(frames[3]["scores"], [0.98, 0.97])
+
+
+def test_nms_merges_overlapping_boxes_of_any_class_within_a_frame_only():
+    duplicate = ((0, 0, 10, 10, 0.99, 1), (1, 0, 11, 10, 0.98, 2))
+    frames = filter_predictions([prediction(*duplicate), prediction(*duplicate)], 0.5, nms_iou=0.5)
+    for frame in frames:
+        np.testing.assert_allclose(frame["scores"], [0.99])
+        assert frame["labels"].tolist() == [1]
+
+    [frame] = filter_predictions([prediction(*duplicate)], 0.5)
+    assert len(frame["scores"]) == 2  # nms_iou 0 keeps both
+
+
+def test_empty_batch():
+    assert filter_predictions([]) == []
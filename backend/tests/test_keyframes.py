@@ -0,0 +1,30 @@
+import numpy as np
+from app.workers.keyframes import KeyframeSelector
+
+DARK = np.zeros((72, 128, 3), dtype=np.uint8)
+BRIGHT = np.full((72, 128, 3), 255, dtype=np.uint8)
+
+
+def keyframe_flags(selector, frames):
+    return [selector.is_keyframe(frame) for frame in frames]
+
+
+def test_interval_one_detects_every_frame():
+    assert keyframe_flags(KeyframeSelector(), [DARK] * 5) == [True] * 5
+
+
+def test_first_frame_and_then_every_interval_frames_are_keyframes():
+    assert keyframe_flags(KeyframeSelector(interval=3), [DARK] * 7) == [True, False, False, True, False, False, True]
+
+
+def test_interval_below_one_is_treated_as_one():
+    assert KeyframeSelector(interval=0).interval == 1
+
+
+def test_motion_over_the_threshold_forces_an_early_keyframe():
+    selector = KeyframeSelector(interval=5, motion_threshold=10)
+    assert keyframe_flags(selector, [DARK, DARK, BRIGHT, BRIGHT, BRIGHT]) == [True, False, True, False, False]
+
+
+def test_motion_is_ignored_without_a_threshold():
+    assert keyframe_flags(KeyframeSelector(interval=5), [DARK, BRIGHT, DARK, BRIGHT]) == [True, False, False, False]
@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+from app.workers.tiling import merge_inference_outputs, prepare_inference_images, tile_origins
+
+# 960x512 frames split into two 512 px tiles at x 0 and 448, overlapping between x 448 and 512
+FRAME = np.zeros((512, 960, 3), dtype=np.uint8)
+TILE_SIZE = 512
+TILE_OVERLAP = 64
+
+
+# Helper to build model outputs for the tiles from frame-coordinate boxes, clipped to each tile as a detector sees them
+def tile_outputs(layout, objects):
+    outputs = []
+    for x0, y0, width, height in layout[0]["tiles"]:
+        boxes, scores = [], []
+        for (x1, y1, x2, y2), score in objects:
+            clipped = (max(x1, x0) - x0, max(y1, y0) - y0, min(x2, x0 + width) - x0, min(y2, y0 + height) - y0)
+            if clipped[2] > clipped[0] and clipped[3] > clipped[1]:
+                boxes.append(clipped)
+                scores.append(score)
+        outputs.append({
+            "boxes": torch.tensor(boxes, dtype=torch.float32).reshape(-1, 4),
+            "scores": torch.tensor(scores, dtype=torch.float32),
+            "labels": torch.ones(len(boxes), dtype=torch.int64),
+        })
+    return outputs
+
+
+def merge(objects):
+    _, layout = prepare_inference_images([FRAME], tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP)
+    return merge_inference_outputs(tile_outputs(layout, objects), layout)[0]
+
+
+def test_tile_origins_cover_length_with_overlap():
+    assert tile_origins(960, 512, 64) == [0, 448]
+    assert tile_origins(1000, 512, 64) == [0, 448, 488]
+    assert tile_origins(400, 512, 64) == [0]
+
+
+def test_object_larger_than_overlap_across_seam_is_kept_whole():
+    # 400 px wide, both tiles only see part of it and cut it off at their interior edge
+    merged = merge([((300, 100, 700, 300), 0.9)])
+    assert merged["boxes"].tolist() == [[300, 100, 700, 300]]
+    assert merged["scores"].tolist() == [torch.tensor(0.9).item()]
+
+
+def test_object_inside_overlap_is_reported_once():
+    merged = merge([((460, 200, 500, 240), 0.99)])
+    assert merged["boxes"].tolist() == [[460, 200, 500, 240]]
+
+
+def test_cut_off_box_is_dropped_when_the_other_tile_sees_the_object_whole():
+    # The first tile cuts it off at x 512, the second tile sees all of it
+    merged = merge([((490, 50, 540, 90), 0.99)])
+    assert merged["boxes"].tolist() == [[490, 50, 540, 90]]
+
+
+def test_separate_objects_on_each_side_of_the_seam_are_kept():
+    merged = merge([((300, 100, 700, 300), 0.9), ((100, 400, 140, 440), 0.98), ((800, 400, 840, 440), 0.97)])
+    assert sorted(merged["boxes"].tolist()) == [[100, 400, 140, 440], [300, 100, 700, 300], [800, 400, 840, 440]]
@@ -0,0 +1,79 @@
+import pickle
+import numpy as np
+import pytest
+from app.workers.trackers import ByteTracker, NorfairTracker, create_tracker, get_tracker_settings, iou_matrix
+
+
+# Helper to feed the tracker one keyframe with the given boxes, all at the same score
+def step(tracker, boxes, score=0.99, period=1):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return tracker.update(boxes, np.full(len(boxes), score), period=period)
+
+
+def moving_box(frame, dx=5):
+    return [10 + frame * dx, 10, 50 + frame * dx, 50]
+
+
+def test_iou_matrix():
+    iou = iou_matrix(np.array([[0, 0, 10, 10.]]), np.array([[0, 0, 10, 10.], [5, 0, 15, 10.], [20, 20, 30, 30.]]))
+    np.testing.assert_allclose(iou, [[1, 1 / 3, 0]])
+
+
+def test_track_is_shown_after_init_hits_and_keeps_its_id():
+    tracker = ByteTracker(init_hits=3)
+    shown = [step(tracker, [moving_box(frame)]) for frame in range(6)]
+    assert [len(tracked.ids) for tracked in shown] == [0, 0, 1, 1, 1, 1]
+    assert {int(tracked.ids[0]) for tracked in shown[2:]} == {1}
+    assert shown[-1].matched.tolist() == [True]
+    np.testing.assert_allclose(shown[-1].boxes[0], moving_box(5))
+
+
+def test_separate_objects_get_separate_ids():
+    tracker = ByteTracker(init_hits=1)
+    tracked = step(tracker, [[0, 0, 20, 20], [200, 200, 220, 220]])
+    assert sorted(tracked.ids.tolist()) == [1, 2]
+
+
+def test_skipped_frames_follow_the_motion_estimate():
+    tracker = ByteTracker(init_hits=1)
+    for frame in range(4):
+        step(tracker, [moving_box(frame)])
+    tracked = tracker.update()
+    assert tracked.matched.tolist() == [False]
+    assert np.isnan(tracked.scores[0])
+    assert tracked.boxes[0, 0] > moving_box(3)[0]
+
+
+def test_low_score_detections_extend_tracks_but_never_start_them():
+    tracker = ByteTracker(init_hits=1, high_score=0.9)
+    assert len(step(tracker, [[0, 0, 40, 40]], score=0.5).ids) == 0
+
+    step(tracker, [[100, 100, 140, 140]])
+    tracked = step(tracker, [[101, 100, 141, 140]], score=0.5)
+    assert tracked.ids.tolist() == [1]
+    assert tracked.matched.tolist() == [True]
+    np.testing.assert_allclose(tracked.scores, [0.5])
+
+
+def test_unmatched_tracks_are_hidden_then_dropped_after_max_age():
+    tracker = ByteTracker(init_hits=1, max_age=5)
+    step(tracker, [[0, 0, 40, 40]])
+    ages = [len(tracker.update().ids) for _ in range(6)]
+    assert ages[:2] == [1, 1]  # Coasts for COAST_KEYFRAMES frames
+    assert ages[2:] == [0, 0, 0, 0]
+    assert len(tracker.ids) == 0
+
+
+def test_tracker_survives_a_checkpoint_round_trip():
+    tracker = ByteTracker(init_hits=1)
+    for frame in range(3):
+        step(tracker, [moving_box(frame)])
+    restored = pickle.loads(pickle.dumps(tracker))
+    assert step(restored, [moving_box(3)]).ids.tolist() == step(tracker, [moving_box(3)]).ids.tolist()
+
+
+def test_create_tracker_from_settings():
+    assert isinstance(create_tracker(), NorfairTracker)
+    assert isinstance(create_tracker({**get_tracker_settings({}), "tracker": "bytetrack"}), ByteTracker)
+    with pytest.raises(ValueError):
+        create_tracker({**get_tracker_settings({}), "tracker": "sort"})
@@ -0,0 +1,32 @@
+from app.routes.video_ranges import parse_byte_ranges
+
+FILE_SIZE = 1000
+
+
+def test_single_closed_range_is_end_exclusive():
+    assert parse_byte_ranges("bytes=0-99", FILE_SIZE) == [(0, 100)]
+
+
+def test_open_ended_and_suffix_ranges():
+    assert parse_byte_ranges("bytes=900-", FILE_SIZE) == [(900, 1000)]
+    assert parse_byte_ranges("bytes=-100", FILE_SIZE) == [(900, 1000)]
+    assert parse_byte_ranges("bytes=-5000", FILE_SIZE) == [(0, 1000)]
+
+
+def test_end_past_the_file_is_clamped():
+    assert parse_byte_ranges("bytes=500-5000", FILE_SIZE) == [(500, 1000)]
+
+
+def test_ranges_are_sorted_and_overlapping_or_adjacent_ones_merged():
+    assert parse_byte_ranges("bytes=500-599, 0-99, 50-149, 150-199", FILE_SIZE) == [(0, 200), (500, 600)]
+
+
+def test_unsatisfiable_ranges_give_an_empty_list():
+    assert parse_byte_ranges("bytes=1000-1100", FILE_SIZE) == []
+    assert parse_byte_ranges("bytes=-0", FILE_SIZE) == []
+    assert parse_byte_ranges("bytes=-10", 0) == []
+
+
+def test_malformed_headers_are_ignored():
+    for header in ("items=0-99", "bytes=", "bytes=abc", "bytes=5", "bytes=-", "bytes=x-10", "bytes=200-100"):
+        assert parse_byte_ranges(header, FILE_SIZE) is None, header
@@ -0,0 +1,156 @@
+# Check that an inference backend detects the same sheep as the eager fp32 model on sample frames.
+#
+# Usage (from the backend directory):
+#   python -m tools.backend_parity --video app/videos/uploads/clip.mp4 --backend quantized
+#
+# Detections above the worker's score threshold are matched greedily by IoU. Exits non-zero when
+# recall or precision against the eager model drops below --min-agreement.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import cv2
+import torch
+from torchvision.ops import box_iou
+from app.workers import model_loader
+from app.workers.inference_backends import INFERENCE_BACKENDS, apply_backend
+from app.workers.video_worker import transform
+
+
+# Helper to sample evenly spaced frames from a video, decoding sequentially
+def sample_frames(video_path, num_frames):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {video_path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or num_frames
+    step = max(1, total_frames // num_frames)
+    frames = []
+    index = 0
+    while len(frames) < num_frames and cap.grab():
+        if index % step == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+# Helper to run a model over frames one at a time, returns filtered predictions and per-frame latency
+def run_model(model, frames, score_threshold):
+    predictions = []
+    latencies = []
+
+    # Warm up once so lazy compilation/export is not counted as per-frame latency
+    with torch.no_grad():
+        model([transform(cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB)).to(model_loader.device)])
+
+    for frame in frames:
+        input_tensor = transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).to(model_loader.device)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model([input_tensor])[0]
+        latencies.append(time.perf_counter() - start)
+        keep = output["scores"] > score_threshold
+        predictions.append({key: value[keep].cpu() for key, value in output.items()})
+    return predictions, latencies
+
+
+# Greedily match candidate boxes to reference boxes, returns (matched count, matched IoUs, matched score deltas)
+def match_detections(reference, candidate, iou_threshold):
+    if len(reference["boxes"]) == 0 or len(candidate["boxes"]) == 0:
+        return 0, [], []
+
+    ious = box_iou(reference["boxes"], candidate["boxes"])
+    matched_ious = []
+    score_deltas = []
+    while True:
+        best = ious.max()
+        if best < iou_threshold:
+            break
+        ref_index, cand_index = divmod(int(ious.argmax()), ious.shape[1])
+        matched_ious.append(float(best))
+        score_deltas.append(abs(float(reference["scores"][ref_index] - candidate["scores"][cand_index])))
+        ious[ref_index, :] = -1
+        ious[:, cand_index] = -1
+    return len(matched_ious), matched_ious, score_deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an inference backend's detections to the eager model")
+    parser.add_argument("--video", required=True, help="Sample video to take frames from")
+    parser.add_argument("--backend", required=True, choices=[b for b in INFERENCE_BACKENDS if b != "eager"])
+    parser.add_argument("--frames", type=int, default=20, help="Number of frames to compare")
+    parser.add_argument("--score-threshold", type=float, default=0.95, help="Same threshold the worker tracks with")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two detections to match")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Minimum recall and precision to pass")
+    parser.add_argument("--random-weights", action="store_true", help="Use a randomly initialised model, no checkpoint")
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    frames = sample_frames(args.video, args.frames)
+
+    eager = model_loader.get_model(model_loader.NUM_CLASSES, pretrained_backbone=False)
+    if not args.random_weights:
+        eager.load_state_dict(model_loader.load_state_dict())
+    eager.to(model_loader.device).eval()
+
+    # Convert a copy so the reference model stays untouched (quantize_dynamic and compile can share modules)
+    candidate_source = model_loader.get_model(model_loader.NUM_CLASSES, pretrained_backbone=False)
+    candidate_source.load_state_dict(eager.state_dict())
+    candidate_source.to(model_loader.device).eval()
+
+    # Converted artifacts go to a scratch directory, so the check always converts afresh and never leaves a file
+    # next to MODEL_PATH that the worker would load in place of the checkpoint
+    with tempfile.TemporaryDirectory(prefix="backend_parity_") as work_dir:
+        artifact_path = model_loader.backend_artifact_path(args.backend)
+        if artifact_path:
+            artifact_path = os.path.join(work_dir, os.path.basename(artifact_path))
+        candidate = apply_backend(candidate_source, args.backend, model_loader.device, artifact_path)
+
+        reference_predictions, reference_latencies = run_model(eager, frames, args.score_threshold)
+        candidate_predictions, candidate_latencies = run_model(candidate, frames, args.score_threshold)
+
+    reference_total = candidate_total = matched_total = 0
+    all_ious = []
+    all_score_deltas = []
+    for reference, result in zip(reference_predictions, candidate_predictions):
+        matched, ious, score_deltas = match_detections(reference, result, args.iou)
+        reference_total += len(reference["boxes"])
+        candidate_total += len(result["boxes"])
+        matched_total += matched
+        all_ious.extend(ious)
+        all_score_deltas.extend(score_deltas)
+
+    recall = matched_total / reference_total if reference_total else 1.0
+    precision = matched_total / candidate_total if candidate_total else 1.0
+    report = {
+        "backend": args.backend,
+        "frames": len(frames),
+        "eager_detections": reference_total,
+        "backend_detections": candidate_total,
+        "matched": matched_total,
+        "recall": recall,
+        "precision": precision,
+        "mean_iou": sum(all_ious) / len(all_ious) if all_ious else None,
+        "max_score_delta": max(all_score_deltas) if all_score_deltas else None,
+        "eager_ms_per_frame": 1000 * sum(reference_latencies) / len(frames),
+        "backend_ms_per_frame": 1000 * sum(candidate_latencies) / len(frames),
+        "passed": recall >= args.min_agreement and precision >= args.min_agreement,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Compare concurrent jobs calling the model directly with the same jobs going through the shared inference server.
+#
+# Usage (from the backend directory):
+#   python -m tools.inference_server_benchmark --jobs 1,2,4,8 --requests 20 --output server_results.json
+#   python -m tools.inference_server_benchmark --jobs 4 --max-batch 16 --max-latency-ms 10 --resolution 640
+#
+# Each simulated job is a thread sending --batch-size frames per call, like a worker with INFERENCE_BATCH_SIZE,
+# through run_batch_inference with a randomly initialised model. "direct" is today's thread mode, every job calling
+# the shared model on its own; "server" puts the DynamicBatcher in front of it. Reports images per second and
+# per-call latency percentiles for each job count.
+
+import argparse
+import json
+import threading
+import time
+import numpy as np
+import torch
+from app.workers import inference_server, model_loader
+from app.workers.inference_server import DynamicBatcher
+from app.workers.video_worker import forward_images, run_batch_inference
+from tools.pipeline_benchmark import build_benchmark_model, summarize
+
+
+# Run num_jobs threads of requests_per_job calls each, returns (images per second, per-call latencies)
+def run_jobs(frames, num_jobs, requests_per_job, inference_settings, model=None):
+    latencies = []
+    lock = threading.Lock()
+
+    def job():
+        for _ in range(requests_per_job):
+            start = time.perf_counter()
+            run_batch_inference(frames, inference_settings, model)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=job) for _ in range(num_jobs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+    return num_jobs * requests_per_job * len(frames) / wall_seconds, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark direct model calls against the shared inference server")
+    parser.add_argument("--jobs", default="1,2,4", help="Comma separated numbers of concurrent jobs")
+    parser.add_argument("--requests", type=int, default=10, help="Calls per job")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames per call (INFERENCE_BATCH_SIZE)")
+    parser.add_argument("--width", type=int, default=640, help="Frame width")
+    parser.add_argument("--height", type=int, default=360, help="Frame height")
+    parser.add_argument("--resolution", type=int, default=0, help="Inference resolution (INFERENCE_RESOLUTION)")
+    parser.add_argument("--max-batch", type=int, default=8, help="Images per server batch (INFERENCE_SERVER_MAX_BATCH)")
+    parser.add_argument("--max-latency-ms", type=float, default=20, help="Batch wait (INFERENCE_SERVER_MAX_LATENCY_MS)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads, defaults to torch's choice")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = build_benchmark_model("eager", False, None)
+    frames = [
+        np.random.default_rng(index).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+        for index in range(max(1, args.batch_size))
+    ]
+    inference_settings = {"resolution": args.resolution}
+    run_batch_inference(frames, inference_settings, model)  # Warm-up
+
+    batcher = DynamicBatcher(lambda images: forward_images(images, model), args.max_batch, args.max_latency_ms / 1000).start()
+    results = {"settings": vars(args), "device": str(model_loader.device), "runs": []}
+    for num_jobs in (int(value) for value in args.jobs.split(",")):
+        run = {"jobs": num_jobs}
+        inference_server.set_inference_client(None)
+        direct_rate, direct_latencies = run_jobs(frames, num_jobs, args.requests, inference_settings, model)
+        inference_server.set_inference_client(batcher)
+        server_rate, server_latencies = run_jobs(frames, num_jobs, args.requests, inference_settings)
+        inference_server.set_inference_client(None)
+        run["direct"] = {"images_per_second": direct_rate, **summarize(direct_latencies)}
+        run["server"] = {"images_per_second": server_rate, **summarize(server_latencies)}
+        run["speedup"] = server_rate / direct_rate
+        results["runs"].append(run)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# Benchmark the worker's decode -> infer -> track -> draw -> encode path without Flask, Postgres or a checkpoint.
+#
+# Usage (from the backend directory):
+#   python -m tools.pipeline_benchmark --frames 300 --batch-size 4 --threads 4 --output results.json
+#   python -m tools.pipeline_benchmark --video app/videos/uploads/clip.mp4 --resolution 960 --history bench.jsonl
+#
+# Runs the same FramePipeline and worker helpers as process_task on a synthetic clip (or a sample video) with
+# a randomly initialised model, so it needs no network. Reports per-stage latency percentiles, end-to-end fps
+# and peak RSS as JSON. --history appends one line per run so changes and settings can be compared over time.
+# Detections are kept above --score-threshold, 0.05 by default rather than the worker's 0.95, so random weights
+# still hand the tracking and drawing stages boxes to work on. The encode stage needs ffmpeg on PATH, like the worker.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+import torch
+from app.workers import model_loader
+from app.workers.frame_pipeline import FramePipeline
+from app.workers.inference_backends import INFERENCE_BACKENDS, apply_backend
+from app.workers.keyframes import KeyframeSelector
+from app.workers.track_store import TrackStoreWriter
+from app.workers.trackers import TRACKERS, create_tracker, get_tracker_settings
+from app.workers.video_encoder import FfmpegVideoWriter, parse_hls_renditions
+from app.workers.video_worker import add_tracks_to_store, draw_tracked_objects, run_keyframe_inference
+
+STAGES = ("decode", "infer", "track", "draw", "encode")
+
+
+# Helper to write a synthetic clip of bright blobs drifting over a textured green field
+def make_synthetic_clip(path, num_frames, width, height, fps, num_objects, seed=0):
+    rng = np.random.default_rng(seed)
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = (40, 120, 50)
+    background = cv2.add(background, rng.integers(0, 40, (height, width, 3), dtype=np.uint8))
+
+    positions = rng.uniform((0, 0), (width, height), (num_objects, 2))
+    velocities = rng.uniform(-3, 3, (num_objects, 2))
+    axes = rng.integers(max(4, height // 60), max(8, height // 25), (num_objects, 2))
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise SystemExit(f"Cannot write synthetic clip: {path}")
+    for _ in range(num_frames):
+        frame = background.copy()
+        for (x, y), (ax, ay) in zip(positions, axes):
+            cv2.ellipse(frame, (int(x), int(y)), (int(ax), int(ay)), 0, 0, 360, (230, 230, 230), -1)
+        writer.write(frame)
+        positions += velocities
+        bounced = (positions < 0) | (positions > (width, height))
+        velocities[bounced] *= -1
+    writer.release()
+
+
+# Wrap a callable so each call's duration is appended to timings[stage]
+def timed(timings, stage, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "total_s": float(values.sum() / 1000),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Build the model the worker would run, with random weights unless a checkpoint is requested
+# Converted artifacts go to work_dir so a benchmark never reuses or overwrites the worker's
+def build_benchmark_model(backend, use_checkpoint, work_dir):
+    model = model_loader.get_model(model_loader.NUM_CLASSES, pretrained_backbone=False)
+    if use_checkpoint:
+        model.load_state_dict(model_loader.load_state_dict())
+    model.to(model_loader.device).eval()
+    artifact_path = model_loader.backend_artifact_path(backend)
+    if artifact_path:
+        artifact_path = os.path.join(work_dir, os.path.basename(artifact_path))
+    return apply_backend(model, backend, model_loader.device, artifact_path)
+
+
+# Run one clip through the pipeline, returns (stage timings, frames written, wall seconds)
+def run_pipeline(video_path, output_dir, model, args):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    inference_settings = {
+        "resolution": args.resolution,
+        "tile_size": args.tile_size,
+        "tile_overlap": args.tile_overlap,
+        "tile_nms_iou": 0.5,
+        "score_threshold": args.score_threshold,
+    }
+    renditions = parse_hls_renditions(args.renditions, height)
+    hls_dir = os.path.join(output_dir, "hls") if renditions else None
+    out = FfmpegVideoWriter(
+        os.path.join(output_dir, "benchmark.mp4"), fps, width, height,
+        preset=args.preset, crf=args.crf, hls_dir=hls_dir, renditions=renditions,
+    )
+    track_store = TrackStoreWriter(os.path.join(output_dir, "tracks"), fps)
+    selector = KeyframeSelector(interval=args.keyframe_interval)
+    tracker = create_tracker({**get_tracker_settings({}), "tracker": args.tracker})
+    timings = {stage: [] for stage in STAGES}
+    timings["infer_per_frame"] = []
+    id_color_map = {}
+    unique_ids = set()
+    state = {"frame_index": -1, "frames_since_keyframe": 0, "frames_written": 0}
+
+    def infer_batch(frames):
+        start = time.perf_counter()
+        predictions = run_keyframe_inference(frames, selector, inference_settings, model)
+        elapsed = time.perf_counter() - start
+        timings["infer"].append(elapsed)
+        # Per frame the detector actually ran on, frames skipped between keyframes cost no inference
+        inference_frames = sum(prediction is not None for prediction in predictions)
+        if inference_frames:
+            timings["infer_per_frame"].extend([elapsed / inference_frames] * inference_frames)
+        return predictions
+
+    # Same steps as the worker's annotate stage, with tracking and drawing timed separately
+    def annotate_frame(frame, predictions):
+        state["frame_index"] += 1
+        state["frames_since_keyframe"] += 1
+
+        start = time.perf_counter()
+        if predictions is None:
+            tracked, detection_count = tracker.update(), 0
+        else:
+            tracked = tracker.update(predictions["boxes"], predictions["scores"], period=state["frames_since_keyframe"])
+            state["frames_since_keyframe"] = 0
+            detection_count = len(predictions["scores"])
+        add_tracks_to_store(track_store, state["frame_index"], tracked, detection_count)
+        timings["track"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        draw_tracked_objects(frame, tracked, id_color_map, unique_ids)
+        timings["draw"].append(time.perf_counter() - start)
+        return frame
+
+    def on_frame_written(frame):
+        state["frames_written"] += 1
+
+    pipeline = FramePipeline(
+        read_frame=timed(timings, "decode", cap.read),
+        infer_batch=infer_batch,
+        annotate_frame=annotate_frame,
+        write_frame=timed(timings, "encode", out.write),
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+    )
+
+    start = time.perf_counter()
+    try:
+        pipeline.run(on_frame_written=on_frame_written)
+        finalize_start = time.perf_counter()
+        out.release()
+        timings["encode_finalize"] = [time.perf_counter() - finalize_start]
+        track_store.close()
+    except Exception:
+        out.abort()
+        raise
+    finally:
+        cap.release()
+    return timings, state["frames_written"], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video worker pipeline on a synthetic or sample clip")
+    parser.add_argument("--video", help="Sample video to process, a synthetic clip is generated when omitted")
+    parser.add_argument("--frames", type=int, default=150, help="Frames in the synthetic clip")
+    parser.add_argument("--width", type=int, default=1280, help="Synthetic clip width")
+    parser.add_argument("--height", type=int, default=720, help="Synthetic clip height")
+    parser.add_argument("--fps", type=float, default=25, help="Synthetic clip frame rate")
+    parser.add_argument("--objects", type=int, default=20, help="Moving objects in the synthetic clip")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames per forward pass (INFERENCE_BATCH_SIZE)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Pipeline queue size (PIPELINE_QUEUE_SIZE)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads, defaults to torch's choice")
+    parser.add_argument("--resolution", type=int, default=0, help="Inference resolution (INFERENCE_RESOLUTION)")
+    parser.add_argument("--tile-size", type=int, default=0, help="Tile size (TILE_SIZE)")
+    parser.add_argument("--tile-overlap", type=int, default=64, help="Tile overlap (TILE_OVERLAP)")
+    parser.add_argument("--score-threshold", type=float, default=0.05,
+                        help="Detection score threshold (DETECTION_SCORE_THRESHOLD), kept low so random weights still "
+                             "feed boxes to the tracker and drawing stages")
+    parser.add_argument("--keyframe-interval", type=int, default=1, help="Detect every N frames (KEYFRAME_INTERVAL)")
+    parser.add_argument("--backend", default="eager", choices=INFERENCE_BACKENDS, help="Inference backend")
+    parser.add_argument("--tracker", default="norfair", choices=tuple(TRACKERS), help="Tracker (TRACKER)")
+    parser.add_argument("--preset", default="veryfast", help="libx264 preset (VIDEO_ENCODE_PRESET)")
+    parser.add_argument("--crf", type=int, default=23, help="libx264 CRF (VIDEO_ENCODE_CRF)")
+    parser.add_argument("--renditions", default="", help="HLS renditions as height:kbps pairs, empty skips HLS")
+    parser.add_argument("--checkpoint", action="store_true", help="Load the trained weights instead of random ones")
+    parser.add_argument("--label", help="Free-form label stored with the results")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    parser.add_argument("--history", help="Append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_benchmark_") as work_dir:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(work_dir, "synthetic.mp4")
+            make_synthetic_clip(video_path, args.frames, args.width, args.height, args.fps, args.objects)
+
+        load_start = time.perf_counter()
+        model = build_benchmark_model(args.backend, args.checkpoint, work_dir)
+        load_seconds = time.perf_counter() - load_start
+
+        # Warm up once so lazy initialisation is not counted as pipeline latency
+        cap = cv2.VideoCapture(video_path)
+        ok, frame = cap.read()
+        clip = {
+            "source": args.video or "synthetic",
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+        }
+        cap.release()
+        if not ok:
+            raise SystemExit(f"Cannot read frames from: {video_path}")
+        run_keyframe_inference([frame], KeyframeSelector(), {"resolution": args.resolution, "tile_size": args.tile_size,
+                                                             "tile_overlap": args.tile_overlap,
+                                                             "score_threshold": args.score_threshold}, model)
+
+        output_dir = os.path.join(work_dir, "output")
+        os.makedirs(output_dir)
+        timings, frames_written, wall_seconds = run_pipeline(video_path, output_dir, model, args)
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "label": args.label,
+        "git_commit": git_commit(),
+        "host": {
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "device": str(model_loader.device),
+        },
+        "settings": {
+            "batch_size": args.batch_size,
+            "queue_size": args.queue_size,
+            "resolution": args.resolution,
+            "tile_size": args.tile_size,
+            "tile_overlap": args.tile_overlap,
+            "keyframe_interval": args.keyframe_interval,
+            "score_threshold": args.score_threshold,
+            "backend": args.backend,
+            "tracker": args.tracker,
+            "preset": args.preset,
+            "crf": args.crf,
+            "renditions": args.renditions,
+            "weights": "checkpoint" if args.checkpoint else "random",
+        },
+        "clip": clip,
+        "model_load_s": load_seconds,
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "end_to_end": {
+            "frames": frames_written,
+            "seconds": wall_seconds,
+            "fps": frames_written / wall_seconds if wall_seconds > 0 else None,
+        },
+        # ru_maxrss is in kilobytes on Linux; the child figure is the largest ffmpeg process
+        "peak_rss_mb": self_usage.ru_maxrss / 1024,
+        "peak_child_rss_mb": child_usage.ru_maxrss / 1024,
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
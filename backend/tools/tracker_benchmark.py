@@ -0,0 +1,139 @@
+# Compare the job trackers on dense synthetic flocks, for speed and tracking quality.
+#
+# Usage (from the backend directory):
+#   python -m tools.tracker_benchmark --objects 50,200,500 --frames 300 --output tracker_results.json
+#   python -m tools.tracker_benchmark --objects 300 --keyframe-interval 3 --miss-rate 0.1 --trackers bytetrack
+#
+# Each flock is a set of sheep-sized boxes drifting together with individual jitter, so neighbours overlap
+# and cross. Detections are the true boxes with position noise, random misses and false positives. Every
+# tracker gets the same detections through the ObjectTracker interface. The report gives per-update latency
+# percentiles, and MOTA, ID switches and coverage from matching tracks to the ground truth by IoU.
+
+import argparse
+import json
+import time
+import numpy as np
+from app.workers.trackers import TRACKERS, assign, create_tracker, get_tracker_settings, iou_matrix
+
+# A track only counts as following a true box when they overlap at least this much
+EVALUATION_IOU = 0.5
+
+
+# Helper to generate ground truth and detections for a flock, returns one dict per frame
+def make_flock(num_objects, num_frames, width, height, box_size, noise, miss_rate, false_positive_rate, seed=0):
+    rng = np.random.default_rng(seed)
+    # Pack the flock densely: its area grows with the number of sheep
+    flock_radius = box_size * np.sqrt(num_objects) * 0.8
+    flock_centre = np.array([width / 2, height / 2])
+    flock_velocity = rng.uniform(-1.5, 1.5, 2)
+    offsets = rng.normal(0, flock_radius / 2, (num_objects, 2))
+    velocities = rng.normal(0, 0.5, (num_objects, 2))
+    sizes = rng.uniform(0.7, 1.3, (num_objects, 1)) * np.array([box_size * 1.4, box_size])
+
+    frames = []
+    for _ in range(num_frames):
+        flock_centre += flock_velocity
+        bounced = (flock_centre < flock_radius) | (flock_centre > np.array([width, height]) - flock_radius)
+        flock_velocity[bounced] *= -1
+        velocities = 0.9 * velocities + rng.normal(0, 0.3, (num_objects, 2))
+        offsets += velocities
+        centres = flock_centre + offsets
+        truth = np.concatenate([centres - sizes / 2, centres + sizes / 2], axis=1)
+
+        detected = rng.random(num_objects) >= miss_rate
+        boxes = truth[detected] + rng.normal(0, noise, (detected.sum(), 4))
+        false_positives = rng.poisson(false_positive_rate * num_objects)
+        if false_positives:
+            fp_centres = flock_centre + rng.normal(0, flock_radius, (false_positives, 2))
+            boxes = np.concatenate([boxes, np.concatenate([fp_centres - box_size / 2, fp_centres + box_size / 2], axis=1)])
+        order = rng.permutation(len(boxes))
+        frames.append({
+            "truth_ids": np.arange(num_objects),
+            "truth": truth,
+            "boxes": boxes[order],
+            "scores": rng.uniform(0.95, 1.0, len(boxes)),
+        })
+    return frames
+
+
+# Run one tracker over a flock, returns update latencies and CLEAR-MOT style counts
+def run_tracker(name, frames, keyframe_interval):
+    tracker = create_tracker({**get_tracker_settings({}), "tracker": name})
+    latencies = []
+    counts = {"truth": 0, "matched": 0, "missed": 0, "false_tracks": 0, "id_switches": 0}
+    assigned = {}
+    track_ids = set()
+    frames_since_keyframe = 0
+
+    for index, frame in enumerate(frames):
+        frames_since_keyframe += 1
+        start = time.perf_counter()
+        if index % keyframe_interval == 0:
+            tracked = tracker.update(frame["boxes"], frame["scores"], period=frames_since_keyframe)
+            frames_since_keyframe = 0
+        else:
+            tracked = tracker.update()
+        latencies.append(time.perf_counter() - start)
+        track_ids.update(tracked.ids.tolist())
+
+        # Match tracks to true boxes, a true box that changes track since its last match is an ID switch
+        iou = iou_matrix(frame["truth"], tracked.boxes)
+        rows, cols = assign(np.where(iou >= EVALUATION_IOU, 1 - iou, 1e6))
+        for truth_id, track_id in zip(frame["truth_ids"][rows].tolist(), tracked.ids[cols].tolist()):
+            if truth_id in assigned and assigned[truth_id] != track_id:
+                counts["id_switches"] += 1
+            assigned[truth_id] = track_id
+        counts["truth"] += len(frame["truth"])
+        counts["matched"] += len(rows)
+        counts["missed"] += len(frame["truth"]) - len(rows)
+        counts["false_tracks"] += len(tracked.ids) - len(cols)
+
+    values = np.asarray(latencies) * 1000
+    errors = counts["missed"] + counts["false_tracks"] + counts["id_switches"]
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "total_s": float(values.sum() / 1000),
+        "mota": 1 - errors / counts["truth"] if counts["truth"] else None,
+        "coverage": counts["matched"] / counts["truth"] if counts["truth"] else None,
+        "unique_track_ids": len(track_ids),
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the job trackers on dense synthetic flocks")
+    parser.add_argument("--objects", default="50,200,500", help="Comma separated flock sizes")
+    parser.add_argument("--frames", type=int, default=300, help="Frames per flock")
+    parser.add_argument("--width", type=int, default=1920, help="Frame width")
+    parser.add_argument("--height", type=int, default=1080, help="Frame height")
+    parser.add_argument("--box-size", type=float, default=24, help="Typical sheep box height in pixels")
+    parser.add_argument("--noise", type=float, default=1.5, help="Detection box jitter in pixels")
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="Fraction of sheep not detected per frame")
+    parser.add_argument("--false-positive-rate", type=float, default=0.01, help="False detections per sheep per frame")
+    parser.add_argument("--keyframe-interval", type=int, default=1, help="Detect every N frames (KEYFRAME_INTERVAL)")
+    parser.add_argument("--trackers", default=",".join(TRACKERS), help="Comma separated trackers to compare")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the flocks")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    args = parser.parse_args()
+
+    results = {"settings": vars(args), "flocks": []}
+    for num_objects in (int(value) for value in args.objects.split(",")):
+        frames = make_flock(num_objects, args.frames, args.width, args.height, args.box_size, args.noise,
+                            args.miss_rate, args.false_positive_rate, args.seed)
+        results["flocks"].append({
+            "objects": num_objects,
+            "trackers": {name: run_tracker(name, frames, max(1, args.keyframe_interval)) for name in args.trackers.split(",")},
+        })
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
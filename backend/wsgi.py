@@ -1,6 +1,12 @@
+import os
 from app import create_app
 
-app = create_app()
+# Run directly, the debug reloader keeps an outer process that only watches files and restarts a serving child
+# (started with WERKZEUG_RUN_MAIN set). Only the serving process starts workers, so their in-process progress
+# events reach its SSE clients and jobs are not claimed by a second pool that nobody is watching.
+is_reloader_watcher = __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+
+app = create_app(start_background=not is_reloader_watcher)
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
+    app.run(debug=True, host="0.0.0.0", port=5001)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Card,
@@ -18,30 +18,59 @@ import AddCircleOutlineIcon from '@mui/icons-material/AddCircleOutline';
 export default function UploadTasks() {
   const [statusMsg, setStatusMsg] = useState('');
   const [tasks, setTasks] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const tasksById = useRef(new Map());
+  const sinceRef = useRef(null);
   const navigate = useNavigate();
 
+  const formatTask = (t) => ({
+    id: t.id,
+    name: t.file_name,
+    status: t.status.toLowerCase(),
+    progress: t.progress_percentage || 0,
+    processTime: typeof t.processing_time === 'number' ? t.processing_time : null,
+    image: t.thumbnail_path || null,
+  });
+
+  // Merge rows into the task map by id, newest uploads first
+  const mergeTasks = (rows) => {
+    rows.forEach((t) => tasksById.current.set(t.id, formatTask(t)));
+    setTasks(Array.from(tasksById.current.values()).sort((a, b) => b.id - a.id));
+  };
+
+  const fetchQueue = async (params) => {
+    // The browser revalidates with If-None-Match, unchanged polls come back as 304 and reuse the cached body
+    const response = await fetch(`/api/processing_queue?${new URLSearchParams(params)}`);
+    const data = await response.json();
+
+    if (!Array.isArray(data.result)) {
+      throw new Error('Invalid task data');
+    }
+    return data;
+  };
+
   useEffect(() => {
     let intervalId;
 
     const fetchTasks = async () => {
       try {
-        const response = await fetch('/api/processing_queue');
-        const data = await response.json();
-
-        if (!Array.isArray(data.result)) {
-          throw new Error('Invalid task data');
+        if (sinceRef.current === null) {
+          // First load: the newest page, older pages load on demand
+          const data = await fetchQueue({});
+          mergeTasks(data.result);
+          setNextCursor(data.next_cursor);
+          sinceRef.current = data.next_since || '';
+        } else {
+          // Later polls: only rows changed since the last poll
+          const params = sinceRef.current ? { since: sinceRef.current } : {};
+          let data = await fetchQueue(params);
+          mergeTasks(data.result);
+          while (data.next_cursor) {
+            data = await fetchQueue({ ...params, cursor: data.next_cursor });
+            mergeTasks(data.result);
+          }
+          sinceRef.current = data.next_since || sinceRef.current;
         }
-
-        const formatted = data.result.map((t) => ({
-          id: t.id,
-          name: t.file_name,
-          status: t.status.toLowerCase(),
-          progress: t.progress_percentage || 0,
-          processTime: typeof t.processing_time === 'number' ? t.processing_time : null, 
-          image: t.thumbnail_path || null,
-        }));
-
-        setTasks(formatted);
         setStatusMsg('');
       } catch (error) {
         console.error('Error fetching tasks:', error);
@@ -55,6 +84,38 @@ export default function UploadTasks() {
     return () => clearInterval(intervalId); // Cleanup on unmount
   }, []);
 
+  // Live progress pushed by the workers, the poll above still picks up new uploads and final results
+  useEffect(() => {
+    const source = new EventSource('/api/progress/stream');
+
+    source.addEventListener('progress', (message) => {
+      const event = JSON.parse(message.data);
+      const task = tasksById.current.get(event.task_id);
+      if (!task) return;
+
+      tasksById.current.set(event.task_id, {
+        ...task,
+        status: event.status.toLowerCase(),
+        progress: event.progress,
+        eta: event.eta_seconds,
+      });
+      setTasks(Array.from(tasksById.current.values()).sort((a, b) => b.id - a.id));
+    });
+
+    return () => source.close(); // Cleanup on unmount
+  }, []);
+
+  const loadMore = async () => {
+    try {
+      const data = await fetchQueue({ cursor: nextCursor });
+      mergeTasks(data.result);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching tasks:', error);
+      setStatusMsg('Failed to load tasks. Please try again later.');
+    }
+  };
+
   const handleCardClick = (task) => {
     if (task.status === 'completed') {
       navigate(`/analysis/${task.id}`);
@@ -184,7 +245,7 @@ export default function UploadTasks() {
                           />
                         ) : (
                           <img
-                            src={`${window.location.origin}/assets/thumbnails/processed/${task.name}.jpg` || '/assets/sample_video_frame.png'}
+                            src={task.image ? `${window.location.origin}/${task.image.replace(/^static\//, '')}` : '/assets/sample_video_frame.png'}
                             alt="A thumbnail of the processed video"
                             style={{
                               width: '100%',
@@ -205,6 +266,11 @@ export default function UploadTasks() {
                         <Typography variant="body2" color="text.secondary" gutterBottom>
                           Processing Time: {formatDuration(task.processTime)}
                         </Typography>
+                        {task.status === 'processing' && typeof task.eta === 'number' && (
+                          <Typography variant="body2" color="text.secondary" gutterBottom>
+                            Time Remaining: {formatDuration(task.eta)}
+                          </Typography>
+                        )}
                         <LinearProgress
                           variant="determinate"
                           value={task.progress}
@@ -219,6 +285,14 @@ export default function UploadTasks() {
             })}
           </Stack>
 
+          {nextCursor && (
+            <Box sx={{ textAlign: 'center', mt: 3 }}>
+              <Button variant="outlined" onClick={loadMore}>
+                Load Older Tasks
+              </Button>
+            </Box>
+          )}
+
           {/* Upload another video CTA */}
           <Box sx={{ textAlign: 'center', mt: 5 }}>
             <Typography variant="body1" color="textSecondary" sx={{ mb: 2 }}>
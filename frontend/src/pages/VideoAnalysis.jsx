@@ -27,8 +27,11 @@ export default function VideoAnalysis() {
   
         const data = await response.json();
   
-        // Construct the processed video URL if you store it locally or remotely
-        const videoUrl = `${window.location.origin}/assets/videos/processed/encoded_${data.id}_${data.file_name}`;
+        // Prefer the adaptive HLS stream where the browser plays it natively, otherwise the processed mp4
+        const canPlayHls = document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+        const videoUrl = data.hls_manifest_url && canPlayHls
+          ? `${window.location.origin}${data.hls_manifest_url}`
+          : `${window.location.origin}/assets/videos/processed/encoded_${data.id}_${data.file_name}`;
   
         // Convert duration seconds to readable time
         const formatDuration = (seconds) => {
@@ -1,11 +1,31 @@
-# Utility script to generate additional PascalVOC encoded dataset images through rotation.
+# Utility script to generate additional PascalVOC encoded dataset images through rotation and flips.
+#
+# Usage:
+#   python dataset_augmentation.py --input ./datasets/sheep_video_01/original_video_01 --output ./augmented_datasets/sheep_video_01
+#   python dataset_augmentation.py --transforms rot0,rot90,rot180,rot270,hflip --processes 8
+#   python dataset_augmentation.py --format tar --shard-size 256     # WebDataset style tar shards
+#   python dataset_augmentation.py --format array                    # memory-mapped JPEG blob plus box index
+#
+# Source images are split into train/val/test first (so every augmented copy of an image lands in the same
+# split) and then augmented in parallel, one process per chunk of images. Each image and its annotation are
+# read once, every transform is applied in memory and written straight into its split:
+#   dir:   <output>/<split>/<name>_<transform>.jpg + .xml, the layout the VOCDataset notebooks read
+#   tar:   <output>/<split>/<split>-000000.tar, members <name>_<transform>.jpg + .xml (WebDataset naming)
+#   array: <output>/<split>/<split>-000000.images.bin, every JPEG back to back, and <split>-000000.index.npz
+#          with names, byte offsets/lengths and the boxes/labels of each image (see ArrayShard)
+# <output>/manifest.json lists the splits, sample counts and shards.
 
+import argparse
+import io
+import json
 import os
-import shutil
 import random
+import tarfile
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from PIL import Image
-from sklearn.model_selection import train_test_split
 
 # === CONFIGURATION ===
 INPUT_DIR = "./datasets/sheep_video_01/original_video_01"  # Replace with your folder containing .jpg/.xml files
@@ -13,6 +33,24 @@ OUTPUT_DIR = "./augmented_datasets/sheep_video_01"
 
 ROTATIONS = [0, 90, 180, 270]  # 0 = original, 360 not needed
 
+# Fractions of the source images in each split, the remainder after val and test goes to train
+SPLITS = {"train": 0.8, "val": 0.1, "test": 0.1}
+
+# Source images per task for the dir format, small so the process pool stays evenly loaded
+DIR_CHUNK_SIZE = 32
+
+# Box-aware transforms: PIL transpose applied to the image (None keeps it) and the matching box mapping
+# (x_min, y_min, x_max, y_max), w, h -> box in the transformed image. Rotations are counter-clockwise like
+# PIL's Image.rotate, so rot90 of the original script's output is unchanged.
+TRANSFORMS = {
+    "rot0": (None, lambda b, w, h: b),
+    "rot90": (Image.Transpose.ROTATE_90, lambda b, w, h: (b[1], w - b[2], b[3], w - b[0])),
+    "rot180": (Image.Transpose.ROTATE_180, lambda b, w, h: (w - b[2], h - b[3], w - b[0], h - b[1])),
+    "rot270": (Image.Transpose.ROTATE_270, lambda b, w, h: (h - b[3], b[0], h - b[1], b[2])),
+    "hflip": (Image.Transpose.FLIP_LEFT_RIGHT, lambda b, w, h: (w - b[2], b[1], w - b[0], b[3])),
+    "vflip": (Image.Transpose.FLIP_TOP_BOTTOM, lambda b, w, h: (b[0], h - b[3], b[2], h - b[1])),
+}
+
 # === FUNCTIONS ===
 
 def parse_annotation(xml_path):
@@ -31,80 +69,213 @@ def parse_annotation(xml_path):
     return tree, boxes
 
 
-def rotate_box(box, angle, w, h):
-    x_min, y_min, x_max, y_max = box
-    if angle == 90:
-        return (y_min, w - x_max, y_max, w - x_min)
-    elif angle == 180:
-        return (w - x_max, h - y_max, w - x_min, h - y_min)
-    elif angle == 270:
-        return (h - y_max, x_min, h - y_min, x_max)
-    return box  # angle == 0
-
-
-def update_annotation(tree, boxes, angle, w, h):
+# Rewrite the annotation in place for one transform and serialise it, boxes keep their original values so
+# the same parsed tree serves every transform of the image
+def update_annotation(tree, boxes, transform, w, h, filename):
+    transpose, map_box = TRANSFORMS[transform]
+    root = tree.getroot()
+    new_boxes = []
     for (obj, box) in boxes:
-        new_box = rotate_box(box, angle, w, h)
+        new_box = map_box(box, w, h)
         bbox = obj.find("bndbox")
         bbox.find("xmin").text = str(new_box[0])
         bbox.find("ymin").text = str(new_box[1])
         bbox.find("xmax").text = str(new_box[2])
         bbox.find("ymax").text = str(new_box[3])
-    return tree
+        new_boxes.append(new_box)
+
+    # Quarter turns swap the image size
+    swapped = transpose in (Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270)
+    size = root.find("size")
+    if size is not None and size.find("width") is not None and size.find("height") is not None:
+        size.find("width").text = str(h if swapped else w)
+        size.find("height").text = str(w if swapped else h)
+    if root.find("filename") is not None:
+        root.find("filename").text = filename
+    return ET.tostring(root), new_boxes
 
 
-def augment_and_save(image_path, xml_path, output_dir):
+# Read one image and its annotation once and yield (name, jpeg bytes, xml bytes, boxes, labels) per transform
+def augment_image(image_path, xml_path, transforms, jpeg_quality):
     image = Image.open(image_path)
+    image.load()
     w, h = image.size
     base = os.path.splitext(os.path.basename(image_path))[0]
     tree, boxes = parse_annotation(xml_path)
+    labels = [obj.findtext("name", "") for obj, _ in boxes]
 
-    new_files = []
+    for transform in transforms:
+        transpose = TRANSFORMS[transform][0]
+        augmented = image if transpose is None else image.transpose(transpose)
+        name = f"{base}_{transform}"
+        buffer = io.BytesIO()
+        augmented.convert("RGB").save(buffer, format="JPEG", quality=jpeg_quality)
+        xml_bytes, new_boxes = update_annotation(tree, boxes, transform, w, h, f"{name}.jpg")
+        yield name, buffer.getvalue(), xml_bytes, new_boxes, labels
 
-    for angle in ROTATIONS:
-        rotated = image.rotate(angle, expand=True)
-        new_img_name = f"{base}_rot{angle}.jpg"
-        new_xml_name = f"{base}_rot{angle}.xml"
 
-        rotated.save(os.path.join(output_dir, new_img_name))
+# Helper to add an in-memory file to a tar shard
+def add_tar_member(tar, member_name, data):
+    info = tarfile.TarInfo(member_name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
 
-        new_tree = update_annotation(tree, boxes, angle, w, h)
-        new_tree.write(os.path.join(output_dir, new_xml_name))
 
-        new_files.append((new_img_name, new_xml_name))
+# Augment one chunk of a split's source images and write the results, runs in a worker process
+# Returns (number of samples written, shard path or None for the dir format)
+def augment_chunk(pairs, split_dir, shard_name, output_format, transforms, jpeg_quality):
+    samples = (
+        sample
+        for image_path, xml_path in pairs
+        for sample in augment_image(image_path, xml_path, transforms, jpeg_quality)
+    )
+    count = 0
 
-    return new_files
+    if output_format == "dir":
+        for name, jpeg, xml_bytes, _, _ in samples:
+            with open(os.path.join(split_dir, f"{name}.jpg"), "wb") as f:
+                f.write(jpeg)
+            with open(os.path.join(split_dir, f"{name}.xml"), "wb") as f:
+                f.write(xml_bytes)
+            count += 1
+        return count, None
 
+    if output_format == "tar":
+        shard_path = os.path.join(split_dir, f"{shard_name}.tar")
+        with tarfile.open(shard_path, "w") as tar:
+            for name, jpeg, xml_bytes, _, _ in samples:
+                add_tar_member(tar, f"{name}.jpg", jpeg)
+                add_tar_member(tar, f"{name}.xml", xml_bytes)
+                count += 1
+        return count, shard_path
 
-def split_and_save(all_files, output_dir):
-    random.shuffle(all_files)
-    train, temp = train_test_split(all_files, test_size=0.2)
-    val, test = train_test_split(temp, test_size=0.5)
+    # array: JPEGs are streamed into the blob, only the index is kept in memory
+    shard_path = os.path.join(split_dir, shard_name)
+    names, offsets, lengths, box_counts, all_boxes, all_labels = [], [], [], [], [], []
+    offset = 0
+    with open(f"{shard_path}.images.bin", "wb") as blob:
+        for name, jpeg, _, boxes, labels in samples:
+            blob.write(jpeg)
+            names.append(name)
+            offsets.append(offset)
+            lengths.append(len(jpeg))
+            box_counts.append(len(boxes))
+            all_boxes.extend(boxes)
+            all_labels.extend(labels)
+            offset += len(jpeg)
+            count += 1
+    np.savez(
+        f"{shard_path}.index.npz",
+        names=np.array(names, dtype=str),
+        offsets=np.array(offsets, dtype=np.int64),
+        lengths=np.array(lengths, dtype=np.int64),
+        box_starts=np.concatenate([[0], np.cumsum(box_counts, dtype=np.int64)]),
+        boxes=np.array(all_boxes, dtype=np.float32).reshape(-1, 4),
+        labels=np.array(all_labels, dtype=str),
+    )
+    return count, shard_path
 
-    splits = {"train": train, "val": val, "test": test}
 
-    for split_name, files in splits.items():
-        split_path = os.path.join(output_dir, split_name)
-        os.makedirs(split_path, exist_ok=True)
-        for img, xml in files:
-            shutil.move(os.path.join(output_dir, img), os.path.join(split_path, img))
-            shutil.move(os.path.join(output_dir, xml), os.path.join(split_path, xml))
+# Read access to an array shard without loading the blob: shard[i] -> (name, jpeg bytes, boxes (N, 4), labels)
+# e.g. Image.open(io.BytesIO(jpeg)) in a Dataset's __getitem__
+class ArrayShard:
+    def __init__(self, shard_path):
+        index = np.load(f"{shard_path}.index.npz")
+        self.names = index["names"]
+        self.offsets = index["offsets"]
+        self.lengths = index["lengths"]
+        self.box_starts = index["box_starts"]
+        self.boxes = index["boxes"]
+        self.labels = index["labels"]
+        self.images = np.memmap(f"{shard_path}.images.bin", dtype=np.uint8, mode="r")
 
+    def __len__(self):
+        return len(self.names)
 
-# === MAIN EXECUTION ===
+    def __getitem__(self, i):
+        start, end = self.box_starts[i], self.box_starts[i + 1]
+        jpeg = self.images[self.offsets[i]:self.offsets[i] + self.lengths[i]].tobytes()
+        return str(self.names[i]), jpeg, self.boxes[start:end], [str(label) for label in self.labels[start:end]]
 
-if __name__ == "__main__":
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    all_augmented_files = []
 
-    for file in os.listdir(INPUT_DIR):
+# Helper to list the (image, annotation) pairs of the input directory, images without an annotation are skipped
+def find_pairs(input_dir):
+    pairs = []
+    for file in sorted(os.listdir(input_dir)):
         if file.endswith(".jpg"):
             base = os.path.splitext(file)[0]
-            img_path = os.path.join(INPUT_DIR, file)
-            xml_path = os.path.join(INPUT_DIR, f"{base}.xml")
+            xml_path = os.path.join(input_dir, f"{base}.xml")
             if os.path.exists(xml_path):
-                augmented = augment_and_save(img_path, xml_path, OUTPUT_DIR)
-                all_augmented_files.extend(augmented)
+                pairs.append((os.path.join(input_dir, file), xml_path))
+    return pairs
+
+
+# Shuffle the source pairs with a fixed seed and cut them into the SPLITS fractions
+def split_pairs(pairs, seed=None):
+    pairs = list(pairs)
+    random.Random(seed).shuffle(pairs)
+    val_count = round(len(pairs) * SPLITS["val"])
+    test_count = round(len(pairs) * SPLITS["test"])
+    return {
+        "train": pairs[val_count + test_count:],
+        "val": pairs[:val_count],
+        "test": pairs[val_count:val_count + test_count],
+    }
+
+
+# Split and augment a directory of PascalVOC images in parallel, returns the manifest written next to the splits
+def augment_dataset(input_dir, output_dir, transforms=None, output_format="dir", shard_size=256,
+                    processes=None, jpeg_quality=95, seed=None):
+    transforms = list(transforms or (f"rot{angle}" for angle in ROTATIONS))
+    unknown = [transform for transform in transforms if transform not in TRANSFORMS]
+    if unknown:
+        raise ValueError(f"Unknown transforms {unknown}, expected some of {tuple(TRANSFORMS)}")
+
+    chunk_size = DIR_CHUNK_SIZE if output_format == "dir" else max(1, shard_size)
+    splits = split_pairs(find_pairs(input_dir), seed)
+    manifest = {"format": output_format, "transforms": transforms, "splits": {}}
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {}
+        for split_name, pairs in splits.items():
+            split_dir = os.path.join(output_dir, split_name)
+            os.makedirs(split_dir, exist_ok=True)
+            futures[split_name] = [
+                pool.submit(augment_chunk, pairs[start:start + chunk_size], split_dir,
+                            f"{split_name}-{start // chunk_size:06d}", output_format, transforms, jpeg_quality)
+                for start in range(0, len(pairs), chunk_size)
+            ]
+
+        for split_name, split_futures in futures.items():
+            results = [future.result() for future in split_futures]
+            manifest["splits"][split_name] = {
+                "images": len(splits[split_name]),
+                "samples": sum(count for count, _ in results),
+                "shards": [os.path.relpath(path, output_dir) for _, path in results if path is not None],
+            }
+
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# === MAIN EXECUTION ===
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Augment a PascalVOC dataset and split it into train/val/test")
+    parser.add_argument("--input", default=INPUT_DIR, help="Folder containing .jpg/.xml pairs")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Output folder for the splits")
+    parser.add_argument("--transforms", default=",".join(f"rot{angle}" for angle in ROTATIONS),
+                        help=f"Comma separated transforms from {','.join(TRANSFORMS)}")
+    parser.add_argument("--format", choices=("dir", "tar", "array"), default="dir", help="Loose files, tar shards or array shards")
+    parser.add_argument("--shard-size", type=int, default=256, help="Source images per tar/array shard")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality of the written images")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible split")
+    args = parser.parse_args()
 
-    split_and_save(all_augmented_files, OUTPUT_DIR)
-    print("✅ Dataset augmentation and splitting complete.")
+    os.makedirs(args.output, exist_ok=True)
+    manifest = augment_dataset(args.input, args.output, args.transforms.split(","), args.format, args.shard_size,
+                               args.processes, args.quality, args.seed)
+    counts = ", ".join(f"{name} {split['samples']}" for name, split in manifest["splits"].items())
+    print(f"✅ Dataset augmentation and splitting complete ({counts}).")
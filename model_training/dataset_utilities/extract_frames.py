@@ -1,51 +1,178 @@
 # Utility script to sample and extract frames to a specified directory for use with dataset creation from video.
+#
+# Usage:
+#   python extract_frames.py videos/original_video_01.mp4 --output frame_extract_outputs/original_video_01 --interval 2
+#   python extract_frames.py videos/ --output frame_extract_outputs --interval 2 --processes 4
+#   python extract_frames.py videos/ --output frame_extract_outputs --method ffmpeg
+#
+# A single video writes its frames straight into --output. A directory (or several videos) writes each video to
+# --output/<video name>, with one process per video. Can also be imported, e.g.
+#   from extract_frames import extract_frames
+#   extract_frames("videos/original_video_01.mp4", "frame_extract_outputs/original_video_01", interval_seconds=2)
+#
+# The opencv method decodes the video once front to back: grab() steps over every frame and only the sampled
+# ones are retrieve()d (converted to BGR), which avoids a keyframe seek and re-decode per sample. JPEGs are
+# encoded and written by a thread pool while decoding carries on. The ffmpeg method hands the whole job to an
+# ffmpeg select filter instead and needs ffmpeg on PATH.
 
-import cv2
+import argparse
 import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v", ".mts")
+
+# Frames waiting to be written per writer thread, bounds memory when decoding outruns the disk
+PENDING_WRITES_PER_THREAD = 4
+
 
-VIDEO_NAME = "original_video_01"
+# Helper to write one JPEG, cv2.imwrite releases the GIL so several can run alongside decoding
+def write_frame(filename, frame, jpeg_quality):
+    if not cv2.imwrite(filename, frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]):
+        raise IOError(f"Could not write {filename}")
 
-def extract_frames(video_path, output_dir, interval_seconds=5):
+
+# Sample a frame every interval_seconds by decoding sequentially, returns the number of frames saved
+def extract_frames(video_path, output_dir, interval_seconds=5, jpeg_quality=95, writer_threads=4):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
     # Load the video
     video = cv2.VideoCapture(video_path)
     if not video.isOpened():
-        print("Error: Cannot open video file.")
-        return
+        print(f"Error: Cannot open video file {video_path}.")
+        return 0
 
     # Get video properties
     fps = video.get(cv2.CAP_PROP_FPS)
     total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps
-    print(f"Video duration: {duration:.2f} seconds, FPS: {fps}, Total frames: {total_frames}")
+    if fps <= 0:
+        print(f"Error: {video_path} reports no frame rate.")
+        video.release()
+        return 0
+    print(f"{video_path}: duration {total_frames / fps:.2f} seconds, FPS: {fps}, Total frames: {total_frames}")
 
     # Calculate frame interval
-    frame_interval = int(fps * interval_seconds)
-    frame_count = 0
+    frame_interval = max(1, int(fps * interval_seconds))
     saved_count = 0
+    pending = threading.BoundedSemaphore(max(1, writer_threads) * PENDING_WRITES_PER_THREAD)
+    futures = []
 
-    while True:
-        # Set video position
-        video.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
-        success, frame = video.read()
-        if not success:
-            break
+    with ThreadPoolExecutor(max_workers=max(1, writer_threads)) as writers:
+        frame_count = 0
+        # The container's frame count can be wrong, so read until the decoder runs out rather than trusting it
+        while video.grab():
+            if frame_count % frame_interval == 0:
+                success, frame = video.retrieve()
+                if not success:
+                    break
+                filename = os.path.join(output_dir, f"frame_{saved_count:05d}.jpg")
+                pending.acquire()
+                future = writers.submit(write_frame, filename, frame, jpeg_quality)
+                future.add_done_callback(lambda _: pending.release())
+                futures.append(future)
+                saved_count += 1
+            frame_count += 1
 
-        # Save frame
-        filename = os.path.join(output_dir, f"frame_{saved_count:05d}.jpg")
-        cv2.imwrite(filename, frame)
-        print(f"Saved: {filename}")
-        saved_count += 1
+    video.release()
+    # Re-raise the first failed write
+    for future in futures:
+        future.result()
+    print(f"{video_path}: saved {saved_count} frames to {output_dir}")
+    return saved_count
 
-        # Move to next interval
-        frame_count += frame_interval
-        if frame_count >= total_frames:
-            break
 
-    video.release()
-    print("Frame extraction complete.")
+# Same sampling done by ffmpeg's select filter, keeping the first frame and then one per interval_seconds of
+# presentation time. Returns the number of frames saved.
+# ffmpeg writes into a scratch directory first, so the count covers only this run's frames even when output_dir
+# already holds frames from an earlier run; they are then moved in, replacing same-numbered files like opencv does.
+def extract_frames_ffmpeg(video_path, output_dir, interval_seconds=5, jpeg_quality=95, **_):
+    os.makedirs(output_dir, exist_ok=True)
+    # Map the 0-100 JPEG quality onto ffmpeg's 2 (best) to 31 scale
+    qscale = round(2 + (100 - jpeg_quality) * 29 / 100)
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval_seconds})'"
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".ffmpeg_") as scratch_dir:
+        result = subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-i", video_path,
+                "-vf", select, "-vsync", "vfr",
+                "-q:v", str(qscale), "-start_number", "0",
+                os.path.join(scratch_dir, "frame_%05d.jpg"),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"Error: ffmpeg failed on {video_path}: {result.stderr.strip()}")
+            return 0
+        frames = sorted(name for name in os.listdir(scratch_dir) if name.startswith("frame_") and name.endswith(".jpg"))
+        for name in frames:
+            os.replace(os.path.join(scratch_dir, name), os.path.join(output_dir, name))
+    print(f"{video_path}: saved {len(frames)} frames to {output_dir}")
+    return len(frames)
+
+
+EXTRACTORS = {"opencv": extract_frames, "ffmpeg": extract_frames_ffmpeg}
+
+
+# Helper to expand the command line inputs into video files, directories contribute the videos directly inside them
+def find_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            videos.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(VIDEO_EXTENSIONS)
+            )
+        else:
+            videos.append(path)
+    return videos
+
+
+# Extract frames from several videos in parallel, one process per video, each into output_root/<video name>
+# Returns {video path: frames saved}
+def extract_videos(video_paths, output_root, interval_seconds=5, method="opencv", processes=None, **options):
+    extractor = EXTRACTORS[method]
+    jobs = {
+        video_path: os.path.join(output_root, os.path.splitext(os.path.basename(video_path))[0])
+        for video_path in video_paths
+    }
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {
+            video_path: pool.submit(extractor, video_path, output_dir, interval_seconds, **options)
+            for video_path, output_dir in jobs.items()
+        }
+        return {video_path: future.result() for video_path, future in futures.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample frames from drone videos for dataset creation")
+    parser.add_argument("inputs", nargs="+", help="Video files and/or directories of videos")
+    parser.add_argument("--output", required=True, help="Output directory, per-video subdirectories for several videos")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between sampled frames")
+    parser.add_argument("--method", choices=tuple(EXTRACTORS), default="opencv", help="Decode with OpenCV or an ffmpeg select filter")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality, 0-100")
+    parser.add_argument("--threads", type=int, default=4, help="JPEG writer threads per video (opencv method)")
+    parser.add_argument("--processes", type=int, default=None, help="Videos processed in parallel, defaults to the CPU count")
+    args = parser.parse_args()
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        parser.error("no videos found")
+
+    options = {"jpeg_quality": args.quality, "writer_threads": args.threads}
+    # A single named video keeps the original behaviour of writing straight into the output directory
+    if len(videos) == 1 and not os.path.isdir(args.inputs[0]):
+        saved = {videos[0]: EXTRACTORS[args.method](videos[0], args.output, args.interval, **options)}
+    else:
+        saved = extract_videos(videos, args.output, args.interval, args.method, args.processes, **options)
+    print(f"Frame extraction complete: {sum(saved.values())} frames from {len(saved)} videos.")
+
 
-# Example usage:
-extract_frames(f"videos/{VIDEO_NAME}.mp4", F"frame_extract_outputs/{VIDEO_NAME}", interval_seconds=2)
+if __name__ == "__main__":
+    main()